@@ -2,12 +2,60 @@ import { NextResponse } from 'next/server';
 import { exec } from 'child_process';
 import { promisify } from 'util';
 import { readFile } from 'fs/promises';
-import { access } from 'fs/promises';
+import { access, stat } from 'fs/promises';
 import { constants } from 'fs';
 import path from 'path';
 
 const execAsync = promisify(exec);
 
+// Long-running analysis worker (python3 ml_analysis/worker.py); exec is the fallback
+const WORKER_URL = process.env.ML_WORKER_URL || 'http://127.0.0.1:8765';
+const WORKER_POLL_MS = 250;
+const WORKER_TIMEOUT_MS = 5 * 60 * 1000;
+
+interface WorkerJob {
+  job_id: string;
+  status: 'queued' | 'running' | 'done' | 'failed';
+  error: string | null;
+}
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Submit the analysis to the worker; null if no worker is listening.
+// The worker collapses identical requests into one job.
+async function submitToWorker(csvPath: string, outputDir: string, imageOutputDir: string): Promise<WorkerJob | null> {
+  try {
+    const response = await fetch(`${WORKER_URL}/jobs`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ csv_path: csvPath, output_dir: outputDir, image_output_dir: imageOutputDir }),
+      signal: AbortSignal.timeout(2000),
+    });
+    return response.ok ? await response.json() : null;
+  } catch {
+    return null;
+  }
+}
+
+const isPending = (job: WorkerJob) => job.status === 'queued' || job.status === 'running';
+
+// Poll a worker job until it finishes. On timeout or a failed status poll the
+// last known (still pending) state is returned: the job may still be running
+async function waitForWorkerJob(job: WorkerJob): Promise<WorkerJob> {
+  const deadline = Date.now() + WORKER_TIMEOUT_MS;
+  while (isPending(job) && Date.now() < deadline) {
+    await sleep(WORKER_POLL_MS);
+    try {
+      const response = await fetch(`${WORKER_URL}/jobs/${job.job_id}`);
+      if (!response.ok) break;
+      job = await response.json();
+    } catch {
+      break;
+    }
+  }
+  return job;
+}
+
 async function fileExists(filePath: string): Promise<boolean> {
   try {
     await access(filePath, constants.F_OK);
@@ -17,8 +65,19 @@ async function fileExists(filePath: string): Promise<boolean> {
   }
 }
 
-export async function GET() {
+async function isNewer(filePath: string, thanPath: string): Promise<boolean> {
   try {
+    const [source, target] = await Promise.all([stat(filePath), stat(thanPath)]);
+    return source.mtimeMs > target.mtimeMs;
+  } catch {
+    return false;
+  }
+}
+
+export async function GET(request: Request) {
+  try {
+    // ?wait=false returns a pending worker job right away so the client can poll
+    const wait = new URL(request.url).searchParams.get('wait') !== 'false';
     const csvPath = path.join(process.cwd(), 'public', 'product_sales.csv');
     const mlAnalysisPath = path.join(process.cwd(), 'ml_analysis');
     const mainScriptPath = path.join(mlAnalysisPath, 'main_analysis.py');
@@ -29,38 +88,61 @@ export async function GET() {
     const preprocessingReportPath = path.join(resultsPath, 'preprocessing_report.json');
     const clusteringResultsPath = path.join(resultsPath, 'clustering_results.json');
     const regressionResultsPath = path.join(resultsPath, 'regression_results.json');
+    // Per-run timings; untracked, so absent on deployments serving committed results
+    const performancePath = path.join(resultsPath, 'performance.json');
 
     const resultsExist = await fileExists(preprocessingReportPath) && 
                          await fileExists(clusteringResultsPath) && 
                          await fileExists(regressionResultsPath);
 
-    // Try to run Python analysis if results don't exist (local development)
-    if (!resultsExist) {
-      try {
-        const pythonCmd = process.env.PYTHON_CMD || 'python3';
-        const { stdout, stderr } = await execAsync(
-          `${pythonCmd} "${mainScriptPath}" "${csvPath}"`,
-          {
-            cwd: process.cwd(),
-            env: { ...process.env, PYTHONPATH: mlAnalysisPath }
-          }
-        );
+    // The CSV was modified (by mtime) since the last run. ml_analysis keys its stage
+    // cache on the CSV content, so a re-run is near-instant only when a warm local
+    // .cache/ holds results for this content; .cache/ is gitignored, so a fresh
+    // checkout always starts cold
+    const csvChanged = resultsExist && await isNewer(csvPath, finalReportPath);
+
+    // Try to run Python analysis if results are missing or stale (local development)
+    if (!resultsExist || csvChanged) {
+      const job = await submitToWorker(csvPath, resultsPath, path.join(process.cwd(), 'public', 'ml_results'));
+      if (job) {
+        // A job still pending after the wait (timeout or status poll error) is still
+        // writing ml_results/, so report it rather than starting a second run
+        const finished = wait ? await waitForWorkerJob(job) : job;
+        if (isPending(finished)) {
+          return NextResponse.json({ success: true, pending: true, job: finished }, { status: 202 });
+        }
+        if (finished.status === 'failed') {
+          console.error('Analysis worker job failed:', finished.error);
+        }
+      } else {
+        // No worker listening: run the analysis directly
+        try {
+          const pythonCmd = process.env.PYTHON_CMD || 'python3';
+          const { stdout, stderr } = await execAsync(
+            `${pythonCmd} "${mainScriptPath}" "${csvPath}"`,
+            {
+              cwd: process.cwd(),
+              env: { ...process.env, PYTHONPATH: mlAnalysisPath }
+            }
+          );
 
-        if (stderr && !stderr.includes('Warning')) {
-          console.error('Python script stderr:', stderr);
+          if (stderr && !stderr.includes('Warning')) {
+            console.error('Python script stderr:', stderr);
+          }
+        } catch (pythonError) {
+          // Python not available (e.g., on Vercel) - fall through to read existing results
+          console.warn('Python analysis not available, using pre-generated results:', pythonError);
         }
-      } catch (pythonError) {
-        // Python not available (e.g., on Vercel) - fall through to read existing results
-        console.warn('Python analysis not available, using pre-generated results:', pythonError);
       }
     }
 
     // Read the results (either newly generated or pre-existing)
-    const [finalReport, preprocessingReport, clusteringResults, regressionResults] = await Promise.all([
+    const [finalReport, preprocessingReport, clusteringResults, regressionResults, performance] = await Promise.all([
       readFile(finalReportPath, 'utf-8').then(JSON.parse).catch(() => null),
       readFile(preprocessingReportPath, 'utf-8').then(JSON.parse).catch(() => null),
       readFile(clusteringResultsPath, 'utf-8').then(JSON.parse).catch(() => null),
       readFile(regressionResultsPath, 'utf-8').then(JSON.parse).catch(() => null),
+      readFile(performancePath, 'utf-8').then(JSON.parse).catch(() => null),
     ]);
 
     if (!preprocessingReport || !clusteringResults || !regressionResults) {
@@ -74,6 +156,7 @@ export async function GET() {
         preprocessingReport,
         clusteringResults,
         regressionResults,
+        performance,
       }
     });
   } catch (error) {
@@ -10,7 +10,8 @@ import {
   TrendingUp, 
   Loader2,
   CheckCircle2,
-  XCircle
+  XCircle,
+  Gauge
 } from 'lucide-react';
 import Image from 'next/image';
 
@@ -112,12 +113,36 @@ interface RegressionResults {
   };
 }
 
+interface StagePerformance {
+  wall_seconds: number;
+  cpu_seconds: number | null;
+  peak_rss_bytes: number | null;
+  cached: boolean;
+  counters: Record<string, number>;
+}
+
+interface PerformanceReport {
+  wall_seconds: number;
+  cpu_seconds: number;
+  peak_rss_bytes: number | null;
+  counters: Record<string, number>;
+  stages: Record<string, StagePerformance>;
+}
+
+// Delay between requests while the analysis worker is still running a job
+const ANALYSIS_RETRY_MS = 1000;
+
+function formatMiB(bytes: number | null): string {
+  return bytes === null ? '—' : `${(bytes / 2 ** 20).toFixed(0)} MiB`;
+}
+
 export default function MLPage() {
   const [isAnalyzing, setIsAnalyzing] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [preprocessingReport, setPreprocessingReport] = useState<PreprocessingReport | null>(null);
   const [clusteringResults, setClusteringResults] = useState<ClusteringResults | null>(null);
   const [regressionResults, setRegressionResults] = useState<RegressionResults | null>(null);
+  const [performance, setPerformance] = useState<PerformanceReport | null>(null);
   const [analysisComplete, setAnalysisComplete] = useState(false);
 
   const handleRunAnalysis = async () => {
@@ -126,8 +151,13 @@ export default function MLPage() {
     setAnalysisComplete(false);
 
     try {
-      const response = await fetch('/ml/api/analyze');
-      const result = await response.json();
+      let result = await fetch('/ml/api/analyze').then((response) => response.json());
+      // A worker job that outlasted the route's wait: ask again, the worker
+      // answers repeated requests with the same job
+      while (result.success && result.pending) {
+        await new Promise((resolve) => setTimeout(resolve, ANALYSIS_RETRY_MS));
+        result = await fetch('/ml/api/analyze').then((response) => response.json());
+      }
 
       if (!result.success) {
         throw new Error(result.error || 'Analysis failed');
@@ -142,6 +172,7 @@ export default function MLPage() {
       if (result.data.regressionResults) {
         setRegressionResults(result.data.regressionResults);
       }
+      setPerformance(result.data.performance ?? null);
 
       setAnalysisComplete(true);
     } catch (err) {
@@ -475,6 +506,52 @@ export default function MLPage() {
             </CardContent>
           </Card>
         )}
+
+        {/* Pipeline Performance Section */}
+        {performance && (
+          <Card>
+            <CardHeader>
+              <CardTitle className="flex items-center gap-2">
+                <Gauge className="size-5" />
+                Pipeline Performance
+              </CardTitle>
+              <CardDescription>
+                {performance.wall_seconds.toFixed(2)}s wall, {performance.cpu_seconds.toFixed(2)}s CPU,
+                peak RSS {formatMiB(performance.peak_rss_bytes)}
+              </CardDescription>
+            </CardHeader>
+            <CardContent className="space-y-4">
+              <div className="overflow-x-auto">
+                <table className="w-full border-collapse border">
+                  <thead>
+                    <tr className="bg-muted">
+                      <th className="border p-2 text-left">Stage</th>
+                      <th className="border p-2">Wall (s)</th>
+                      <th className="border p-2">CPU (s)</th>
+                      <th className="border p-2">Peak RSS</th>
+                      <th className="border p-2">Rows</th>
+                      <th className="border p-2">Distance Evaluations</th>
+                    </tr>
+                  </thead>
+                  <tbody>
+                    {Object.entries(performance.stages).map(([name, stage]) => (
+                      <tr key={name}>
+                        <td className="border p-2 font-medium">
+                          {name}{stage.cached && <span className="text-xs text-muted-foreground"> (cached)</span>}
+                        </td>
+                        <td className="border p-2">{stage.wall_seconds.toFixed(3)}</td>
+                        <td className="border p-2">{stage.cpu_seconds === null ? '—' : stage.cpu_seconds.toFixed(3)}</td>
+                        <td className="border p-2">{formatMiB(stage.peak_rss_bytes)}</td>
+                        <td className="border p-2">{(stage.counters.rows_processed ?? 0).toLocaleString()}</td>
+                        <td className="border p-2">{(stage.counters.distance_evaluations ?? 0).toLocaleString()}</td>
+                      </tr>
+                    ))}
+                  </tbody>
+                </table>
+              </div>
+            </CardContent>
+          </Card>
+        )}
       </div>
     </div>
   );
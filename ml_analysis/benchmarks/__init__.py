@@ -0,0 +1,11 @@
+# ML Analysis Benchmarks
+#
+# Synthetic product-sales data (synthetic.py) and a timing / memory harness
+# (run.py). Run from ml_analysis/:  python -m benchmarks --preset quick
+import os
+import sys
+
+# The analysis modules import each other by bare name (from kmeans import ...)
+ANALYSIS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ANALYSIS_DIR not in sys.path:
+    sys.path.insert(0, ANALYSIS_DIR)
@@ -0,0 +1,289 @@
+"""
+Benchmark Runner
+Times and memory-profiles the analysis stages on synthetic data and compares against a stored baseline
+
+Usage (from ml_analysis/):
+    python -m benchmarks --preset quick
+    python -m benchmarks --sizes 1e3,1e5 --cases preprocess,kmeans
+    python -m benchmarks --preset default --update-baseline
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, Any, List, Callable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import write_product_sales_csv, dataset_path
+from preprocessing import preprocess_data, NORMALIZED_FEATURES
+from kmeans import kmeans, elbow_method
+from regression import compare_models
+from main_analysis import run_complete_analysis, CLUSTERING_FEATURES
+
+RESULTS_VERSION = 1
+BENCHMARK_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE = BENCHMARK_DIR / "baseline.json"
+DEFAULT_OUTPUT = BENCHMARK_DIR / "results" / "latest.json"
+DEFAULT_DATA_DIR = BENCHMARK_DIR / "data"
+
+CASES = ['preprocess', 'kmeans', 'elbow', 'regression', 'pipeline']
+
+PRESETS = {
+    "quick": {"sizes": [1_000, 10_000], "k_values": [4], "dimensions": [2], "repeats": 3},
+    "default": {"sizes": [1_000, 10_000, 100_000], "k_values": [2, 4, 8], "dimensions": [2, 5], "repeats": 3},
+    "full": {"sizes": [10 ** p for p in range(3, 9)], "k_values": [2, 4, 8], "dimensions": [2, 5], "repeats": 1}
+}
+
+# From this many rows preprocessing uses the streaming (chunked) engine
+STREAMING_MIN_ROWS = 10_000_000
+# The full pipeline renders figures only up to this many rows
+PIPELINE_PLOT_MAX_ROWS = 100_000
+
+# A case regresses when it is this much slower / larger than its baseline ...
+TIME_TOLERANCE = 0.3
+MEMORY_TOLERANCE = 0.2
+# ... and the absolute difference is above the noise floor
+MIN_SECONDS_DIFFERENCE = 0.02
+MIN_MEMORY_DIFFERENCE = 1 << 20
+
+def case_key(name: str, params: Dict[str, Any]) -> str:
+    """Stable identifier of a case, e.g. kmeans[d=2,k=4,n_rows=1000]"""
+    return f"{name}[{','.join(f'{key}={value}' for key, value in sorted(params.items()))}]"
+
+def measure(name: str, params: Dict[str, Any], func: Callable[[], Any], repeats: int = 3,
+            profile_memory: bool = True) -> Tuple[Dict[str, Any], Any]:
+    """
+    Time func over repeats runs (output suppressed), then run it once more
+    under tracemalloc for the peak traced allocation (numpy buffers included)
+    Returns: result record, the value returned by the first run
+    """
+    times = []
+    value = None
+    for repeat in range(repeats):
+        gc.collect()
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            result = func()
+            times.append(time.perf_counter() - started)
+        if repeat == 0:
+            value = result
+        del result
+
+    peak_memory = None
+    if profile_memory:
+        gc.collect()
+        tracemalloc.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    seconds = statistics.median(times)
+    n_rows = params.get("n_rows")
+    record = {
+        "key": case_key(name, params),
+        "name": name,
+        "params": params,
+        "repeats": repeats,
+        "seconds": seconds,
+        "seconds_min": min(times),
+        "seconds_max": max(times),
+        "rows_per_second": n_rows / seconds if n_rows and seconds > 0 else None,
+        "peak_memory_bytes": peak_memory
+    }
+    return record, value
+
+def environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count()
+    }
+
+def _max_rss_bytes() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return int(rss if sys.platform == "darwin" else rss * 1024)
+
+def run_benchmarks(sizes: List[int], k_values: List[int], dimensions: List[int], repeats: int = 3,
+                   cases: Optional[List[str]] = None, data_dir: str = str(DEFAULT_DATA_DIR),
+                   random_seed: int = 42, profile_memory: bool = True,
+                   log: Callable[[str], None] = print) -> Dict[str, Any]:
+    """
+    Run the selected cases for every dataset size
+    Datasets are generated once per size under data_dir and reused
+    Returns: machine-readable results (environment plus one record per case)
+    """
+    cases = cases or CASES
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        raise ValueError(f"Unknown benchmark cases: {sorted(unknown)}")
+    results = []
+
+    def record(name, params, func, case_repeats=repeats):
+        entry, value = measure(name, params, func, case_repeats, profile_memory)
+        memory = (f", peak {entry['peak_memory_bytes'] / 2 ** 20:.1f} MiB"
+                  if entry["peak_memory_bytes"] is not None else "")
+        log(f"{entry['key']}: {entry['seconds']:.4f}s{memory}")
+        results.append(entry)
+        return value
+
+    for n_rows in sizes:
+        generated = time.perf_counter()
+        csv_path = write_product_sales_csv(dataset_path(data_dir, n_rows, random_seed), n_rows, random_seed)
+        log(f"dataset {n_rows} rows: {csv_path} ({time.perf_counter() - generated:.1f}s)")
+
+        streaming = n_rows >= STREAMING_MIN_ROWS
+        preprocess = lambda: preprocess_data(csv_path, streaming=streaming)
+        if 'preprocess' in cases:
+            df, _ = record("preprocess_data", {"n_rows": n_rows, "streaming": streaming}, preprocess)
+        elif set(cases) & {'kmeans', 'elbow', 'regression'}:
+            with contextlib.redirect_stdout(io.StringIO()):
+                df, _ = preprocess()
+
+        features = {2: CLUSTERING_FEATURES, len(NORMALIZED_FEATURES): NORMALIZED_FEATURES}
+        if 'kmeans' in cases:
+            for d in dimensions:
+                X = np.ascontiguousarray(df[features[d]].to_numpy(dtype=float))
+                for k in k_values:
+                    record("kmeans", {"n_rows": n_rows, "k": k, "d": d},
+                           lambda: kmeans(X, k, random_seed=random_seed))
+        if 'elbow' in cases:
+            X = np.ascontiguousarray(df[CLUSTERING_FEATURES].to_numpy(dtype=float))
+            record("elbow_method", {"n_rows": n_rows, "k_max": 8},
+                   lambda: elbow_method(X, list(range(2, 9)), random_seed=random_seed))
+        if 'regression' in cases:
+            record("compare_models", {"n_rows": n_rows}, lambda: compare_models(df))
+        if 'pipeline' in cases:
+            make_plots = n_rows <= PIPELINE_PLOT_MAX_ROWS
+            with tempfile.TemporaryDirectory() as output_dir:
+                record("run_complete_analysis", {"n_rows": n_rows, "make_plots": make_plots},
+                       lambda: run_complete_analysis(csv_path, output_dir=os.path.join(output_dir, "results"),
+                                                     image_output_dir=os.path.join(output_dir, "images"),
+                                                     use_cache=False, make_plots=make_plots),
+                       case_repeats=1)
+        df = None
+
+    return {
+        "version": RESULTS_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment(),
+        "max_rss_bytes": _max_rss_bytes(),
+        "results": results
+    }
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any],
+                    time_tolerance: float = TIME_TOLERANCE,
+                    memory_tolerance: float = MEMORY_TOLERANCE) -> Dict[str, Any]:
+    """
+    Compare matching cases (by key) against a baseline run
+    Returns: regressions, improvements, and cases missing from either side
+    """
+    baseline_by_key = {entry["key"]: entry for entry in baseline.get("results", [])}
+    regressions, improvements, new_cases = [], [], []
+    for entry in current["results"]:
+        reference = baseline_by_key.get(entry["key"])
+        if reference is None:
+            new_cases.append(entry["key"])
+            continue
+        # The fastest repeat is the least noisy timing
+        checks = [("seconds_min", time_tolerance, MIN_SECONDS_DIFFERENCE),
+                  ("peak_memory_bytes", memory_tolerance, MIN_MEMORY_DIFFERENCE)]
+        for metric, tolerance, min_difference in checks:
+            before, after = reference.get(metric), entry.get(metric)
+            if not before or after is None:
+                continue
+            change = {"key": entry["key"], "metric": metric, "baseline": before, "current": after,
+                      "ratio": after / before}
+            if after > before * (1 + tolerance) and after - before > min_difference:
+                regressions.append(change)
+            elif after < before / (1 + tolerance) and before - after > min_difference:
+                improvements.append(change)
+    current_keys = {entry["key"] for entry in current["results"]}
+    return {
+        "regressions": regressions,
+        "improvements": improvements,
+        "new_cases": new_cases,
+        "missing_cases": [key for key in baseline_by_key if key not in current_keys],
+        "same_environment": baseline.get("environment") == current.get("environment")
+    }
+
+def _format_change(change: Dict[str, Any]) -> str:
+    if change["metric"] == "seconds_min":
+        values = f"{change['baseline']:.4f}s -> {change['current']:.4f}s"
+    else:
+        values = f"{change['baseline'] / 2 ** 20:.1f} -> {change['current'] / 2 ** 20:.1f} MiB"
+    return f"  {change['key']} {change['metric']}: {values} (x{change['ratio']:.2f})"
+
+def _parse_sizes(text: str) -> List[int]:
+    return [int(float(size)) for size in text.split(",") if size]
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the ML analysis stages on synthetic data")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    parser.add_argument("--sizes", type=_parse_sizes, help="comma-separated row counts, e.g. 1e3,1e5")
+    parser.add_argument("--cases", type=lambda text: text.split(","), help=f"subset of {','.join(CASES)}")
+    parser.add_argument("--repeats", type=int)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run of each case")
+    parser.add_argument("--data-dir", default=str(DEFAULT_DATA_DIR))
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT))
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--update-baseline", action="store_true", help="write these results as the baseline")
+    parser.add_argument("--time-tolerance", type=float, default=TIME_TOLERANCE)
+    parser.add_argument("--memory-tolerance", type=float, default=MEMORY_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    preset = PRESETS[args.preset]
+    results = run_benchmarks(args.sizes or preset["sizes"], preset["k_values"], preset["dimensions"],
+                             args.repeats or preset["repeats"], args.cases, args.data_dir,
+                             profile_memory=not args.no_memory)
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"\nResults written to {output}")
+
+    if args.update_baseline:
+        Path(args.baseline).write_text(json.dumps(results, indent=2))
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+    if not Path(args.baseline).exists():
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+
+    comparison = compare_results(results, json.loads(Path(args.baseline).read_text()),
+                                 args.time_tolerance, args.memory_tolerance)
+    if not comparison["same_environment"]:
+        print("Warning: baseline was recorded in a different environment; timings may not be comparable")
+    if comparison["new_cases"]:
+        print(f"{len(comparison['new_cases'])} case(s) not in the baseline")
+    if comparison["improvements"]:
+        print("Improvements:")
+        print("\n".join(_format_change(change) for change in comparison["improvements"]))
+    if comparison["regressions"]:
+        print(f"\nPERFORMANCE REGRESSIONS ({len(comparison['regressions'])}):")
+        print("\n".join(_format_change(change) for change in comparison["regressions"]))
+        return 1
+    print("No regressions against the baseline")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Synthetic Product Sales Data
+Generates datasets with the product_sales.csv schema, including missing values and outliers
+"""
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Iterator
+
+COLUMNS = ['product_id', 'product_name', 'category', 'price', 'cost', 'units_sold',
+           'promotion_frequency', 'shelf_level', 'profit']
+
+# Product names and (median price, price spread) per category, shaped like product_sales.csv
+CATEGORIES = {
+    'Dairy': (['Whole Milk', 'Greek Yogurt', 'Cheddar Cheese', 'Butter', 'Cream Cheese'], 4.5, 0.6),
+    'Bakery': (['White Bread', 'Bagels', 'Croissants', 'Muffins', 'Sourdough Loaf'], 3.5, 0.5),
+    'Produce': (['Banana', 'Apples', 'Avocado', 'Spinach', 'Tomatoes'], 2.5, 0.7),
+    'Meat': (['Ground Beef', 'Chicken Breast', 'Pork Chops', 'Salmon Fillet', 'Ribeye Steak'], 11.0, 0.6),
+    'Beverages': (['Orange Juice', 'Cola', 'Sparkling Water', 'Coffee Beans', 'Green Tea'], 5.0, 0.6),
+    'Snacks': (['Potato Chips', 'Pretzels', 'Granola Bars', 'Mixed Nuts', 'Popcorn'], 4.0, 0.5)
+}
+
+# Columns that receive missing values (product_id and promotion_frequency stay complete)
+MISSING_COLUMNS = ['product_name', 'category', 'price', 'cost', 'units_sold', 'shelf_level', 'profit']
+
+# Rows generated per block; blocks are seeded by (random_seed, block index)
+GENERATOR_CHUNK_SIZE = 1_000_000
+
+def _generate_block(start: int, n_rows: int, rng: np.random.Generator, missing_rate: float,
+                    outlier_rate: float) -> pd.DataFrame:
+    categories = list(CATEGORIES)
+    category_index = rng.integers(0, len(categories), n_rows)
+    name_index = rng.integers(0, 5, n_rows)
+    median_price = np.array([CATEGORIES[c][1] for c in categories])[category_index]
+    spread = np.array([CATEGORIES[c][2] for c in categories])[category_index]
+
+    price = np.round(median_price * rng.lognormal(0.0, spread), 2)
+    cost = np.round(price * rng.uniform(0.45, 0.8, n_rows), 2)
+    units_sold = np.round(rng.lognormal(5.4, 0.7, n_rows))
+    promotion_frequency = rng.poisson(0.75, n_rows).clip(0, 4).astype(float)
+    shelf_level = rng.integers(1, 5, n_rows).astype(float)
+    profit = np.round((price - cost) * units_sold, 2)
+
+    names = np.array([CATEGORIES[c][0] for c in categories], dtype=object)
+    df = pd.DataFrame({
+        'product_id': np.arange(start + 1, start + n_rows + 1),
+        'product_name': names[category_index, name_index],
+        'category': np.array(categories, dtype=object)[category_index],
+        'price': price,
+        'cost': cost,
+        'units_sold': units_sold,
+        'promotion_frequency': promotion_frequency,
+        'shelf_level': shelf_level,
+        'profit': profit
+    })
+
+    # Outliers: a few prices and volumes an order of magnitude off
+    for col in ('price', 'units_sold', 'profit'):
+        outliers = rng.random(n_rows) < outlier_rate
+        df.loc[outliers, col] = np.round(df.loc[outliers, col] * rng.uniform(5, 20, int(outliers.sum())), 2)
+
+    for col in MISSING_COLUMNS:
+        missing = rng.random(n_rows) < missing_rate
+        df.loc[missing, col] = np.nan
+    return df
+
+def iter_product_sales(n_rows: int, random_seed: int = 42, missing_rate: float = 0.02,
+                       outlier_rate: float = 0.01,
+                       chunk_size: int = GENERATOR_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Yield a synthetic dataset in blocks of chunk_size rows
+    The same (n_rows, random_seed, chunk_size) always gives the same rows
+    """
+    for block, start in enumerate(range(0, n_rows, chunk_size)):
+        rng = np.random.default_rng([random_seed, block])
+        yield _generate_block(start, min(chunk_size, n_rows - start), rng, missing_rate, outlier_rate)
+
+def generate_product_sales(n_rows: int, random_seed: int = 42, missing_rate: float = 0.02,
+                           outlier_rate: float = 0.01) -> pd.DataFrame:
+    """
+    Generate a synthetic dataset in memory
+    Returns: dataframe with the product_sales.csv columns
+    """
+    return pd.concat(list(iter_product_sales(n_rows, random_seed, missing_rate, outlier_rate)),
+                     ignore_index=True)
+
+def write_product_sales_csv(path: str, n_rows: int, random_seed: int = 42, missing_rate: float = 0.02,
+                            outlier_rate: float = 0.01, overwrite: bool = False) -> str:
+    """
+    Write a synthetic CSV block by block, so 1e8 rows never sit in memory
+    An existing file is reused unless overwrite is set
+    Returns: the CSV path
+    """
+    path = Path(path)
+    if path.exists() and not overwrite:
+        return str(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + ".partial")
+    for i, block in enumerate(iter_product_sales(n_rows, random_seed, missing_rate, outlier_rate)):
+        block.to_csv(partial, mode='w' if i == 0 else 'a', header=i == 0, index=False,
+                     float_format='%.2f')
+    partial.replace(path)
+    return str(path)
+
+def dataset_path(data_dir: str, n_rows: int, random_seed: int = 42) -> str:
+    """Canonical file name of a generated dataset inside data_dir"""
+    return str(Path(data_dir) / f"product_sales_{n_rows}_{random_seed}.csv")
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 3:
+        print("Usage: python synthetic.py <n_rows> <output.csv> [random_seed]")
+        sys.exit(1)
+    n_rows = int(float(sys.argv[1]))
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 42
+    print(write_product_sales_csv(sys.argv[2], n_rows, seed, overwrite=True))
@@ -0,0 +1,158 @@
+"""
+Content-Addressed Result Cache
+Stores stage artifacts under a key derived from the input CSV content and stage parameters
+"""
+import hashlib
+import json
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Bump when a stage's output format or semantics change to invalidate old entries
+CACHE_VERSION = 3
+
+def file_sha256(file_path: str, block_size: int = 1 << 20) -> str:
+    """Hash a file's content in fixed-size blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def make_cache_key(stage: str, params: Dict[str, Any], upstream_keys: List[str]) -> str:
+    """Key of a stage run: its name, parameters and the keys of everything it depends on"""
+    payload = json.dumps({
+        "version": CACHE_VERSION,
+        "stage": stage,
+        "params": params,
+        "upstream": upstream_keys
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _has_binary(value: Any) -> bool:
+    """Whether a value holds anything that needs its own file (at any depth)"""
+    if isinstance(value, (pd.DataFrame, np.ndarray, bytes, tuple)):
+        return True
+    return isinstance(value, dict) and any(_has_binary(item) for item in value.values())
+
+def _parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+class ResultCache:
+    """
+    On-disk artifact store: <cache_dir>/<stage>/<key>/
+    DataFrames go to Parquet (pickle without pyarrow), arrays to .npy, bytes to
+    .bin and JSON-compatible values to .json; tuples and dicts of those are
+    described by a manifest so they round-trip with the same structure
+    """
+    def __init__(self, cache_dir: str):
+        self.cache_dir = Path(cache_dir)
+
+    def _entry_dir(self, stage: str, key: str) -> Path:
+        return self.cache_dir / stage / key
+
+    def _save(self, value: Any, directory: Path, name: str) -> Dict[str, Any]:
+        if isinstance(value, pd.DataFrame):
+            if _parquet_available():
+                value.to_parquet(directory / f"{name}.parquet")
+                return {"kind": "parquet", "file": f"{name}.parquet"}
+            value.to_pickle(directory / f"{name}.pkl")
+            return {"kind": "pickle", "file": f"{name}.pkl"}
+        if isinstance(value, np.ndarray):
+            np.save(directory / f"{name}.npy", value)
+            return {"kind": "npy", "file": f"{name}.npy"}
+        if isinstance(value, bytes):
+            (directory / f"{name}.bin").write_bytes(value)
+            return {"kind": "bytes", "file": f"{name}.bin"}
+        if isinstance(value, tuple):
+            return {"kind": "tuple",
+                    "items": [self._save(item, directory, f"{name}_{i}") for i, item in enumerate(value)]}
+        if isinstance(value, dict) and _has_binary(value):
+            return {"kind": "dict",
+                    "items": {key: self._save(item, directory, f"{name}_{i}")
+                              for i, (key, item) in enumerate(value.items())}}
+        with open(directory / f"{name}.json", "w") as f:
+            json.dump(value, f)
+        return {"kind": "json", "file": f"{name}.json"}
+
+    def _load(self, entry: Dict[str, Any], directory: Path) -> Any:
+        kind = entry["kind"]
+        if kind == "parquet":
+            return pd.read_parquet(directory / entry["file"])
+        if kind == "pickle":
+            return pd.read_pickle(directory / entry["file"])
+        if kind == "npy":
+            return np.load(directory / entry["file"])
+        if kind == "bytes":
+            return (directory / entry["file"]).read_bytes()
+        if kind == "tuple":
+            return tuple(self._load(item, directory) for item in entry["items"])
+        if kind == "dict":
+            return {key: self._load(item, directory) for key, item in entry["items"].items()}
+        with open(directory / entry["file"]) as f:
+            return json.load(f)
+
+    def load(self, stage: str, key: str) -> Optional[Any]:
+        """Return the cached output, or None on a miss (or an unreadable entry)"""
+        directory = self._entry_dir(stage, key)
+        manifest_path = directory / "manifest.json"
+        if not manifest_path.exists():
+            return None
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            return self._load(manifest, directory)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def store(self, stage: str, key: str, value: Any):
+        """Write an entry; the manifest goes last so partial writes are never read"""
+        directory = self._entry_dir(stage, key)
+        if directory.exists():
+            shutil.rmtree(directory)
+        directory.mkdir(parents=True)
+        manifest = self._save(value, directory, "output")
+        with open(directory / "manifest.json", "w") as f:
+            json.dump(manifest, f)
+
+class MemoryCache:
+    """
+    Keeps the most recently used entries of a ResultCache loaded in memory
+    (for a long-running process that serves repeated analyses); loads and
+    stores go through to the backing cache, so the disk stays authoritative
+    """
+    def __init__(self, backing: ResultCache, max_entries: int = 16):
+        self.backing = backing
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[tuple, Any]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _remember(self, stage: str, key: str, value: Any):
+        with self.lock:
+            self.entries[(stage, key)] = value
+            self.entries.move_to_end((stage, key))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def load(self, stage: str, key: str) -> Optional[Any]:
+        with self.lock:
+            if (stage, key) in self.entries:
+                self.entries.move_to_end((stage, key))
+                return self.entries[(stage, key)]
+        value = self.backing.load(stage, key)
+        if value is not None:
+            self._remember(stage, key, value)
+        return value
+
+    def store(self, stage: str, key: str, value: Any):
+        self.backing.store(stage, key, value)
+        self._remember(stage, key, value)
@@ -0,0 +1,174 @@
+"""
+Pipeline Instrumentation
+Per-stage wall / CPU time, peak RSS and hot-path counters, with pluggable hooks
+"""
+import contextlib
+import cProfile
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Sequence
+
+# Hot-path counters reported per stage and in total
+COUNTERS = ['distance_evaluations', 'rows_processed', 'bytes_read', 'dataframe_copies']
+
+# Recorders currently collecting counts (innermost last)
+_active_recorders: List['PerformanceRecorder'] = []
+# Stages currently being measured by any recorder; the peak-RSS mark is
+# process-global, so it is only reset when no other stage is measuring
+_measuring_stages = 0
+_lock = threading.Lock()
+
+def count(name: str, amount: int = 1):
+    """
+    Add to a counter of every active recorder; a no-op when none is active
+    Call sites pass whole-chunk amounts, never one call per row
+    """
+    if not _active_recorders:
+        return
+    with _lock:
+        for recorder in _active_recorders:
+            recorder.counters[name] = recorder.counters.get(name, 0) + int(amount)
+
+def count_file_bytes(path) -> None:
+    """Count a file about to be read in full towards bytes_read"""
+    if _active_recorders:
+        try:
+            count('bytes_read', os.path.getsize(path))
+        except OSError:
+            pass
+
+def _proc_status_bytes(field: str) -> Optional[int]:
+    """A kB field of /proc/self/status (Linux), in bytes"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def _reset_peak_rss() -> bool:
+    """Reset this process's peak-RSS mark (Linux); False where unsupported"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size since the last reset (Linux) or process start"""
+    peak = _proc_status_bytes("VmHWM")
+    if peak is not None:
+        return peak
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return int(rss if sys.platform == "darwin" else rss * 1024)
+
+class PerformanceRecorder:
+    """
+    Collects one record per pipeline stage: wall and CPU seconds, peak RSS
+    and the counter increments made while the stage ran
+    Used as a context manager it receives count() calls; stage(name) wraps
+    one stage. Hooks are pluggable: callbacks get every finished stage record,
+    stage_hooks are context-manager factories entered around each stage as
+    hook(name) (e.g. a tracing span). profile_dir dumps a cProfile of each
+    stage to <profile_dir>/<stage>.prof (pstats format: snakeviz, pstats,
+    gprof2dot); external samplers such as py-spy need no hook
+    """
+    def __init__(self, callbacks: Sequence[Callable[[Dict[str, Any]], None]] = (),
+                 stage_hooks: Sequence[Callable[[str], ContextManager]] = (),
+                 profile_dir: Optional[str] = None):
+        self.callbacks = list(callbacks)
+        self.stage_hooks = list(stage_hooks)
+        self.profile_dir = profile_dir
+        self.counters: Dict[str, int] = {name: 0 for name in COUNTERS}
+        self.stages: Dict[str, Dict[str, Any]] = {}
+
+    def __enter__(self) -> 'PerformanceRecorder':
+        with _lock:
+            _active_recorders.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        with _lock:
+            _active_recorders.remove(self)
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """Measure the enclosed block as stage `name`"""
+        global _measuring_stages
+        counters_before = dict(self.counters)
+        with contextlib.ExitStack() as hooks:
+            for hook in self.stage_hooks:
+                hooks.enter_context(hook(name))
+            # Per-stage peak where the kernel allows resetting it and no other stage
+            # (nested, or another recorder's in this process) is measuring; else
+            # the process peak so far
+            with _lock:
+                outermost = _measuring_stages == 0
+                _measuring_stages += 1
+            scope = "stage" if outermost and _reset_peak_rss() else "process"
+            profiler = cProfile.Profile() if self.profile_dir else None
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            if profiler is not None:
+                profiler.enable()
+            try:
+                yield
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                with _lock:
+                    _measuring_stages -= 1
+                record = {
+                    "wall_seconds": time.perf_counter() - wall_start,
+                    "cpu_seconds": time.process_time() - cpu_start,
+                    "peak_rss_bytes": peak_rss_bytes(),
+                    "peak_rss_scope": scope,
+                    "counters": {key: value - counters_before.get(key, 0)
+                                 for key, value in self.counters.items()},
+                    "cached": False
+                }
+                if profiler is not None:
+                    Path(self.profile_dir).mkdir(parents=True, exist_ok=True)
+                    record["profile"] = str(Path(self.profile_dir) / f"{name}.prof")
+                    profiler.dump_stats(record["profile"])
+                self._finish(name, record)
+
+    def record_cached(self, name: str, seconds: float):
+        """Record a stage whose output was loaded from the result cache"""
+        self._finish(name, {"wall_seconds": seconds, "cpu_seconds": None, "peak_rss_bytes": None,
+                            "counters": {key: 0 for key in self.counters}, "cached": True})
+
+    def _finish(self, name: str, record: Dict[str, Any]):
+        self.stages[name] = record
+        for callback in self.callbacks:
+            callback(dict(record, stage=name))
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        JSON-ready totals and per-stage records
+        Returns: the per-run performance record (written to performance.json)
+        """
+        measured = [stage for stage in self.stages.values() if not stage["cached"]]
+        peaks = [stage["peak_rss_bytes"] for stage in measured if stage["peak_rss_bytes"] is not None]
+        scopes = {stage["peak_rss_scope"] for stage in measured}
+        return {
+            "pid": os.getpid(),
+            "wall_seconds": sum(stage["wall_seconds"] for stage in self.stages.values()),
+            "cpu_seconds": sum(stage["cpu_seconds"] for stage in measured),
+            "peak_rss_bytes": max(peaks) if peaks else None,
+            # "stage" only if every measured stage could reset the peak for itself
+            "peak_rss_scope": "process" if "process" in scopes else ("stage" if scopes else None),
+            "counters": dict(self.counters),
+            "stages": self.stages,
+            "profile_dir": self.profile_dir
+        }
@@ -3,105 +3,524 @@ K-means Clustering Implementation from Scratch
 """
 import numpy as np
 import pandas as pd
-from typing import Tuple, List, Dict, Any
+from typing import Tuple, List, Dict, Any, Iterator, Optional, Sequence
 import json
-import random
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from pathlib import Path
+
+from instrumentation import count
+
+# Number of rows per distance block; bounds the n x k matrix to chunk_size x k
+DEFAULT_CHUNK_SIZE = 65536
 
 def euclidean_distance(point1: np.ndarray, point2: np.ndarray) -> float:
     """Calculate Euclidean distance between two points"""
     return np.sqrt(np.sum((point1 - point2) ** 2))
 
-def initialize_centroids_kmeans_plusplus(data: np.ndarray, k: int, random_seed: int = None) -> np.ndarray:
+def row_norms_squared(data: np.ndarray) -> np.ndarray:
+    """Squared L2 norm of every row, computed once and reused across iterations"""
+    return np.einsum('ij,ij->i', data, data)
+
+def iter_distance_blocks(data: np.ndarray, centroids: np.ndarray,
+                         data_norms: Optional[np.ndarray] = None,
+                         chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[int, int, np.ndarray]]:
     """
-    Initialize centroids using K-means++ algorithm
-    This method chooses initial centroids that are far apart
+    Compute squared distances to every centroid in row blocks
+    Uses ||x||^2 - 2 x.c + ||c||^2 so each block is a single matrix product
+    Yields: (start, stop, block) where block has shape (stop - start, k)
     """
-    if random_seed is not None:
-        np.random.seed(random_seed)
-        random.seed(random_seed)
+    n_samples = data.shape[0]
+    chunk_size = max(1, int(chunk_size))
+    centroid_norms = row_norms_squared(centroids)
     
-    n_samples, n_features = data.shape
-    centroids = np.zeros((k, n_features))
+    for start in range(0, n_samples, chunk_size):
+        stop = min(start + chunk_size, n_samples)
+        chunk = data[start:stop]
+        if data_norms is not None:
+            chunk_norms = data_norms[start:stop]
+        else:
+            chunk_norms = row_norms_squared(chunk)
+        
+        block = chunk @ centroids.T
+        block *= -2.0
+        block += chunk_norms[:, np.newaxis]
+        block += centroid_norms[np.newaxis, :]
+        # Cancellation in the expansion can leave tiny negative values
+        np.maximum(block, 0.0, out=block)
+        yield start, stop, block
+
+def pairwise_squared_distances(data: np.ndarray, centroids: np.ndarray,
+                               data_norms: Optional[np.ndarray] = None,
+                               chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
+    """Full n x k squared distance matrix (only use when n x k fits in memory)"""
+    distances = np.empty((data.shape[0], centroids.shape[0]))
+    for start, stop, block in iter_distance_blocks(data, centroids, data_norms, chunk_size):
+        distances[start:stop] = block
+    return distances
+
+def get_rng(random_seed=None) -> np.random.Generator:
+    """
+    Build a local random generator
+    Accepts None, an int seed or an existing Generator; global random state is never touched
+    """
+    if isinstance(random_seed, np.random.Generator):
+        return random_seed
+    return np.random.default_rng(random_seed)
+
+def _min_squared_distances(data: np.ndarray, centers: np.ndarray,
+                           data_norms: Optional[np.ndarray] = None,
+                           chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
+    """Squared distance from every point to its closest center"""
+    result = np.empty(data.shape[0])
+    for start, stop, block in iter_distance_blocks(data, centers, data_norms, chunk_size):
+        result[start:stop] = block.min(axis=1)
+    return result
+
+def _sample_proportional(rng: np.random.Generator, weights: np.ndarray, size: int) -> np.ndarray:
+    """Draw indices with probability proportional to weights (uniform if all zero)"""
+    cumulative = np.cumsum(weights)
+    total = cumulative[-1]
+    if total <= 0:
+        return rng.integers(0, len(weights), size=size)
+    indices = np.searchsorted(cumulative, rng.random(size) * total, side='right')
+    return np.minimum(indices, len(weights) - 1)
+
+def _kmeans_plusplus_indices(data: np.ndarray, k: int, rng: np.random.Generator,
+                             n_local_trials: int = 1, sample_weight: Optional[np.ndarray] = None,
+                             data_norms: Optional[np.ndarray] = None,
+                             chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
+    """
+    Core K-means++ loop over a running min-D² array
+    Each new center costs one vectorized distance pass; with n_local_trials > 1
+    the candidate that most reduces the total potential is kept (greedy K-means++)
+    """
+    n_samples = data.shape[0]
+    if data_norms is None:
+        data_norms = row_norms_squared(data)
+    weights = np.ones(n_samples) if sample_weight is None else np.asarray(sample_weight, dtype=float)
     
-    # Choose first centroid randomly
-    centroids[0] = data[random.randint(0, n_samples - 1)]
+    indices = np.empty(k, dtype=int)
+    indices[0] = _sample_proportional(rng, weights, 1)[0]
+    closest_d2 = _min_squared_distances(data, data[indices[:1]], data_norms, chunk_size)
     
-    # Choose remaining centroids
     for i in range(1, k):
-        distances = np.array([
-            min([euclidean_distance(data[j], centroids[c]) for c in range(i)])
-            for j in range(n_samples)
-        ])
-        
-        # Probability proportional to distance squared
-        probabilities = distances ** 2
-        probabilities /= probabilities.sum()
+        candidates = _sample_proportional(rng, weights * closest_d2, n_local_trials)
+        if n_local_trials == 1:
+            best = candidates[0]
+        else:
+            # Potential after adding each candidate, accumulated block by block
+            potentials = np.zeros(n_local_trials)
+            for start, stop, block in iter_distance_blocks(data, data[candidates],
+                                                           data_norms, chunk_size):
+                np.minimum(block, closest_d2[start:stop, np.newaxis], out=block)
+                potentials += weights[start:stop] @ block
+            best = candidates[int(np.argmin(potentials))]
         
-        # Choose next centroid based on probabilities
-        cumulative_probs = probabilities.cumsum()
-        r = random.random()
-        idx = np.searchsorted(cumulative_probs, r)
-        centroids[i] = data[idx]
+        candidate_d2 = _min_squared_distances(data, data[best:best + 1], data_norms, chunk_size)
+        np.minimum(closest_d2, candidate_d2, out=closest_d2)
+        indices[i] = best
     
-    return centroids
+    return indices
+
+def initialize_centroids_kmeans_plusplus(data: np.ndarray, k: int, random_seed=None,
+                                         n_local_trials: int = 1,
+                                         data_norms: Optional[np.ndarray] = None,
+                                         chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
+    """
+    Initialize centroids using K-means++ algorithm
+    This method chooses initial centroids that are far apart
+    Set n_local_trials > 1 for greedy K-means++ (best of several candidates per step)
+    """
+    rng = get_rng(random_seed)
+    indices = _kmeans_plusplus_indices(data, k, rng, n_local_trials=max(1, int(n_local_trials)),
+                                       data_norms=data_norms, chunk_size=chunk_size)
+    return data[indices].astype(float, copy=True)
+
+def initialize_centroids_kmeans_parallel(data: np.ndarray, k: int, random_seed=None,
+                                         oversampling_factor: float = 2.0, n_rounds: int = 5,
+                                         data_norms: Optional[np.ndarray] = None,
+                                         chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
+    """
+    Initialize centroids using K-means|| (scalable K-means++)
+    Oversamples about oversampling_factor * k candidates per round, then
+    reduces them to k centroids with weighted K-means++
+    """
+    rng = get_rng(random_seed)
+    n_samples = data.shape[0]
+    if data_norms is None:
+        data_norms = row_norms_squared(data)
+    oversampling = oversampling_factor * k
+    
+    candidate_idx = [int(rng.integers(0, n_samples))]
+    closest_d2 = _min_squared_distances(data, data[candidate_idx], data_norms, chunk_size)
+    
+    for _ in range(n_rounds):
+        potential = closest_d2.sum()
+        if potential <= 0:
+            break
+        probabilities = np.minimum(1.0, oversampling * closest_d2 / potential)
+        new_idx = np.flatnonzero(rng.random(n_samples) < probabilities)
+        if len(new_idx) == 0:
+            continue
+        candidate_idx.extend(new_idx.tolist())
+        new_d2 = _min_squared_distances(data, data[new_idx], data_norms, chunk_size)
+        np.minimum(closest_d2, new_d2, out=closest_d2)
+    
+    candidate_idx = np.unique(candidate_idx)
+    candidates = data[candidate_idx].astype(float)
+    if len(candidates) <= k:
+        # Too few distinct candidates: top up with plain K-means++ on the full data
+        return initialize_centroids_kmeans_plusplus(data, k, rng, data_norms=data_norms,
+                                                    chunk_size=chunk_size)
+    
+    # Weight each candidate by the number of points closest to it
+    owner, _ = assign_clusters_with_distances(data, candidates, data_norms, chunk_size)
+    candidate_weights = np.bincount(owner, minlength=len(candidates)).astype(float)
+    
+    chosen = _kmeans_plusplus_indices(candidates, k, rng, n_local_trials=2 + int(np.log(k)),
+                                      sample_weight=candidate_weights, chunk_size=chunk_size)
+    return candidates[chosen]
 
-def initialize_centroids_random(data: np.ndarray, k: int, random_seed: int = None) -> np.ndarray:
+def initialize_centroids_random(data: np.ndarray, k: int, random_seed=None) -> np.ndarray:
     """Initialize centroids randomly"""
-    if random_seed is not None:
-        np.random.seed(random_seed)
+    rng = get_rng(random_seed)
     
     n_samples = data.shape[0]
-    indices = np.random.choice(n_samples, k, replace=False)
-    return data[indices]
+    indices = rng.choice(n_samples, k, replace=False)
+    return data[indices].astype(float, copy=True)
 
-def assign_clusters(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+def initialize_centroids(data: np.ndarray, k: int, init_method: str = 'kmeans++', random_seed=None,
+                         data_norms: Optional[np.ndarray] = None,
+                         chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
     """
-    Assign each data point to the nearest centroid
-    Returns: array of cluster assignments
+    Dispatch to a seeding strategy
+    init_method: 'kmeans++', 'greedy-kmeans++', 'kmeans||' or 'random'
+    """
+    if init_method == 'kmeans++':
+        return initialize_centroids_kmeans_plusplus(data, k, random_seed,
+                                                    data_norms=data_norms, chunk_size=chunk_size)
+    if init_method == 'greedy-kmeans++':
+        return initialize_centroids_kmeans_plusplus(data, k, random_seed,
+                                                    n_local_trials=2 + int(np.log(k)),
+                                                    data_norms=data_norms, chunk_size=chunk_size)
+    if init_method == 'kmeans||':
+        return initialize_centroids_kmeans_parallel(data, k, random_seed,
+                                                    data_norms=data_norms, chunk_size=chunk_size)
+    if init_method == 'random':
+        return initialize_centroids_random(data, k, random_seed)
+    raise ValueError(f"Unknown init_method: {init_method}")
+
+def assign_clusters_with_distances(data: np.ndarray, centroids: np.ndarray,
+                                   data_norms: Optional[np.ndarray] = None,
+                                   chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Assign each data point to the nearest centroid in chunked blocks
+    Returns: cluster assignments and squared distance to the assigned centroid
     """
     n_samples = data.shape[0]
-    n_clusters = centroids.shape[0]
-    assignments = np.zeros(n_samples, dtype=int)
+    assignments = np.empty(n_samples, dtype=int)
+    min_distances = np.empty(n_samples)
     
-    for i in range(n_samples):
-        distances = [euclidean_distance(data[i], centroids[j]) for j in range(n_clusters)]
-        assignments[i] = np.argmin(distances)
+    for start, stop, block in iter_distance_blocks(data, centroids, data_norms, chunk_size):
+        labels = np.argmin(block, axis=1)
+        assignments[start:stop] = labels
+        min_distances[start:stop] = block[np.arange(stop - start), labels]
     
+    return assignments, min_distances
+
+def assign_clusters(data: np.ndarray, centroids: np.ndarray,
+                    data_norms: Optional[np.ndarray] = None,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
+    """
+    Assign each data point to the nearest centroid
+    Returns: array of cluster assignments
+    """
+    assignments, _ = assign_clusters_with_distances(data, centroids, data_norms, chunk_size)
     return assignments
 
-def update_centroids(data: np.ndarray, assignments: np.ndarray, k: int) -> np.ndarray:
+# Below this fraction of relabelled points, cluster sums are patched instead of recomputed
+INCREMENTAL_UPDATE_FRACTION = 0.1
+
+def cluster_sums(data: np.ndarray, assignments: np.ndarray, k: int,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-cluster coordinate sums and point counts in one scatter-add pass
+    (one weighted bincount per feature and block of rows)
+    Returns: sums (k, n_features), counts (k,)
+    """
+    n_samples, n_features = data.shape
+    chunk_size = max(1, int(chunk_size))
+    sums = np.zeros((k, n_features))
+    for start in range(0, n_samples, chunk_size):
+        block = data[start:start + chunk_size]
+        labels = assignments[start:start + chunk_size]
+        for j in range(n_features):
+            sums[:, j] += np.bincount(labels, weights=block[:, j], minlength=k)
+    counts = np.bincount(assignments, minlength=k)
+    return sums, counts
+
+def reseed_empty_clusters(data: np.ndarray, assignments: np.ndarray, centroids: np.ndarray,
+                          sums: np.ndarray, counts: np.ndarray,
+                          chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    Move each empty cluster's centroid onto one of the points farthest from
+    their own centroid (distinct points, so re-seeded clusters cannot coincide),
+    and take that point out of its donor cluster's mean
+    Updates centroids in place
+    Returns: number of clusters re-seeded
+    """
+    empty = np.flatnonzero(counts == 0)
+    if len(empty) == 0:
+        return 0
+    errors = _point_squared_errors(data, assignments, centroids, chunk_size)
+    n_seeds = min(len(empty), len(errors))
+    farthest = np.argpartition(-errors, n_seeds - 1)[:n_seeds] if n_seeds else np.empty(0, dtype=int)
+    farthest = farthest[np.argsort(-errors[farthest], kind='stable')]
+    donor_sums = sums.copy()
+    donor_counts = counts.copy()
+    for cluster, point in zip(empty, farthest):
+        donor = assignments[point]
+        centroids[cluster] = data[point]
+        if donor_counts[donor] > 1:
+            donor_sums[donor] -= data[point]
+            donor_counts[donor] -= 1
+            centroids[donor] = donor_sums[donor] / donor_counts[donor]
+    return n_seeds
+
+def update_centroids(data: np.ndarray, assignments: np.ndarray, k: int,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
     """
     Update centroids based on current cluster assignments
+    Empty clusters are re-seeded from the highest-error points
     Returns: new centroids
     """
-    n_features = data.shape[1]
-    centroids = np.zeros((k, n_features))
+    sums, counts = cluster_sums(data, assignments, k, chunk_size)
+    centroids = sums / np.maximum(counts, 1)[:, None]
+    reseed_empty_clusters(data, assignments, centroids, sums, counts, chunk_size)
+    return centroids
+
+class _CentroidUpdater:
+    """
+    Centroid update step of kmeans() that keeps the per-cluster sums and counts
+    between iterations: when few points changed label only their contributions
+    are moved between clusters, otherwise the sums are recomputed in one pass
+    """
+    def __init__(self, data: np.ndarray, k: int, chunk_size: int):
+        self.data = data
+        self.k = k
+        self.chunk_size = chunk_size
+        self.assignments = None
+        self.full_updates = 0
+        self.incremental_updates = 0
+        self.empty_cluster_reseeds = 0
     
-    for i in range(k):
-        cluster_points = data[assignments == i]
-        if len(cluster_points) > 0:
-            centroids[i] = cluster_points.mean(axis=0)
+    def update(self, assignments: np.ndarray) -> np.ndarray:
+        changed = None
+        if self.assignments is not None:
+            changed = np.flatnonzero(assignments != self.assignments)
+        if changed is None or len(changed) > INCREMENTAL_UPDATE_FRACTION * len(assignments):
+            self.sums, self.counts = cluster_sums(self.data, assignments, self.k, self.chunk_size)
+            self.full_updates += 1
+        elif len(changed):
+            points = self.data[changed]
+            old_labels, new_labels = self.assignments[changed], assignments[changed]
+            for j in range(points.shape[1]):
+                self.sums[:, j] += (np.bincount(new_labels, weights=points[:, j], minlength=self.k)
+                                    - np.bincount(old_labels, weights=points[:, j], minlength=self.k))
+            self.counts += (np.bincount(new_labels, minlength=self.k)
+                            - np.bincount(old_labels, minlength=self.k))
+            self.incremental_updates += 1
         else:
-            # If cluster is empty, keep previous centroid (or reinitialize)
-            centroids[i] = data.mean(axis=0)
-    
-    return centroids
+            self.incremental_updates += 1
+        self.assignments = assignments
+        
+        centroids = self.sums / np.maximum(self.counts, 1)[:, None]
+        self.empty_cluster_reseeds += reseed_empty_clusters(self.data, assignments, centroids, self.sums,
+                                                            self.counts, self.chunk_size)
+        return centroids
 
-def calculate_wcss(data: np.ndarray, assignments: np.ndarray, centroids: np.ndarray) -> float:
+def calculate_wcss(data: np.ndarray, assignments: np.ndarray, centroids: np.ndarray,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE) -> float:
     """
     Calculate Within-Cluster Sum of Squares (WCSS)
     Used for elbow method
     """
+    n_samples = data.shape[0]
+    chunk_size = max(1, int(chunk_size))
     wcss = 0.0
-    for i in range(len(centroids)):
-        cluster_points = data[assignments == i]
-        if len(cluster_points) > 0:
-            wcss += np.sum([euclidean_distance(point, centroids[i]) ** 2 for point in cluster_points])
+    for start in range(0, n_samples, chunk_size):
+        stop = min(start + chunk_size, n_samples)
+        diff = data[start:stop] - centroids[assignments[start:stop]]
+        wcss += float(np.einsum('ij,ij->', diff, diff))
     return wcss
 
+def _exact_distances(points: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """Row-wise Euclidean distance between matching rows of points and centers"""
+    diff = points - centers
+    return np.sqrt(np.einsum('ij,ij->i', diff, diff))
+
+def _half_min_center_separation(centroids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Inter-centroid distances and half the distance from each centroid to its nearest neighbour"""
+    center_distances = np.sqrt(pairwise_squared_distances(centroids, centroids))
+    np.fill_diagonal(center_distances, np.inf)
+    separation = 0.5 * center_distances.min(axis=1)
+    np.fill_diagonal(center_distances, 0.0)
+    return center_distances, separation
+
+class _HamerlyAssigner:
+    """
+    Hamerly's accelerated assignment step
+    Keeps one upper bound (to the assigned centroid) and one lower bound (to the
+    second closest) per point; a point is only re-examined when its bounds overlap
+    """
+    def __init__(self, data: np.ndarray, data_norms: np.ndarray, chunk_size: int):
+        self.data = data
+        self.data_norms = data_norms
+        self.chunk_size = chunk_size
+        self.centroids = None
+        self.distance_evaluations = 0
+        self.distance_evaluations_pruned = 0
+    
+    def _full_assign(self, indices: np.ndarray, centroids: np.ndarray):
+        points = self.data[indices]
+        d = np.sqrt(pairwise_squared_distances(points, centroids, self.data_norms[indices], self.chunk_size))
+        order = np.argsort(d, axis=1)[:, :2] if d.shape[1] > 1 else np.zeros((len(d), 1), dtype=int)
+        rows = np.arange(len(d))
+        self.assignments[indices] = order[:, 0]
+        self.upper[indices] = d[rows, order[:, 0]]
+        self.lower[indices] = d[rows, order[:, 1]] if d.shape[1] > 1 else np.inf
+        self.distance_evaluations += d.size
+    
+    def assign(self, centroids: np.ndarray) -> np.ndarray:
+        n_samples, k = self.data.shape[0], centroids.shape[0]
+        if self.centroids is None:
+            self.assignments = np.empty(n_samples, dtype=int)
+            self.upper = np.empty(n_samples)
+            self.lower = np.empty(n_samples)
+            self._full_assign(np.arange(n_samples), centroids)
+            self.centroids = centroids.copy()
+            return self.assignments.copy()
+        
+        # Loosen the bounds by how far the centroids moved
+        shifts = _exact_distances(centroids, self.centroids)
+        self.centroids = centroids.copy()
+        self.upper += shifts[self.assignments]
+        if k > 1:
+            top = np.argsort(shifts)[-2:][::-1]
+            max_other_shift = np.where(self.assignments == top[0], shifts[top[1]], shifts[top[0]])
+            self.lower -= max_other_shift
+        
+        _, separation = _half_min_center_separation(centroids)
+        bound = np.maximum(separation[self.assignments], self.lower)
+        candidates = np.flatnonzero(self.upper > bound)
+        still = candidates[:0]
+        
+        if len(candidates):
+            # Tighten the upper bound before falling back to all k distances
+            self.upper[candidates] = _exact_distances(self.data[candidates],
+                                                      centroids[self.assignments[candidates]])
+            self.distance_evaluations += len(candidates)
+            still = candidates[self.upper[candidates] > bound[candidates]]
+            if len(still):
+                self._full_assign(still, centroids)
+        
+        self.distance_evaluations_pruned += n_samples * k - (len(candidates) + len(still) * k)
+        return self.assignments.copy()
+
+class _ElkanAssigner(_HamerlyAssigner):
+    """
+    Elkan's accelerated assignment step
+    Keeps one lower bound per (point, centroid) pair plus inter-centroid distances,
+    so individual centroids can be ruled out per point
+    """
+    def _full_assign(self, indices: np.ndarray, centroids: np.ndarray):
+        points = self.data[indices]
+        d = np.sqrt(pairwise_squared_distances(points, centroids, self.data_norms[indices], self.chunk_size))
+        labels = np.argmin(d, axis=1)
+        self.assignments[indices] = labels
+        self.upper[indices] = d[np.arange(len(d)), labels]
+        self.lower[indices] = d
+        self.distance_evaluations += d.size
+    
+    def assign(self, centroids: np.ndarray) -> np.ndarray:
+        n_samples, k = self.data.shape[0], centroids.shape[0]
+        if self.centroids is None:
+            self.assignments = np.empty(n_samples, dtype=int)
+            self.upper = np.empty(n_samples)
+            self.lower = np.empty((n_samples, k))
+            self._full_assign(np.arange(n_samples), centroids)
+            self.centroids = centroids.copy()
+            return self.assignments.copy()
+        
+        shifts = _exact_distances(centroids, self.centroids)
+        self.centroids = centroids.copy()
+        self.upper += shifts[self.assignments]
+        # Negative lower bounds are still valid, so no clamping pass is needed
+        self.lower -= shifts[np.newaxis, :]
+        
+        center_distances, separation = _half_min_center_separation(centroids)
+        active = np.flatnonzero(self.upper > separation[self.assignments])
+        evaluations = 0
+        
+        if len(active):
+            labels = self.assignments[active]
+            half_gaps = 0.5 * center_distances[labels]
+            
+            # Refresh the upper bound only for points with at least one live candidate
+            live = (self.upper[active, np.newaxis] > np.maximum(self.lower[active], half_gaps))
+            live[np.arange(len(active)), labels] = False
+            refresh = live.any(axis=1)
+            idx = active[refresh]
+            tight = _exact_distances(self.data[idx], centroids[self.assignments[idx]])
+            self.upper[idx] = tight
+            self.lower[idx, self.assignments[idx]] = tight
+            evaluations += len(idx)
+            
+            active, labels, half_gaps = idx, labels[refresh], half_gaps[refresh]
+            live = (self.upper[active, np.newaxis] > np.maximum(self.lower[active], half_gaps))
+            live[np.arange(len(active)), labels] = False
+            rows, cols = np.nonzero(live)
+            
+            if len(rows):
+                # Evaluate every surviving (point, centroid) pair in one batch
+                point_idx = active[rows]
+                d = _exact_distances(self.data[point_idx], centroids[cols])
+                evaluations += len(d)
+                self.lower[point_idx, cols] = d
+                
+                touched, local_rows = np.unique(rows, return_inverse=True)
+                candidate_d = np.full((len(touched), k), np.inf)
+                candidate_d[local_rows, cols] = d
+                best = np.argmin(candidate_d, axis=1)
+                best_d = candidate_d[np.arange(len(touched)), best]
+                moved = active[touched]
+                closer = best_d < self.upper[moved]
+                self.assignments[moved[closer]] = best[closer]
+                self.upper[moved[closer]] = best_d[closer]
+        
+        self.distance_evaluations += evaluations
+        self.distance_evaluations_pruned += n_samples * k - evaluations
+        return self.assignments.copy()
+
+ACCELERATED_ASSIGNERS = {
+    'hamerly': _HamerlyAssigner,
+    'elkan': _ElkanAssigner
+}
+
+def _count_fit(info: Dict[str, Any], n_samples: int):
+    """Report a finished fit's distance evaluations and rows visited to the instrumentation"""
+    count('distance_evaluations', info["distance_evaluations"])
+    count('rows_processed', n_samples * (info["iterations"] + 1))
+
 def kmeans(data: np.ndarray, k: int, max_iterations: int = 100, 
           tolerance: float = 1e-4, init_method: str = 'kmeans++', 
-          random_seed: int = None) -> Tuple[np.ndarray, np.ndarray, Dict[str, Any]]:
+          random_seed: int = None,
+          chunk_size: int = DEFAULT_CHUNK_SIZE,
+          algorithm: str = 'lloyd',
+          initial_centroids: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, Dict[str, Any]]:
     """
     K-means clustering algorithm from scratch
     
@@ -110,34 +529,53 @@ def kmeans(data: np.ndarray, k: int, max_iterations: int = 100,
     - k: number of clusters
     - max_iterations: maximum number of iterations
     - tolerance: convergence threshold
-    - init_method: 'kmeans++' or 'random'
-    - random_seed: random seed for reproducibility
+    - init_method: 'kmeans++', 'greedy-kmeans++', 'kmeans||' or 'random'
+    - random_seed: random seed (or np.random.Generator) for reproducibility
+    - chunk_size: rows per distance block (bounds memory to chunk_size x k)
+    - algorithm: 'lloyd', or 'hamerly' / 'elkan' to skip distance evaluations
+      with triangle-inequality bounds (same result, fewer distances; Elkan prunes
+      more, Hamerly keeps O(n) bounds and is usually faster for few features)
+    - initial_centroids: start from these centroids instead of seeding (warm start)
     
     Returns:
     - assignments: cluster assignments for each data point
     - centroids: final centroids
     - info: dictionary with algorithm information
     """
+    # Row norms never change, so compute them once for every distance block
+    data_norms = row_norms_squared(data)
+    
     # Initialize centroids
-    if init_method == 'kmeans++':
-        centroids = initialize_centroids_kmeans_plusplus(data, k, random_seed)
+    if initial_centroids is not None:
+        centroids = np.array(initial_centroids, dtype=float)
     else:
-        centroids = initialize_centroids_random(data, k, random_seed)
+        centroids = initialize_centroids(data, k, init_method, random_seed, data_norms, chunk_size)
+    
+    if algorithm != 'lloyd' and algorithm not in ACCELERATED_ASSIGNERS:
+        raise ValueError(f"Unknown algorithm: {algorithm}")
+    assigner = None
+    if algorithm in ACCELERATED_ASSIGNERS:
+        assigner = ACCELERATED_ASSIGNERS[algorithm](data, data_norms, chunk_size)
+    distance_evaluations = 0
     
+    updater = _CentroidUpdater(data, k, chunk_size)
     previous_centroids = centroids.copy()
     iterations = 0
     converged = False
     
     for iteration in range(max_iterations):
         # Assign points to nearest centroid
-        assignments = assign_clusters(data, centroids)
+        if assigner is None:
+            assignments = assign_clusters(data, centroids, data_norms, chunk_size)
+            distance_evaluations += data.shape[0] * k
+        else:
+            assignments = assigner.assign(centroids)
         
         # Update centroids
-        centroids = update_centroids(data, assignments, k)
+        centroids = updater.update(assignments)
         
         # Check for convergence
-        centroid_shift = np.sum([euclidean_distance(centroids[i], previous_centroids[i]) 
-                                 for i in range(k)])
+        centroid_shift = float(np.sqrt(((centroids - previous_centroids) ** 2).sum(axis=1)).sum())
         
         if centroid_shift < tolerance:
             converged = True
@@ -147,58 +585,602 @@ def kmeans(data: np.ndarray, k: int, max_iterations: int = 100,
         iterations += 1
     
     # Calculate WCSS
-    wcss = calculate_wcss(data, assignments, centroids)
+    wcss = calculate_wcss(data, assignments, centroids, chunk_size)
+    
+    distance_evaluations_pruned = 0
+    if assigner is not None:
+        distance_evaluations = assigner.distance_evaluations
+        distance_evaluations_pruned = assigner.distance_evaluations_pruned
     
     info = {
         "iterations": iterations,
         "converged": converged,
         "wcss": float(wcss),
-        "final_centroids": centroids.tolist()
+        "final_centroids": centroids.tolist(),
+        "algorithm": algorithm,
+        "distance_evaluations": int(distance_evaluations),
+        "distance_evaluations_pruned": int(distance_evaluations_pruned),
+        "centroid_updates": {"full": updater.full_updates, "incremental": updater.incremental_updates},
+        "empty_cluster_reseeds": updater.empty_cluster_reseeds
     }
+    _count_fit(info, data.shape[0])
     
     return assignments, centroids, info
 
+def iter_batches(source, batch_size: int, feature_cols: Optional[List[str]] = None,
+                 rng: Optional[np.random.Generator] = None, dropna: bool = True) -> Iterator[np.ndarray]:
+    """
+    Stream one pass over the data in fixed-size float batches
+    source can be an array or np.memmap (sampled without replacement when rng is
+    given, sorted per batch for sequential reads) or a CSV path read in chunks.
+    Rows with a missing feature are dropped from each batch unless dropna is False
+    """
+    for batch in _source_batches(source, batch_size, feature_cols, rng):
+        if dropna:
+            batch = batch[~np.isnan(batch).any(axis=1)]
+            if not len(batch):
+                continue
+        yield batch
+
+def _source_batches(source, batch_size: int, feature_cols: Optional[List[str]],
+                    rng: Optional[np.random.Generator]) -> Iterator[np.ndarray]:
+    """Raw batches of source, missing values included"""
+    if isinstance(source, (str, Path)):
+        if feature_cols is None:
+            raise ValueError("feature_cols is required when streaming from a CSV file")
+        for chunk in pd.read_csv(source, usecols=feature_cols, chunksize=batch_size):
+            yield chunk[feature_cols].to_numpy(dtype=float)
+        return
+    
+    n_samples = source.shape[0]
+    if rng is None:
+        for start in range(0, n_samples, batch_size):
+            yield np.asarray(source[start:start + batch_size], dtype=float)
+        return
+    
+    order = rng.permutation(n_samples)
+    for start in range(0, n_samples, batch_size):
+        yield np.asarray(source[np.sort(order[start:start + batch_size])], dtype=float)
+
+def _reservoir_sample(batches: Iterator[np.ndarray], size: int,
+                      rng: np.random.Generator) -> Tuple[np.ndarray, int]:
+    """
+    Uniform sample of up to size rows from a stream of batches, in one pass
+    Returns: the sample, number of rows in the stream
+    """
+    reservoir = None
+    n_seen = 0
+    for batch in batches:
+        if reservoir is None:
+            reservoir = np.empty((size, batch.shape[1]))
+        n_fill = min(max(size - n_seen, 0), len(batch))
+        reservoir[n_seen:n_seen + n_fill] = batch[:n_fill]
+        rest = batch[n_fill:]
+        if len(rest):
+            positions = n_seen + n_fill + np.arange(len(rest))
+            slots = rng.integers(0, positions + 1)
+            keep = slots < size
+            reservoir[slots[keep]] = rest[keep]
+        n_seen += len(batch)
+    if reservoir is None:
+        raise ValueError("Cannot cluster an empty data source")
+    return reservoir[:min(size, n_seen)], n_seen
+
+def minibatch_kmeans(source, k: int, batch_size: int = 1024, max_iterations: int = 100,
+                     tolerance: float = 0.0, max_no_improvement: int = 10,
+                     init_method: str = 'kmeans++', init_size: Optional[int] = None,
+                     random_seed=None, feature_cols: Optional[List[str]] = None,
+                     compute_labels: bool = True, smoothing: Optional[float] = None,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[Optional[np.ndarray], np.ndarray, Dict[str, Any]]:
+    """
+    Mini-batch K-means for data that does not fit comfortably in memory
+    
+    Parameters:
+    - source: numpy array, np.memmap or CSV path (with feature_cols)
+    - k: number of clusters
+    - batch_size: rows per mini-batch
+    - max_iterations: maximum number of passes (epochs) over the source
+    - tolerance: stop when the mean squared centroid shift of a batch falls below this
+    - max_no_improvement: stop after this many batches without a better smoothed inertia,
+      counted once the moving average has warmed up (1 / smoothing batches)
+    - init_method: seeding strategy, applied to the first init_size rows
+    - init_size: rows used for seeding (default 3 * batch_size, at least k)
+    - random_seed: random seed (or np.random.Generator) for reproducibility
+    - feature_cols: columns to read when source is a CSV path
+    - compute_labels: run a final full pass for complete assignments and exact WCSS
+    - smoothing: weight of each batch in the inertia moving average (default batch_size / n)
+    - chunk_size: rows per distance block
+    
+    Returns:
+    - assignments: cluster assignments, -1 for rows with a missing feature (None when
+      compute_labels is False)
+    - centroids: final centroids
+    - info: dictionary with algorithm information
+    """
+    if smoothing is not None and not 0.0 < smoothing <= 1.0:
+        raise ValueError(f"smoothing must be in (0, 1], got {smoothing}")
+    rng = get_rng(random_seed)
+    is_array = not isinstance(source, (str, Path))
+    batch_rng = rng if is_array else None
+    
+    init_size = max(k, init_size if init_size is not None else 3 * batch_size)
+    if is_array:
+        n_samples = source.shape[0]
+        n_init = min(init_size, n_samples)
+        init_data = np.asarray(source[np.sort(rng.choice(n_samples, n_init, replace=False))],
+                               dtype=float)
+    else:
+        # File order may be sorted, so seed on a reservoir sample of the whole stream
+        init_data, n_samples = _reservoir_sample(iter_batches(source, batch_size, feature_cols),
+                                                 init_size, rng)
+    # Rows with a missing feature must not become seeds (the batches drop them too)
+    init_data = init_data[~np.isnan(init_data).any(axis=1)]
+    if len(init_data) < k:
+        raise ValueError(f"Only {len(init_data)} complete rows in the seeding sample, need at least k={k}")
+    centroids = initialize_centroids(init_data, k, init_method, rng, chunk_size=chunk_size)
+    
+    # The moving average spans about 1 / alpha batches (one pass by default); the
+    # no-improvement counter only starts once it has covered that window
+    alpha = smoothing if smoothing is not None else min(1.0, batch_size / max(n_samples, 1))
+    warmup_batches = int(np.ceil(1.0 / alpha))
+    
+    counts = np.zeros(k)
+    smoothed_inertia = None
+    best_inertia = np.inf
+    no_improvement = 0
+    n_batches = 0
+    n_samples_seen = 0
+    epochs = 0
+    converged = False
+    
+    for epoch in range(max_iterations):
+        epoch_rows = 0
+        for batch in iter_batches(source, batch_size, feature_cols, batch_rng):
+            labels, d2 = assign_clusters_with_distances(batch, centroids, chunk_size=chunk_size)
+            batch_counts = np.bincount(labels, minlength=k).astype(float)
+            batch_sums = np.zeros_like(centroids)
+            np.add.at(batch_sums, labels, batch)
+            
+            # Per-centroid learning rate: batch share of all points seen by that centroid
+            counts += batch_counts
+            seen = batch_counts > 0
+            eta = batch_counts[seen] / counts[seen]
+            old_centroids = centroids.copy()
+            centroids[seen] = ((1.0 - eta)[:, np.newaxis] * centroids[seen]
+                               + eta[:, np.newaxis] * (batch_sums[seen] / batch_counts[seen, np.newaxis]))
+            
+            n_batches += 1
+            n_samples_seen += len(batch)
+            epoch_rows += len(batch)
+            
+            # Exponentially weighted average of the per-sample batch inertia
+            batch_inertia = float(d2.sum()) / len(batch)
+            if smoothed_inertia is None:
+                smoothed_inertia = batch_inertia
+            else:
+                smoothed_inertia = (1.0 - alpha) * smoothed_inertia + alpha * batch_inertia
+            
+            if smoothed_inertia < best_inertia:
+                best_inertia = smoothed_inertia
+                no_improvement = 0
+            elif n_batches > warmup_batches and (is_array or epoch > 0):
+                # Unshuffled streams drift with file order during the first pass
+                no_improvement += 1
+            
+            shift = float(((centroids - old_centroids) ** 2).sum(axis=1).mean())
+            if (tolerance > 0 and shift <= tolerance) or no_improvement >= max_no_improvement:
+                converged = True
+                break
+        
+        epochs += 1
+        if converged or epoch_rows == 0:
+            break
+    
+    assignments = None
+    wcss = None
+    rows_with_missing = None
+    if compute_labels:
+        # Final full pass in stream order so labels line up with the source rows
+        label_parts = []
+        wcss = 0.0
+        rows_with_missing = 0
+        for batch in iter_batches(source, chunk_size, feature_cols, dropna=False):
+            missing = np.isnan(batch).any(axis=1)
+            labels = np.full(len(batch), -1, dtype=int)
+            labels[~missing], d2 = assign_clusters_with_distances(batch[~missing], centroids,
+                                                                  chunk_size=chunk_size)
+            label_parts.append(labels)
+            wcss += float(d2.sum())
+            rows_with_missing += int(missing.sum())
+        assignments = np.concatenate(label_parts) if label_parts else np.empty(0, dtype=int)
+    
+    info = {
+        "iterations": epochs,
+        "converged": converged,
+        "wcss": float(wcss) if wcss is not None else None,
+        "final_centroids": centroids.tolist(),
+        "n_batches": n_batches,
+        "n_samples_seen": n_samples_seen,
+        "warmup_batches": warmup_batches,
+        "rows_with_missing": rows_with_missing,
+        "smoothed_inertia": float(smoothed_inertia) if smoothed_inertia is not None else None
+    }
+    
+    return assignments, centroids, info
+
+def _restart_seeds(random_seed, n_restarts: int) -> List[Optional[int]]:
+    """Seeds for each restart; the first restart keeps random_seed so n_restarts=1 is unchanged"""
+    if random_seed is None:
+        return [None] * n_restarts
+    extra = np.random.SeedSequence(random_seed).generate_state(max(n_restarts - 1, 0))
+    return [random_seed] + [int(seed) for seed in extra]
+
+# Shared-memory view of the elbow data inside each pool worker
+_shared_data = None
+_shared_block = None
+
+def _attach_shared_data(name: str, shape: Tuple[int, ...], dtype: str):
+    """Pool initializer: map the parent's shared-memory block instead of unpickling data"""
+    global _shared_data, _shared_block
+    _shared_block = shared_memory.SharedMemory(name=name)
+    _shared_data = np.ndarray(shape, dtype=dtype, buffer=_shared_block.buf)
+
+def _elbow_job(k: int, seed, kmeans_kwargs: Dict[str, Any]) -> Tuple[int, float, Dict[str, Any]]:
+    """Run one (k, seed) fit against the shared data"""
+    _, _, info = kmeans(_shared_data, k, random_seed=seed, **kmeans_kwargs)
+    return k, info["wcss"], info
+
 def elbow_method(data: np.ndarray, k_range: List[int], 
-                init_method: str = 'kmeans++', random_seed: int = None) -> Dict[int, float]:
+                init_method: str = 'kmeans++', random_seed: int = None,
+                n_restarts: int = 1, n_jobs: Optional[int] = 1,
+                warm_start: Optional[str] = None,
+                **kmeans_kwargs) -> Dict[int, float]:
     """
     Perform elbow method to find optimal k
+    Each k keeps the best WCSS of n_restarts seeded runs. With n_jobs > 1 (or
+    None / -1 for all cores) every (k, seed) job runs in its own process and
+    reads the data from shared memory. warm_start ('split' or 'kmeans++')
+    switches to the sequential incremental_elbow_method sweep, a single run
+    per k, so it cannot be combined with n_restarts > 1 or n_jobs != 1
     Returns: dictionary mapping k to WCSS
     """
-    wcss_values = {}
+    if warm_start is not None:
+        if n_restarts > 1 or n_jobs != 1:
+            raise ValueError(f"warm_start={warm_start!r} runs one sequential sweep; "
+                             f"got n_restarts={n_restarts}, n_jobs={n_jobs}")
+        sweep = incremental_elbow_method(data, k_range, warm_start, init_method,
+                                         random_seed, **kmeans_kwargs)
+        return {k: result["wcss"] for k, result in sweep.items()}
     
-    for k in k_range:
-        _, _, info = kmeans(data, k, init_method=init_method, random_seed=random_seed)
-        wcss_values[k] = info["wcss"]
+    seeds = _restart_seeds(random_seed, n_restarts)
+    kmeans_kwargs = dict(kmeans_kwargs, init_method=init_method)
+    # Largest k first: those jobs run longest, so the tail of the pool stays short
+    jobs = [(k, seed) for k in sorted(k_range, reverse=True) for seed in seeds]
     
-    return wcss_values
+    if n_jobs is None or n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = min(n_jobs, len(jobs))
+    
+    best_wcss = {}
+    if n_jobs <= 1:
+        for k, seed in jobs:
+            _, _, info = kmeans(data, k, random_seed=seed, **kmeans_kwargs)
+            best_wcss[k] = min(best_wcss.get(k, np.inf), info["wcss"])
+    else:
+        data = np.ascontiguousarray(data)
+        block = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+        try:
+            np.ndarray(data.shape, dtype=data.dtype, buffer=block.buf)[...] = data
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_attach_shared_data,
+                                     initargs=(block.name, data.shape, data.dtype.str)) as pool:
+                futures = [pool.submit(_elbow_job, k, seed, kmeans_kwargs) for k, seed in jobs]
+                for future in as_completed(futures):
+                    k, wcss, info = future.result()
+                    # Counts made in the worker process are not seen by this one's recorders
+                    _count_fit(info, data.shape[0])
+                    best_wcss[k] = min(best_wcss.get(k, np.inf), wcss)
+        finally:
+            block.close()
+            block.unlink()
+    
+    return {k: float(best_wcss[k]) for k in k_range}
 
-def analyze_clusters(df: pd.DataFrame, assignments: np.ndarray, centroids: np.ndarray, 
-                    feature_cols: List[str]) -> Dict[str, Any]:
+def _point_squared_errors(data: np.ndarray, assignments: np.ndarray, centroids: np.ndarray,
+                          chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
+    """Squared distance from every point to its assigned centroid"""
+    errors = np.empty(data.shape[0])
+    for start in range(0, data.shape[0], chunk_size):
+        stop = min(start + chunk_size, data.shape[0])
+        diff = data[start:stop] - centroids[assignments[start:stop]]
+        errors[start:stop] = np.einsum('ij,ij->i', diff, diff)
+    return errors
+
+def grow_centroids(data: np.ndarray, assignments: np.ndarray, centroids: np.ndarray,
+                   strategy: str = 'split', random_seed=None,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
     """
-    Analyze cluster characteristics
-    Returns: dictionary with cluster statistics
+    Add one centroid to an existing solution to seed the k+1 run
+    - 'split': replace the highest-WCSS centroid by two points along its principal axis
+    - 'kmeans++': add one K-means++ draw proportional to the current D²
     """
-    k = len(centroids)
-    cluster_stats = {}
+    k = centroids.shape[0]
+    errors = _point_squared_errors(data, assignments, centroids, chunk_size)
+    
+    if strategy == 'kmeans++':
+        new_index = _sample_proportional(get_rng(random_seed), errors, 1)[0]
+        return np.vstack([centroids, data[new_index]])
+    if strategy != 'split':
+        raise ValueError(f"Unknown warm start strategy: {strategy}")
+    
+    cluster_wcss = np.bincount(assignments, weights=errors, minlength=k)
+    target = int(np.argmax(cluster_wcss))
+    members = data[assignments == target]
+    if len(members) < 2:
+        return np.vstack([centroids, centroids[target]])
+    
+    # For a Gaussian cluster the two half-means sit sqrt(2 * lambda / pi) along the top axis
+    covariance = np.atleast_2d(np.cov(members, rowvar=False))
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    offset = np.sqrt(2.0 * max(eigenvalues[-1], 0.0) / np.pi) * eigenvectors[:, -1]
+    grown = np.vstack([centroids, centroids[target] + offset])
+    grown[target] = centroids[target] - offset
+    return grown
+
+def incremental_elbow_method(data: np.ndarray, k_range: List[int], strategy: str = 'split',
+                             init_method: str = 'kmeans++', random_seed=None,
+                             **kmeans_kwargs) -> Dict[int, Dict[str, Any]]:
+    """
+    Elbow sweep where each k is warm-started from the previous solution
+    Only the smallest k is seeded from scratch; later runs start from
+    grow_centroids() and typically converge in a few iterations
+    Returns: dictionary mapping k to {"wcss", "iterations", "wall_time"}
+    """
+    rng = get_rng(random_seed)
+    results = {}
+    assignments = centroids = None
     
-    for i in range(k):
-        cluster_mask = assignments == i
-        cluster_data = df[cluster_mask]
+    for k in sorted(k_range):
+        start_time = time.perf_counter()
+        initial = None
+        if centroids is not None:
+            initial = centroids
+            while initial.shape[0] < k:
+                labels = assignments if initial is centroids else assign_clusters(data, initial)
+                initial = grow_centroids(data, labels, initial, strategy, rng)
         
-        if len(cluster_data) == 0:
-            continue
+        if initial is None:
+            assignments, centroids, info = kmeans(data, k, init_method=init_method,
+                                                  random_seed=rng, **kmeans_kwargs)
+        else:
+            assignments, centroids, info = kmeans(data, k, initial_centroids=initial, **kmeans_kwargs)
         
-        stats = {
-            "count": int(cluster_mask.sum()),
-            "avg_price": float(cluster_data['price'].mean()),
-            "avg_cost": float(cluster_data['cost'].mean()),
-            "avg_units_sold": float(cluster_data['units_sold'].mean()),
-            "avg_profit": float(cluster_data['profit'].mean()),
-            "avg_promotion_frequency": float(cluster_data['promotion_frequency'].mean()),
-            "avg_shelf_level": float(cluster_data['shelf_level'].mean()),
-            "categories": cluster_data['category'].value_counts().to_dict()
+        results[k] = {
+            "wcss": info["wcss"],
+            "iterations": info["iterations"],
+            "wall_time": time.perf_counter() - start_time
         }
+    
+    return results
+
+def find_knee(k_values: List[int], wcss_values: List[float],
+              sensitivity: float = 1.0) -> Dict[str, Any]:
+    """
+    Kneedle knee detection on a decreasing, convex WCSS curve
+    The knee is the point farthest above the chord of the normalized curve; it
+    is confirmed once the difference curve later drops below the Kneedle threshold
+    Returns: {"knee": k or None, "confirmed": bool, "difference": [...]}
+    """
+    x = np.asarray(k_values, dtype=float)
+    y = np.asarray(wcss_values, dtype=float)
+    if len(x) < 3 or y.max() == y.min():
+        return {"knee": None, "confirmed": False, "difference": []}
+    
+    x_norm = (x - x.min()) / (x.max() - x.min())
+    y_norm = (y.max() - y) / (y.max() - y.min())
+    difference = y_norm - x_norm
+    
+    knee_index = int(np.argmax(difference))
+    if knee_index == 0 or knee_index == len(x) - 1:
+        return {"knee": None, "confirmed": False, "difference": difference.tolist()}
+    
+    threshold = difference[knee_index] - sensitivity * np.mean(np.diff(x_norm))
+    confirmed = bool((difference[knee_index + 1:] < threshold).any())
+    return {"knee": int(x[knee_index]), "confirmed": confirmed, "difference": difference.tolist()}
+
+def silhouette_score_sampled(data: np.ndarray, assignments: np.ndarray, sample_size: int = 1000,
+                             random_seed=None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> float:
+    """
+    Mean silhouette coefficient on a random sample of points
+    Uses the chunked distance blocks, so cost is O(sample_size^2) regardless of n
+    """
+    rng = get_rng(random_seed)
+    n_samples = data.shape[0]
+    if sample_size < n_samples:
+        sample = np.sort(rng.choice(n_samples, sample_size, replace=False))
+        points, labels = np.asarray(data[sample], dtype=float), assignments[sample]
+    else:
+        points, labels = np.asarray(data, dtype=float), assignments
+    
+    cluster_ids, labels = np.unique(labels, return_inverse=True)
+    if len(cluster_ids) < 2:
+        return 0.0
+    counts = np.bincount(labels).astype(float)
+    one_hot = np.zeros((len(points), len(cluster_ids)))
+    one_hot[np.arange(len(points)), labels] = 1.0
+    
+    # Per-point sum of distances to every cluster, one block of rows at a time
+    distance_sums = np.empty((len(points), len(cluster_ids)))
+    for start, stop, block in iter_distance_blocks(points, points, chunk_size=chunk_size):
+        distance_sums[start:stop] = np.sqrt(block) @ one_hot
+    
+    rows = np.arange(len(points))
+    own_counts = counts[labels] - 1.0
+    intra = np.where(own_counts > 0, distance_sums[rows, labels] / np.maximum(own_counts, 1.0), 0.0)
+    mean_other = distance_sums / counts[np.newaxis, :]
+    mean_other[rows, labels] = np.inf
+    nearest = mean_other.min(axis=1)
+    
+    scores = np.where(own_counts > 0, (nearest - intra) / np.maximum(np.maximum(intra, nearest), 1e-12), 0.0)
+    return float(scores.mean())
+
+def select_optimal_k(data: np.ndarray, k_range: List[int], random_seed=None,
+                     use_silhouette: bool = False, silhouette_sample_size: int = 1000,
+                     sensitivity: float = 1.0, patience: int = 2, flat_tolerance: float = 0.15,
+                     **kmeans_kwargs) -> Dict[str, Any]:
+    """
+    Choose k from the elbow curve with Kneedle, stopping the sweep early
+    A knee found on a partial curve can still move, so the sweep only stops
+    once the knee is confirmed, at least `patience` k values past it have been
+    evaluated, and the WCSS gained past the knee is at most `flat_tolerance`
+    of the WCSS gained up to it. With use_silhouette the sampled silhouette
+    score is computed for each evaluated k and the best of knee-1..knee+1 is chosen
+    Returns: dictionary with optimal_k, wcss_values and selection details
+    """
+    k_values = sorted(k_range)
+    wcss_values = {}
+    centroids_by_k = {}
+    knee_info = {"knee": None, "confirmed": False, "difference": []}
+    
+    for k in k_values:
+        _, centroids, info = kmeans(data, k, random_seed=random_seed, **kmeans_kwargs)
+        wcss_values[k] = info["wcss"]
+        centroids_by_k[k] = centroids
         
+        knee_info = find_knee(list(wcss_values), list(wcss_values.values()), sensitivity)
+        knee = knee_info["knee"]
+        if knee is None or not knee_info["confirmed"] or k == k_values[-1]:
+            continue
+        past_knee = [key for key in wcss_values if key > knee]
+        gained = wcss_values[k_values[0]] - wcss_values[knee]
+        remaining = wcss_values[knee] - wcss_values[k]
+        if len(past_knee) >= patience and remaining <= flat_tolerance * gained:
+            break
+    
+    evaluated = list(wcss_values)
+    optimal_k = knee_info["knee"]
+    method = "kneedle"
+    if optimal_k is None:
+        # No knee: fall back to the largest relative drop in WCSS
+        drops = [(wcss_values[a] - wcss_values[b]) / max(wcss_values[a], 1e-12)
+                 for a, b in zip(evaluated, evaluated[1:])]
+        optimal_k = evaluated[int(np.argmax(drops)) + 1] if drops else evaluated[0]
+        method = "largest_drop"
+    
+    silhouette_scores = {}
+    if use_silhouette:
+        rng = get_rng(random_seed)
+        n_sample = min(silhouette_sample_size, data.shape[0])
+        sample = np.sort(rng.choice(data.shape[0], n_sample, replace=False))
+        points = np.asarray(data[sample], dtype=float)
+        for k in evaluated:
+            labels = assign_clusters(points, centroids_by_k[k])
+            silhouette_scores[k] = silhouette_score_sampled(points, labels, n_sample)
+        neighbours = [k for k in (optimal_k - 1, optimal_k, optimal_k + 1) if k in silhouette_scores]
+        best = max(neighbours, key=lambda k: silhouette_scores[k])
+        if best != optimal_k:
+            optimal_k, method = best, f"{method}+silhouette"
+    
+    return {
+        "optimal_k": int(optimal_k),
+        "method": method,
+        "wcss_values": wcss_values,
+        "evaluated_k": evaluated,
+        "stopped_early": len(evaluated) < len(k_values),
+        "knee_confirmed": knee_info["confirmed"],
+        "silhouette_scores": silhouette_scores
+    }
+
+# Numeric columns profiled per cluster (reported as avg_<column>)
+PROFILE_COLUMNS = ['price', 'cost', 'units_sold', 'profit', 'promotion_frequency', 'shelf_level']
+
+def cluster_category_crosstab(assignments: np.ndarray, categories: pd.Series,
+                              k: int) -> Tuple[np.ndarray, List[Any]]:
+    """
+    Cluster x category counts from the category codes in one bincount
+    (missing categories are not counted)
+    Returns: (k, n_categories) count matrix, category labels
+    """
+    if isinstance(categories.dtype, pd.CategoricalDtype):
+        codes = categories.cat.codes.to_numpy()
+        labels = list(categories.cat.categories)
+    else:
+        codes, uniques = pd.factorize(categories, sort=True)
+        labels = list(uniques)
+    n_categories = len(labels)
+    present = codes >= 0
+    flat = assignments[present].astype(np.intp) * n_categories + codes[present]
+    counts = np.bincount(flat, minlength=k * n_categories)
+    return counts.reshape(k, n_categories), labels
+
+def _segment_quantiles(sorted_values: np.ndarray, starts: np.ndarray, counts: np.ndarray,
+                       q: float) -> np.ndarray:
+    """Linear-interpolated quantile of each non-empty segment of per-cluster sorted values"""
+    position = q * (counts - 1)
+    below = np.floor(position).astype(np.intp)
+    above = np.minimum(below + 1, counts - 1)
+    fraction = position - below
+    low = sorted_values[starts + below]
+    high = sorted_values[starts + above]
+    return low + (high - low) * fraction
+
+def analyze_clusters(df: pd.DataFrame, assignments: np.ndarray, centroids: np.ndarray,
+                    feature_cols: List[str], extra_stats: Sequence[str] = (),
+                    quantiles: Sequence[float] = ()) -> Dict[str, Any]:
+    """
+    Analyze cluster characteristics in one aggregation over the label array:
+    bincount-weighted sums for the averages and a cluster x category crosstab
+    from the category codes. extra_stats ("std", "min", "max") and quantiles
+    (e.g. 0.5 -> q50_<column>) add per-column columns; min/max/quantiles share
+    one sort of each column by (cluster, value)
+    Returns: dictionary with cluster statistics (empty clusters are omitted)
+    """
+    k = len(centroids)
+    assignments = np.asarray(assignments, dtype=np.intp)
+    unknown = set(extra_stats) - {"std", "min", "max"}
+    if unknown:
+        raise ValueError(f"Unknown extra_stats: {sorted(unknown)}")
+    
+    counts = np.bincount(assignments, minlength=k)
+    nonempty = np.flatnonzero(counts)
+    values = {col: df[col].to_numpy(dtype=float) for col in PROFILE_COLUMNS}
+    
+    columns: Dict[str, np.ndarray] = {}
+    for col, x in values.items():
+        # Missing values are skipped, as in Series.mean()
+        valid = ~np.isnan(x)
+        observed = np.bincount(assignments, weights=valid, minlength=k)
+        sums = np.bincount(assignments, weights=np.where(valid, x, 0.0), minlength=k)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / observed
+        columns[f"avg_{col}"] = means
+        if "std" in extra_stats:
+            # Centered sum of squares: stable where E[x^2] - E[x]^2 is not
+            squares = np.bincount(assignments, weights=np.where(valid, (x - means[assignments]) ** 2, 0.0),
+                                  minlength=k)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                columns[f"std_{col}"] = np.where(observed > 1, np.sqrt(squares / (observed - 1)), 0.0)
+    
+    if "min" in extra_stats or "max" in extra_stats or len(quantiles):
+        starts = (np.cumsum(counts) - counts)[nonempty]
+        segment_counts = counts[nonempty]
+        for col, x in values.items():
+            sorted_values = x[np.lexsort((x, assignments))]
+            order_stats = [(f"{stat}_{col}", q) for stat, q in (("min", 0.0), ("max", 1.0))
+                           if stat in extra_stats]
+            order_stats += [(f"q{q * 100:g}_{col}", q) for q in quantiles]
+            for name, q in order_stats:
+                columns[name] = np.full(k, np.nan)
+                columns[name][nonempty] = _segment_quantiles(sorted_values, starts, segment_counts, q)
+    
+    crosstab, category_labels = cluster_category_crosstab(assignments, df['category'], k)
+    
+    cluster_stats = {}
+    for i in nonempty:
+        stats = {"count": int(counts[i])}
+        stats.update({name: float(column[i]) for name, column in columns.items()})
+        # Most frequent first, like value_counts()
+        order = sorted(np.flatnonzero(crosstab[i]), key=lambda j: (-crosstab[i, j], str(category_labels[j])))
+        stats["categories"] = {category_labels[j]: int(crosstab[i, j]) for j in order}
         cluster_stats[f"cluster_{i}"] = stats
     
     return cluster_stats
@@ -5,20 +5,85 @@ Runs complete analysis pipeline and generates results
 import pandas as pd
 import numpy as np
 import json
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
-import seaborn as sns
+import io
+import hashlib
+import subprocess
+import sys
 from pathlib import Path
 import os
+from concurrent.futures import ProcessPoolExecutor
 
-from preprocessing import preprocess_data
-from kmeans import kmeans, elbow_method, analyze_clusters, name_clusters
-from regression import compare_models
+from preprocessing import preprocess_data, load_snapshot
+from kmeans import kmeans, elbow_method, select_optimal_k, analyze_clusters, name_clusters
+from regression import compare_models, compare_models_arrays, save_predictions, REGRESSION_FEATURES
+from pipeline import StageGraph
+from instrumentation import PerformanceRecorder
+from cache import ResultCache, file_sha256
+from transformer import PreprocessingTransformer
+from scoring import save_model_artifacts, MODEL_ARTIFACTS_FILE, TRANSFORMER_FILE
 
-# Set style
-sns.set_style("whitegrid")
-plt.rcParams['figure.figsize'] = (12, 8)
+CLUSTERING_FEATURES = ['price', 'units_sold']
+
+# Cold `import main_analysis` must stay under this many seconds (see check_import_time);
+# matplotlib / seaborn are imported by the figures stage only
+IMPORT_TIME_BUDGET = 0.75
+
+# Figure rendering: above PLOT_MAX_POINTS points the 'auto' plot mode draws a stratified
+# sample ('density' draws a 2-D histogram instead); every cluster keeps at least PLOT_MIN_PER_GROUP
+FIGURE_DPI = 300
+PLOT_MODES = ['auto', 'scatter', 'sample', 'density']
+PLOT_MAX_POINTS = 20000
+PLOT_MIN_PER_GROUP = 200
+PLOT_DENSITY_BINS = (300, 200)
+# Input hashes of the PNGs in the image directory; bump FIGURE_VERSION when the drawing changes
+FIGURE_HASHES_FILE = ".figure_hashes.json"
+# Per-run performance record (untracked), next to final_report.json
+PERFORMANCE_FILE = "performance.json"
+FIGURE_VERSION = 1
+
+_pyplot = None
+
+def get_pyplot():
+    """
+    Import matplotlib (non-interactive backend) and apply the seaborn style on first use
+    Returns: matplotlib.pyplot
+    """
+    global _pyplot
+    if _pyplot is None:
+        import matplotlib
+        matplotlib.use('Agg')  # Use non-interactive backend
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        sns.set_style("whitegrid")
+        plt.rcParams['figure.figsize'] = (12, 8)
+        _pyplot = plt
+    return _pyplot
+
+def measure_import_time(module: str = "main_analysis", repeats: int = 3) -> float:
+    """
+    Cold import time of a module in a fresh interpreter (best of repeats)
+    Returns: seconds, from python -X importtime
+    """
+    best = float("inf")
+    for _ in range(repeats):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True)
+        # Last line is the module itself: "import time: self | cumulative | name" (microseconds)
+        lines = [line for line in result.stderr.splitlines() if line.startswith("import time:")]
+        cumulative = int(lines[-1].split("|")[1])
+        best = min(best, cumulative / 1e6)
+    return best
+
+def check_import_time(budget: float = IMPORT_TIME_BUDGET) -> float:
+    """
+    Fail if the cold import of main_analysis exceeds the budget
+    Returns: measured seconds
+    """
+    seconds = measure_import_time()
+    if seconds > budget:
+        raise RuntimeError(f"import main_analysis took {seconds:.3f}s, over the {budget:.2f}s budget")
+    return seconds
 
 def create_output_directory():
     """Create output directory for results"""
@@ -27,10 +92,115 @@ def create_output_directory():
     output_dir.mkdir(parents=True, exist_ok=True)
     return output_dir
 
-def plot_elbow_curve(wcss_values: dict, output_path: str):
+def stratified_sample_indices(labels: np.ndarray, max_points: int, random_seed: int = 42) -> np.ndarray:
+    """
+    Down-sample to about max_points rows, keeping each label's share of the
+    data (and at least PLOT_MIN_PER_GROUP rows of every label, if it has them)
+    Returns: sorted row indices
+    """
+    rng = np.random.default_rng(random_seed)
+    labels = np.asarray(labels)
+    n_points = len(labels)
+    order = np.argsort(labels, kind='stable')
+    groups, starts, counts = np.unique(labels[order], return_index=True, return_counts=True)
+    selected = []
+    for start, count in zip(starts, counts):
+        quota = min(count, max(PLOT_MIN_PER_GROUP, int(max_points * count / n_points)))
+        selected.append(order[start + rng.choice(count, quota, replace=False)])
+    return np.sort(np.concatenate(selected)) if selected else np.empty(0, dtype=int)
+
+def _resolve_plot_mode(mode: str, n_points: int, max_points: int) -> str:
+    if mode not in PLOT_MODES:
+        raise ValueError(f"Unknown plot mode: {mode}")
+    if mode == 'auto':
+        return 'scatter' if n_points <= max_points else 'sample'
+    return mode
+
+def prepare_elbow_curve(wcss_values: dict) -> dict:
+    """Inputs of the elbow curve figure"""
+    return {"kind": "elbow", "k_values": [int(k) for k in wcss_values],
+            "wcss": [float(wcss) for wcss in wcss_values.values()]}
+
+def prepare_clusters_2d(df: pd.DataFrame, assignments: np.ndarray, centroids: np.ndarray,
+                        x_col: str, y_col: str, cluster_names: dict, mode: str = 'auto',
+                        max_points: int = PLOT_MAX_POINTS) -> dict:
+    """
+    Inputs of the cluster figure, reduced to what is drawn: every point
+    ('scatter'), a stratified sample per cluster ('sample', the 'auto' choice
+    above max_points) or a 2-D histogram ('density')
+    Returns: small dict of arrays, cheap to hash and to send to a worker process
+    """
+    x = df[x_col].to_numpy(dtype=float)
+    y = df[y_col].to_numpy(dtype=float)
+    assignments = np.asarray(assignments)
+    mode = _resolve_plot_mode(mode, len(x), max_points)
+    k = len(centroids)
+    payload = {
+        "kind": "clusters", "mode": mode, "n_points": len(x),
+        "centroids": np.asarray(centroids, dtype=float),
+        "names": [cluster_names.get(f'cluster_{i}', f'Cluster {i}') for i in range(k)],
+        "x_label": x_col.replace('_', ' ').title(), "y_label": y_col.replace('_', ' ').title()
+    }
+    if mode == 'density':
+        density, x_edges, y_edges = np.histogram2d(x, y, bins=PLOT_DENSITY_BINS)
+        payload.update(density=density, x_edges=x_edges, y_edges=y_edges)
+        return payload
+    if mode == 'sample':
+        rows = stratified_sample_indices(assignments, max_points)
+        x, y, assignments = x[rows], y[rows], assignments[rows]
+    payload.update(x=x, y=y, labels=assignments)
+    return payload
+
+def prepare_regression_comparison(regression_results: dict, mode: str = 'auto',
+                                  max_points: int = PLOT_MAX_POINTS) -> dict:
+    """Inputs of the actual vs predicted figure for the best model (see prepare_clusters_2d)"""
+    best_model = regression_results["comparison"]["best_model"]
+    predictions = regression_results["predictions"]
+    actual = np.asarray(predictions["actual"], dtype=float)
+    
+    if "Polynomial" in best_model:
+        predicted = np.asarray(predictions["polynomial"], dtype=float)
+        model_label = "Polynomial Regression"
+    else:
+        predicted = np.asarray(predictions["linear"], dtype=float)
+        model_label = "Linear Regression"
+    
+    mode = _resolve_plot_mode(mode, len(actual), max_points)
+    payload = {
+        "kind": "regression", "mode": mode, "n_points": len(actual), "model_label": model_label,
+        # The perfect-prediction line spans the full data, sampled or not
+        "line": [float(min(actual.min(), predicted.min())), float(max(actual.max(), predicted.max()))]
+    }
+    if mode == 'density':
+        density, x_edges, y_edges = np.histogram2d(actual, predicted, bins=PLOT_DENSITY_BINS)
+        payload.update(density=density, x_edges=x_edges, y_edges=y_edges)
+        return payload
+    if mode == 'sample':
+        rows = stratified_sample_indices(np.zeros(len(actual), dtype=int), max_points)
+        actual, predicted = actual[rows], predicted[rows]
+    payload.update(actual=actual, predicted=predicted)
+    return payload
+
+def _draw_density(plt, payload: dict):
+    """Rasterized 2-D histogram (log-scaled counts)"""
+    from matplotlib.colors import LogNorm
+    density = np.ma.masked_equal(payload["density"].T, 0)
+    mesh = plt.pcolormesh(payload["x_edges"], payload["y_edges"], density, cmap='viridis',
+                          norm=LogNorm(), rasterized=True)
+    plt.colorbar(mesh, label='Points per bin')
+
+def _sample_note(payload: dict) -> str:
+    if payload["mode"] == 'sample':
+        return f" ({len(payload.get('x', payload.get('actual')))} of {payload['n_points']} points)"
+    if payload["mode"] == 'density':
+        return f" ({payload['n_points']} points, density)"
+    return ""
+
+def draw_elbow_curve(payload: dict, output_path, dpi: int = FIGURE_DPI):
     """Plot elbow curve for K-means"""
-    k_values = list(wcss_values.keys())
-    wcss_list = list(wcss_values.values())
+    plt = get_pyplot()
+    k_values = payload["k_values"]
+    wcss_list = payload["wcss"]
     
     plt.figure(figsize=(10, 6))
     plt.plot(k_values, wcss_list, 'bo-', linewidth=2, markersize=8)
@@ -45,181 +215,435 @@ def plot_elbow_curve(wcss_values: dict, output_path: str):
         plt.text(k, wcss, f'{wcss:.0f}', ha='center', va='bottom')
     
     plt.tight_layout()
-    plt.savefig(output_path, dpi=300, bbox_inches='tight')
+    plt.savefig(output_path, dpi=dpi, bbox_inches='tight')
     plt.close()
 
-def plot_clusters_2d(df: pd.DataFrame, assignments: np.ndarray, centroids: np.ndarray,
-                    x_col: str, y_col: str, cluster_names: dict, output_path: str):
+def draw_clusters_2d(payload: dict, output_path, dpi: int = FIGURE_DPI):
     """Plot 2D cluster visualization"""
+    plt = get_pyplot()
+    centroids = payload["centroids"]
     k = len(centroids)
     colors = plt.cm.tab10(np.linspace(0, 1, k))
     
     plt.figure(figsize=(12, 8))
     
-    # Plot data points
-    for i in range(k):
-        cluster_mask = assignments == i
-        cluster_data = df[cluster_mask]
-        plt.scatter(cluster_data[x_col], cluster_data[y_col], 
-                   c=[colors[i]], label=cluster_names.get(f'cluster_{i}', f'Cluster {i}'),
-                   alpha=0.6, s=100, edgecolors='black', linewidth=0.5)
+    if payload["mode"] == 'density':
+        _draw_density(plt, payload)
+        for i, name in enumerate(payload["names"]):
+            plt.annotate(name, centroids[i], xytext=(8, 8), textcoords='offset points',
+                         fontsize=10, fontweight='bold',
+                         bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
+    else:
+        # Every point gets an outlined marker; a sample is drawn lighter and rasterized
+        full = payload["mode"] == 'scatter'
+        style = (dict(alpha=0.6, s=100, edgecolors='black', linewidth=0.5) if full
+                 else dict(alpha=0.5, s=12, linewidth=0, rasterized=True))
+        for i in range(k):
+            cluster_mask = payload["labels"] == i
+            plt.scatter(payload["x"][cluster_mask], payload["y"][cluster_mask],
+                        c=[colors[i]], label=payload["names"][i], **style)
     
     # Plot centroids
     plt.scatter(centroids[:, 0], centroids[:, 1], 
                c='red', marker='X', s=300, label='Centroids',
                edgecolors='black', linewidth=2, zorder=10)
     
-    plt.xlabel(x_col.replace('_', ' ').title(), fontsize=12)
-    plt.ylabel(y_col.replace('_', ' ').title(), fontsize=12)
-    plt.title('K-means Clustering Results', fontsize=14, fontweight='bold')
-    plt.legend(loc='best', fontsize=10)
+    plt.xlabel(payload["x_label"], fontsize=12)
+    plt.ylabel(payload["y_label"], fontsize=12)
+    plt.title('K-means Clustering Results' + _sample_note(payload), fontsize=14, fontweight='bold')
+    plt.legend(loc='best', fontsize=10, markerscale=1 if payload["mode"] != 'sample' else 2)
     plt.grid(True, alpha=0.3)
     plt.tight_layout()
-    plt.savefig(output_path, dpi=300, bbox_inches='tight')
+    plt.savefig(output_path, dpi=dpi, bbox_inches='tight')
     plt.close()
 
-def plot_regression_comparison(regression_results: dict, output_path: str):
+def draw_regression_comparison(payload: dict, output_path, dpi: int = FIGURE_DPI):
     """Plot actual vs predicted for best regression model"""
-    best_model = regression_results["comparison"]["best_model"]
-    
-    if "Polynomial" in best_model:
-        actual = regression_results["predictions"]["polynomial"]["actual"]
-        predicted = regression_results["predictions"]["polynomial"]["predicted"]
-        model_label = "Polynomial Regression"
-    else:
-        actual = regression_results["predictions"]["linear"]["actual"]
-        predicted = regression_results["predictions"]["linear"]["predicted"]
-        model_label = "Linear Regression"
-    
+    plt = get_pyplot()
     plt.figure(figsize=(10, 8))
     
-    # Scatter plot
-    plt.scatter(actual, predicted, alpha=0.6, s=80, edgecolors='black', linewidth=0.5)
+    if payload["mode"] == 'density':
+        _draw_density(plt, payload)
+    else:
+        full = payload["mode"] == 'scatter'
+        style = (dict(alpha=0.6, s=80, edgecolors='black', linewidth=0.5) if full
+                 else dict(alpha=0.4, s=10, linewidth=0, rasterized=True))
+        plt.scatter(payload["actual"], payload["predicted"], **style)
     
     # Perfect prediction line
-    min_val = min(min(actual), min(predicted))
-    max_val = max(max(actual), max(predicted))
+    min_val, max_val = payload["line"]
     plt.plot([min_val, max_val], [min_val, max_val], 
             'r--', linewidth=2, label='Perfect Prediction')
     
     plt.xlabel('Actual Profit ($)', fontsize=12)
     plt.ylabel('Predicted Profit ($)', fontsize=12)
-    plt.title(f'Actual vs Predicted: {model_label}', fontsize=14, fontweight='bold')
+    plt.title(f'Actual vs Predicted: {payload["model_label"]}' + _sample_note(payload),
+              fontsize=14, fontweight='bold')
     plt.legend(fontsize=10)
     plt.grid(True, alpha=0.3)
     plt.tight_layout()
-    plt.savefig(output_path, dpi=300, bbox_inches='tight')
+    plt.savefig(output_path, dpi=dpi, bbox_inches='tight')
     plt.close()
 
-def run_complete_analysis(csv_path: str = "product_sales.csv", 
-                         optimal_k: int = None, 
-                         output_dir: str = "ml_results",
-                         image_output_dir: str = "public/ml_results"):
+FIGURE_DRAWERS = {
+    "elbow": draw_elbow_curve,
+    "clusters": draw_clusters_2d,
+    "regression": draw_regression_comparison
+}
+
+def plot_elbow_curve(wcss_values: dict, output_path: str, dpi: int = FIGURE_DPI):
+    """Plot elbow curve for K-means"""
+    draw_elbow_curve(prepare_elbow_curve(wcss_values), output_path, dpi)
+
+def plot_clusters_2d(df: pd.DataFrame, assignments: np.ndarray, centroids: np.ndarray,
+                    x_col: str, y_col: str, cluster_names: dict, output_path: str,
+                    dpi: int = FIGURE_DPI, mode: str = 'auto'):
+    """Plot 2D cluster visualization"""
+    draw_clusters_2d(prepare_clusters_2d(df, assignments, centroids, x_col, y_col, cluster_names, mode),
+                     output_path, dpi)
+
+def plot_regression_comparison(regression_results: dict, output_path: str,
+                               dpi: int = FIGURE_DPI, mode: str = 'auto'):
+    """Plot actual vs predicted for best regression model"""
+    draw_regression_comparison(prepare_regression_comparison(regression_results, mode), output_path, dpi)
+
+def run_preprocessing_stage(csv_path: str, snapshot_dir: str = None):
+    """Preprocess the CSV once; both analysis branches share the result"""
+    return preprocess_data(csv_path, normalize_method='minmax', snapshot_dir=snapshot_dir)
+
+def run_clustering_stage(df_preprocessed: pd.DataFrame, optimal_k: int, use_silhouette: bool,
+                         k_range: list, random_seed: int, snapshot: dict = None,
+                         n_jobs: int = 1):
     """
-    Run complete ML analysis pipeline
-    Returns: dictionary with all results
+    Elbow sweep, k selection, final K-means fit and cluster profiling
+    (features are memory-mapped from the snapshot if given; the full elbow
+    sweep for a user-chosen k runs its fits in n_jobs processes)
+    Returns: clustering results plus the assignments and centroids for plotting
     """
-    # Create output directories
-    output_path = Path(output_dir)
-    output_path.mkdir(exist_ok=True)
-    
-    # Create image output directory (for Next.js public folder)
-    image_output_path = Path(image_output_dir)
-    image_output_path.mkdir(parents=True, exist_ok=True)
-    
-    print("Step 1: Data Preprocessing...")
-    df_preprocessed, preprocess_report = preprocess_data(csv_path, normalize_method='minmax')
-    
-    # Save preprocessing report
-    with open(output_path / "preprocessing_report.json", "w") as f:
-        json.dump(preprocess_report, f, indent=2)
-    
-    print("Step 2: K-means Clustering Analysis...")
-    # Select features for clustering (using original scale for interpretation)
-    df_original, _ = preprocess_data(csv_path, normalize_method='minmax')
-    feature_cols = ['price', 'units_sold']
-    X_cluster = df_original[feature_cols].values
-    
-    # Run elbow method
-    k_range = [2, 3, 4, 5, 6, 7, 8]
-    wcss_values = elbow_method(X_cluster, k_range, random_seed=42)
-    
-    # Plot elbow curve (save to both locations)
-    plot_elbow_curve(wcss_values, str(image_output_path / "elbow_curve.png"))
+    feature_cols = list(CLUSTERING_FEATURES)
+    if snapshot is not None:
+        X_cluster = snapshot["clustering_features"]
+    else:
+        X_cluster = df_preprocessed[feature_cols].values
     
-    # Determine optimal k (if not provided, use elbow method)
+    # Elbow curve and k selection (the sweep stops early once the knee is stable)
     if optimal_k is None:
-        # Simple elbow detection: find k where decrease starts to level off
-        k_list = sorted(wcss_values.keys())
-        decreases = [wcss_values[k_list[i]] - wcss_values[k_list[i+1]] 
-                    for i in range(len(k_list)-1)]
-        # Find where decrease becomes small
-        optimal_k = 4  # Default, can be improved with better elbow detection
+        k_selection = select_optimal_k(X_cluster, k_range, random_seed=random_seed,
+                                       use_silhouette=use_silhouette)
+        wcss_values = k_selection["wcss_values"]
+        optimal_k = k_selection["optimal_k"]
+    else:
+        wcss_values = elbow_method(X_cluster, k_range, random_seed=random_seed, n_jobs=n_jobs)
+        k_selection = {"optimal_k": optimal_k, "method": "user"}
     
     # Run K-means with optimal k
-    assignments, centroids, kmeans_info = kmeans(X_cluster, optimal_k, random_seed=42)
+    assignments, centroids, kmeans_info = kmeans(X_cluster, optimal_k, random_seed=random_seed)
     
     # Analyze clusters
-    cluster_stats = analyze_clusters(df_original, assignments, centroids, feature_cols)
+    cluster_stats = analyze_clusters(df_preprocessed, assignments, centroids, feature_cols)
     cluster_names = name_clusters(cluster_stats)
     
-    # Plot clusters (save to image directory)
-    plot_clusters_2d(df_original, assignments, centroids, 
-                    'price', 'units_sold', cluster_names,
-                    str(image_output_path / "clusters_2d.png"))
-    
     # Prepare clustering results
     clustering_results = {
         "elbow_method": {str(k): float(wcss) for k, wcss in wcss_values.items()},
         "optimal_k": optimal_k,
+        "k_selection": {key: value for key, value in k_selection.items() if key != "wcss_values"},
         "kmeans_info": kmeans_info,
         "cluster_statistics": cluster_stats,
         "cluster_names": cluster_names
     }
     
-    # Save clustering results
-    with open(output_path / "clustering_results.json", "w") as f:
-        json.dump(clustering_results, f, indent=2)
-    
-    print("Step 3: Regression Analysis...")
-    # Run regression comparison
-    regression_results = compare_models(df_preprocessed, test_size=0.3, 
-                                       polynomial_degree=2, random_seed=42)
-    
-    # Plot regression results (save to image directory)
-    plot_regression_comparison(regression_results, 
-                              str(image_output_path / "regression_comparison.png"))
+    return clustering_results, assignments, centroids
+
+def run_regression_stage(df_preprocessed: pd.DataFrame, test_size: float,
+                         polynomial_degree: int, random_seed: int, snapshot: dict = None):
+    """Linear vs polynomial regression comparison (on the snapshot matrices if given)"""
+    if snapshot is not None:
+        return compare_models_arrays(snapshot["regression_features"], snapshot["target"],
+                                     test_size=test_size, polynomial_degree=polynomial_degree,
+                                     random_seed=random_seed)
+    return compare_models(df_preprocessed, test_size=test_size,
+                          polynomial_degree=polynomial_degree, random_seed=random_seed)
+
+def figure_hash(payload: dict, dpi: int) -> str:
+    """Content hash of a figure's inputs (arrays by value) and rendering settings"""
+    digest = hashlib.sha256(f"v{FIGURE_VERSION};dpi={dpi}".encode())
+    for key in sorted(payload):
+        value = payload[key]
+        digest.update(key.encode())
+        if isinstance(value, np.ndarray):
+            digest.update(f"{value.dtype}{value.shape}".encode())
+            digest.update(np.ascontiguousarray(value).tobytes())
+        else:
+            digest.update(json.dumps(value, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+def render_figure(payload: dict, dpi: int = FIGURE_DPI) -> bytes:
+    """Render a prepared figure into PNG bytes instead of a file"""
+    buffer = io.BytesIO()
+    FIGURE_DRAWERS[payload["kind"]](payload, buffer, dpi)
+    return buffer.getvalue()
+
+def _load_figure_hashes(image_output_path: Path) -> dict:
+    try:
+        with open(image_output_path / FIGURE_HASHES_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def run_figures_stage(preprocessed: tuple, clustering: tuple, regression_results: dict,
+                      image_output_path: Path = None, dpi: int = FIGURE_DPI, plot_mode: str = 'auto',
+                      n_jobs: int = None):
+    """
+    Render the three figures. Inputs are reduced first (sampling / density
+    above PLOT_MAX_POINTS), so workers receive small payloads; figures whose
+    input hash matches the one recorded next to an existing PNG in
+    image_output_path are read back instead of redrawn, and the rest render
+    in parallel worker processes (n_jobs, default one per figure up to the
+    CPU count)
+    Returns: {"images": file name -> PNG bytes, "hashes": file name -> input hash, "skipped": [...]}
+    """
+    df_preprocessed = preprocessed[0]
+    clustering_results, assignments, centroids = clustering
+    wcss_values = {int(k): wcss for k, wcss in clustering_results["elbow_method"].items()}
+    
+    payloads = {
+        "elbow_curve.png": prepare_elbow_curve(wcss_values),
+        "clusters_2d.png": prepare_clusters_2d(df_preprocessed, assignments, centroids,
+                                               CLUSTERING_FEATURES[0], CLUSTERING_FEATURES[1],
+                                               clustering_results["cluster_names"], plot_mode),
+        "regression_comparison.png": prepare_regression_comparison(regression_results, plot_mode)
+    }
+    hashes = {file_name: figure_hash(payload, dpi) for file_name, payload in payloads.items()}
+    
+    images, skipped = {}, []
+    previous = _load_figure_hashes(image_output_path) if image_output_path is not None else {}
+    for file_name in payloads:
+        path = image_output_path / file_name if image_output_path is not None else None
+        if previous.get(file_name) == hashes[file_name] and path.exists():
+            images[file_name] = path.read_bytes()
+            skipped.append(file_name)
+    
+    pending = [file_name for file_name in payloads if file_name not in images]
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = min(n_jobs, len(pending))
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = {file_name: pool.submit(render_figure, payloads[file_name], dpi) for file_name in pending}
+            for file_name, future in futures.items():
+                images[file_name] = future.result()
+    else:
+        for file_name in pending:
+            images[file_name] = render_figure(payloads[file_name], dpi)
     
-    # Save regression results
-    with open(output_path / "regression_results.json", "w") as f:
-        json.dump(regression_results, f, indent=2)
+    return {"images": images, "hashes": hashes, "skipped": skipped}
+
+def compile_final_report(preprocess_report: dict, clustering_results: dict,
+                         regression_results: dict, figures: dict,
+                         output_path: Path, image_output_path: Path,
+                         centroids: np.ndarray = None):
+    """
+    Write every stage's results and figures. Test-set predictions go to a
+    binary sidecar referenced from regression_results.json, and
+    final_report.json references the sub-reports instead of repeating them
+    Returns: the final report as written
+    """
+    predictions_file = "regression_predictions.npz"
+    regression_report = dict(regression_results, predictions=save_predictions(
+        regression_results["predictions"], output_path / predictions_file))
     
-    print("Step 4: Compiling Final Report...")
-    # Compile final report
     final_report = {
         "data_overview": {
             "original_records": preprocess_report["original_records"],
             "final_records": preprocess_report["final_records"],
             "summary_statistics": preprocess_report["summary_stats"]
         },
-        "preprocessing": preprocess_report,
-        "clustering": clustering_results,
-        "regression": regression_results
+        "preprocessing": {"report": "preprocessing_report.json"},
+        "clustering": {
+            "report": "clustering_results.json",
+            "optimal_k": clustering_results["optimal_k"],
+            "cluster_names": clustering_results["cluster_names"]
+        },
+        "regression": {
+            "report": "regression_results.json",
+            "predictions": predictions_file,
+            "comparison": regression_results["comparison"]
+        },
+        "model_artifacts": {"models": MODEL_ARTIFACTS_FILE, "transformer": TRANSFORMER_FILE}
     }
     
-    # Save final report
-    with open(output_path / "final_report.json", "w") as f:
-        json.dump(final_report, f, indent=2)
+    outputs = {
+        "preprocessing_report.json": preprocess_report,
+        "clustering_results.json": clustering_results,
+        "regression_results.json": regression_report,
+        "final_report.json": final_report
+    }
+    for file_name, content in outputs.items():
+        with open(output_path / file_name, "w") as f:
+            json.dump(content, f, indent=2)
+    
+    # Fitted fill / clip / scaling parameters, to transform new batches without refitting
+    PreprocessingTransformer.from_report(preprocess_report).save(output_path / TRANSFORMER_FILE)
+    
+    # Centroids and coefficients for batch scoring (scoring.py)
+    if centroids is not None:
+        save_model_artifacts(output_path / MODEL_ARTIFACTS_FILE, clustering_results, centroids,
+                             regression_results, CLUSTERING_FEATURES, REGRESSION_FEATURES)
+    
+    for file_name, png in figures.get("images", {}).items():
+        (image_output_path / file_name).write_bytes(png)
+    if figures:
+        with open(image_output_path / FIGURE_HASHES_FILE, "w") as f:
+            json.dump(figures["hashes"], f, indent=2)
+    
+    return final_report
+
+def run_complete_analysis(csv_path: str = "product_sales.csv", 
+                         optimal_k: int = None, 
+                         output_dir: str = "ml_results",
+                         image_output_dir: str = "public/ml_results",
+                         use_silhouette: bool = False,
+                         use_cache: bool = True,
+                         cache_dir: str = None,
+                         snapshot_dir: str = None,
+                         result_cache=None,
+                         make_plots: bool = True,
+                         recorder: PerformanceRecorder = None,
+                         profile_dir: str = None,
+                         figure_dpi: int = FIGURE_DPI,
+                         plot_mode: str = 'auto',
+                         figure_jobs: int = None,
+                         elbow_jobs: int = 1):
+    """
+    Run complete ML analysis pipeline
+    Stages form a graph (preprocess -> clustering / regression -> figures ->
+    report), so preprocessing runs once and its output is shared by both
+    branches. With use_cache, each stage's artifacts are stored under a key of
+    the CSV content hash plus that stage's parameters (default location:
+    <output_dir>/.cache), so unchanged re-runs only rewrite the output files.
+    optimal_k=None selects k from the elbow curve (Kneedle, optionally refined
+    by a sampled silhouette score). snapshot_dir keeps the cleaned data as
+    binary .npy matrices that later runs memory-map instead of parsing the CSV;
+    clustering and regression then read those matrices zero-copy.
+    result_cache replaces the default on-disk cache (e.g. a MemoryCache kept
+    by the long-running worker). make_plots=False skips the figures stage
+    (and the matplotlib import) and writes the JSON results only. figure_dpi,
+    plot_mode ('auto', 'scatter', 'sample' or 'density') and figure_jobs
+    (worker processes) control rendering; see run_figures_stage. elbow_jobs
+    sets the worker processes of the elbow sweep (None for all cores).
+    Each stage's wall / CPU time, peak RSS and counters are written under
+    "performance" in the returned report and in <output_dir>/performance.json
+    (kept out of final_report.json); pass a recorder to attach hooks, and
+    profile_dir (or ML_PROFILE_DIR) to dump a cProfile per stage
+    Returns: the final report (sub-reports are referenced by file name)
+    """
+    # Create output directories
+    output_path = Path(output_dir)
+    output_path.mkdir(exist_ok=True)
+    
+    # Create image output directory (for Next.js public folder)
+    image_output_path = Path(image_output_dir)
+    image_output_path.mkdir(parents=True, exist_ok=True)
+    
+    cache = result_cache
+    if cache is None and use_cache:
+        cache = ResultCache(cache_dir if cache_dir is not None else str(output_path / ".cache"))
     
+    normalize_method = 'minmax'
+    k_range = [2, 3, 4, 5, 6, 7, 8]
+    random_seed = 42
+    test_size = 0.3
+    polynomial_degree = 2
+    
+    if recorder is None:
+        recorder = PerformanceRecorder(profile_dir=profile_dir or os.environ.get("ML_PROFILE_DIR"))
+    graph = StageGraph(cache=cache, recorder=recorder)
+    csv_sha256 = file_sha256(csv_path) if cache is not None or snapshot_dir is not None else None
+    
+    def snapshot():
+        """Memory-mapped snapshot of this CSV, or None if none was written"""
+        loaded = load_snapshot(snapshot_dir) if snapshot_dir is not None else None
+        if (loaded is None or loaded["metadata"]["source_sha256"] != csv_sha256
+                or loaded["metadata"]["options"].get("normalize_method") != normalize_method):
+            return None
+        return loaded
+    
+    graph.add_stage("preprocess", lambda: run_preprocessing_stage(csv_path, snapshot_dir),
+                    params={"csv_sha256": csv_sha256 if cache is not None else None,
+                            "normalize_method": normalize_method})
+    graph.add_stage("clustering",
+                    lambda preprocessed: run_clustering_stage(
+                        preprocessed[0], optimal_k, use_silhouette, k_range, random_seed, snapshot(),
+                        elbow_jobs),
+                    depends_on=["preprocess"],
+                    params={"optimal_k": optimal_k, "use_silhouette": use_silhouette,
+                            "k_range": k_range, "random_seed": random_seed})
+    graph.add_stage("regression",
+                    lambda preprocessed: run_regression_stage(preprocessed[0], test_size,
+                                                              polynomial_degree, random_seed, snapshot()),
+                    depends_on=["preprocess"],
+                    params={"test_size": test_size, "polynomial_degree": polynomial_degree,
+                            "random_seed": random_seed})
+    report_inputs = ["preprocess", "clustering", "regression"]
+    if make_plots:
+        graph.add_stage("figures",
+                        lambda preprocessed, clustering, regression: run_figures_stage(
+                            preprocessed, clustering, regression, image_output_path,
+                            figure_dpi, plot_mode, figure_jobs),
+                        depends_on=["preprocess", "clustering", "regression"],
+                        params={"dpi": figure_dpi, "plot_mode": plot_mode})
+        report_inputs.append("figures")
+    graph.add_stage("report",
+                    lambda preprocessed, clustering, regression, figures={}: compile_final_report(
+                        preprocessed[1], clustering[0], regression, figures,
+                        output_path, image_output_path, clustering[2]),
+                    depends_on=report_inputs)
+    
+    with recorder:
+        final_report = graph.run("report")
+    
+    # Written after the report stage so that its own timing is included. Timings,
+    # RSS and the pid change on every run, so they stay out of the committed reports
+    final_report["performance"] = recorder.summary()
+    with open(output_path / PERFORMANCE_FILE, "w") as f:
+        json.dump(final_report["performance"], f, indent=2)
+    
+    print("\nStage timings:")
+    for name, stage in recorder.stages.items():
+        if stage["cached"]:
+            print(f"- {name}: {stage['wall_seconds']:.3f}s (cached)")
+            continue
+        peak = stage["peak_rss_bytes"]
+        memory = f", peak RSS {peak / 2 ** 20:.0f} MiB" if peak is not None else ""
+        print(f"- {name}: {stage['wall_seconds']:.3f}s wall, {stage['cpu_seconds']:.3f}s CPU{memory}")
     print(f"\nAnalysis complete! Results saved to {output_path}/ and images to {image_output_path}/")
     return final_report
 
 if __name__ == "__main__":
-    import sys
-    import os
-    # Get CSV path from command line argument or use default
-    csv_path = sys.argv[1] if len(sys.argv) > 1 else "product_sales.csv"
-    
+    import argparse
+    parser = argparse.ArgumentParser(description="Run the complete ML analysis pipeline")
+    parser.add_argument("csv_path", nargs="?", default="product_sales.csv")
+    parser.add_argument("--no-plots", action="store_true",
+                        help="write the JSON results only (skips matplotlib entirely)")
+    parser.add_argument("--dpi", type=int, default=FIGURE_DPI, help="figure resolution")
+    parser.add_argument("--plot-mode", choices=PLOT_MODES, default='auto',
+                        help=f"'auto' samples above {PLOT_MAX_POINTS} points; 'density' draws 2-D histograms")
+    parser.add_argument("--profile", metavar="DIR",
+                        help="dump a cProfile of each stage to DIR/<stage>.prof")
+    parser.add_argument("--check-import-time", action="store_true",
+                        help=f"measure the cold import time against the {IMPORT_TIME_BUDGET}s budget and exit")
+    args = parser.parse_args()
+    
+    if args.check_import_time:
+        try:
+            print(f"import main_analysis: {check_import_time():.3f}s (budget {IMPORT_TIME_BUDGET}s)")
+        except RuntimeError as error:
+            print(error)
+            sys.exit(1)
+        sys.exit(0)
+    
+    csv_path = args.csv_path
     # If path is relative, make it relative to project root (where script is called from)
     if not os.path.isabs(csv_path):
         # Try to find CSV in current directory or parent
@@ -229,9 +653,9 @@ if __name__ == "__main__":
             csv_path = os.path.abspath(os.path.join("..", csv_path))
     
     # Run analysis
-    report = run_complete_analysis(csv_path, optimal_k=4)
+    report = run_complete_analysis(csv_path, make_plots=not args.no_plots, profile_dir=args.profile,
+                                   figure_dpi=args.dpi, plot_mode=args.plot_mode)
     print("\nAnalysis Summary:")
     print(f"- Preprocessed {report['data_overview']['original_records']} records")
     print(f"- Optimal clusters: {report['clustering']['optimal_k']}")
     print(f"- Best regression model: {report['regression']['comparison']['best_model']}")
-
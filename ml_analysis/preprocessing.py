@@ -4,11 +4,322 @@ Handles missing values, outliers, and normalization
 """
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Tuple, List, Iterator, Optional
 import json
+from pathlib import Path
 
-def load_data(file_path: str) -> pd.DataFrame:
-    """Load the product sales CSV file"""
+from cache import file_sha256
+from instrumentation import count, count_file_bytes
+from quantile_sketch import KLLSketch
+
+NUMERICAL_COLUMNS = ['price', 'cost', 'units_sold', 'promotion_frequency', 'shelf_level', 'profit']
+NORMALIZED_FEATURES = ['price', 'cost', 'units_sold', 'promotion_frequency', 'shelf_level']
+SUMMARY_COLUMNS = ['price', 'units_sold', 'profit']
+
+# Rows per block in the fused kernel's element-wise pass
+FUSED_CHUNK_SIZE = 262144
+
+# Rows per chunk when streaming the CSV
+STREAM_CHUNK_SIZE = 500000
+
+# Binary snapshot of the cleaned data: each matrix is row-major so the stage
+# consuming it can memory-map it without a copy
+SNAPSHOT_VERSION = 2
+SNAPSHOT_MATRICES = {
+    'clustering_features': ['price', 'units_sold'],
+    'regression_features': NORMALIZED_FEATURES,
+    'target': ['profit']
+}
+
+# Explicit schema for streaming ingestion: compact numerics and a categorical category
+CSV_SCHEMA = {
+    'product_id': 'Int64',
+    'product_name': 'string',
+    'category': 'category',
+    'price': 'float32',
+    'cost': 'float32',
+    'units_sold': 'float32',
+    'promotion_frequency': 'float32',
+    'shelf_level': 'float32',
+    'profit': 'float32'
+}
+
+class ChunkStatistics:
+    """
+    Mergeable per-column statistics accumulated one chunk at a time
+    Tracks missing counts, rows with any missing value, and count / mean /
+    sum of squared deviations / min / max of the valid numerical values
+    (Chan et al. parallel update), so chunks from different workers can be merged.
+    With quantile_epsilon set, a KLL quantile sketch per numerical column is
+    fed as well, so medians and quartiles never need the full column
+    """
+    def __init__(self, numerical_columns: List[str] = None, quantile_epsilon: Optional[float] = None):
+        self.numerical_columns = list(numerical_columns or NUMERICAL_COLUMNS)
+        self.sketches: Optional[Dict[str, KLLSketch]] = None
+        if quantile_epsilon is not None:
+            self.sketches = {col: KLLSketch(quantile_epsilon, random_seed=j)
+                             for j, col in enumerate(self.numerical_columns)}
+        n_cols = len(self.numerical_columns)
+        self.n_records = 0
+        self.records_with_missing = 0
+        self.missing_counts: Dict[str, int] = {}
+        self.column_order: List[str] = []
+        self.count = np.zeros(n_cols)
+        self.mean = np.zeros(n_cols)
+        self.m2 = np.zeros(n_cols)
+        self.min = np.full(n_cols, np.inf)
+        self.max = np.full(n_cols, -np.inf)
+    
+    def _merge_moments(self, count: np.ndarray, mean: np.ndarray, m2: np.ndarray):
+        total = self.count + count
+        safe_total = np.where(total > 0, total, 1.0)
+        delta = mean - self.mean
+        self.mean = self.mean + delta * count / safe_total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * count / safe_total
+        self.count = total
+    
+    def update(self, chunk: pd.DataFrame, numeric: Optional[np.ndarray] = None):
+        """Add a chunk; numeric may pass an already-extracted float matrix of the numerical columns"""
+        if numeric is None:
+            numeric = np.column_stack([chunk[col].to_numpy(dtype=float, na_value=np.nan)
+                                       for col in self.numerical_columns])
+        nan_mask = np.isnan(numeric)
+        row_has_missing = nan_mask.any(axis=1)
+        other_cols = [col for col in chunk.columns if col not in self.numerical_columns]
+        other_missing = chunk[other_cols].isnull()
+        row_has_missing |= other_missing.any(axis=1).to_numpy()
+        
+        for col, missing in zip(other_cols, other_missing.sum().tolist()):
+            self.missing_counts[col] = self.missing_counts.get(col, 0) + int(missing)
+        for col, missing in zip(self.numerical_columns, nan_mask.sum(axis=0).tolist()):
+            self.missing_counts[col] = self.missing_counts.get(col, 0) + int(missing)
+        self.n_records += len(chunk)
+        self.records_with_missing += int(row_has_missing.sum())
+        
+        count = (~nan_mask).sum(axis=0).astype(float)
+        if count.any():
+            # One float64 working copy (NaNs zeroed) for the mean and squared deviations
+            deviations = numeric.astype(np.float64)
+            deviations[nan_mask] = 0.0
+            mean = deviations.sum(axis=0) / np.maximum(count, 1.0)
+            deviations -= mean
+            deviations[nan_mask] = 0.0
+            np.square(deviations, out=deviations)
+            m2 = deviations.sum(axis=0)
+            del deviations
+            with np.errstate(invalid='ignore'):
+                self.min = np.fmin(self.min, np.nanmin(numeric, axis=0))
+                self.max = np.fmax(self.max, np.nanmax(numeric, axis=0))
+            self._merge_moments(count, mean, m2)
+        if self.sketches is not None:
+            for j, col in enumerate(self.numerical_columns):
+                self.sketches[col].update(numeric[:, j])
+        if not self.column_order:
+            self.column_order = list(chunk.columns)
+    
+    def merge(self, other: 'ChunkStatistics'):
+        """Fold in statistics accumulated elsewhere (e.g. another worker's chunks)"""
+        self.n_records += other.n_records
+        self.records_with_missing += other.records_with_missing
+        for col, missing in other.missing_counts.items():
+            self.missing_counts[col] = self.missing_counts.get(col, 0) + missing
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        self._merge_moments(other.count, other.mean, other.m2)
+        if self.sketches is not None and other.sketches is not None:
+            for col, sketch in other.sketches.items():
+                self.sketches[col].merge(sketch)
+        if not self.column_order:
+            self.column_order = list(other.column_order)
+    
+    def missing_analysis(self) -> Dict[str, Any]:
+        """Missing-value analysis with the same structure as analyze_missing_values"""
+        analysis = {
+            "total_records": self.n_records,
+            "missing_by_column": {},
+            "total_missing": int(sum(self.missing_counts.values())),
+            "records_with_missing": int(self.records_with_missing)
+        }
+        for col in self.column_order or list(self.missing_counts):
+            if self.missing_counts.get(col, 0) > 0:
+                analysis["missing_by_column"][col] = {
+                    "count": int(self.missing_counts[col]),
+                    "percentage": float(self.missing_counts[col] / self.n_records * 100)
+                }
+        return analysis
+    
+    def filled_moments(self, fill_values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Mean and sample std after every missing value is replaced by fill_values"""
+        n_missing = self.n_records - self.count
+        total = np.maximum(self.count + n_missing, 1.0)
+        delta = fill_values - self.mean
+        mean = self.mean + delta * n_missing / total
+        m2 = self.m2 + delta ** 2 * self.count * n_missing / total
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt(m2 / (total - 1)) if self.n_records > 1 else np.full(len(mean), np.nan)
+        return mean, std
+
+def _arrow_chunks(file_path: str, schema: Dict[str, str], columns: List[str],
+                  chunksize: int) -> Iterator[pd.DataFrame]:
+    """Stream record batches with pyarrow's incremental CSV reader (optional dependency)"""
+    try:
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+    except ImportError as error:
+        raise ImportError("csv_engine='pyarrow' requires the pyarrow package") from error
+    
+    arrow_types = {'float32': pa.float32(), 'Int64': pa.int64(), 'string': pa.string(),
+                   'category': pa.string()}
+    reader = pa_csv.open_csv(
+        file_path,
+        read_options=pa_csv.ReadOptions(block_size=max(chunksize * 64, 1 << 20)),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={col: arrow_types.get(dtype, pa.string()) for col, dtype in schema.items()},
+            include_columns=columns
+        )
+    )
+    for batch in reader:
+        chunk = batch.to_pandas()
+        yield chunk.astype({col: schema[col] for col in chunk.columns if col in schema})
+
+def iter_csv_chunks(file_path: str, chunksize: int = STREAM_CHUNK_SIZE,
+                    schema: Dict[str, str] = None, drop_product_name: bool = False,
+                    csv_engine: str = None) -> Iterator[pd.DataFrame]:
+    """
+    Read the CSV in typed chunks (float32 numerics, categorical category)
+    csv_engine: None / 'c' for pandas' chunked reader, 'pyarrow' for the Arrow streaming reader
+    """
+    schema = dict(schema or CSV_SCHEMA)
+    header = pd.read_csv(file_path, nrows=0).columns.tolist()
+    columns = [col for col in header if not (drop_product_name and col == 'product_name')]
+    schema = {col: dtype for col, dtype in schema.items() if col in columns}
+    count_file_bytes(file_path)
+    
+    if csv_engine == 'pyarrow':
+        yield from _arrow_chunks(file_path, schema, columns, chunksize)
+        return
+    yield from pd.read_csv(file_path, usecols=columns, dtype=schema, chunksize=chunksize)
+
+def _count_csv_rows(file_path: str, block_size: int = 1 << 24) -> int:
+    """
+    Upper bound on the data rows of a CSV: its line breaks, the header's
+    included (which covers a missing final newline); blank lines and quoted
+    line breaks only make it larger
+    """
+    newlines = 0
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            newlines += block.count(b'\n')
+    count_file_bytes(file_path)
+    return newlines
+
+class _ColumnBuffer:
+    """
+    One column of a streamed CSV, preallocated and filled chunk by chunk
+    numpy and nullable-integer columns are written in place, categoricals as
+    codes against categories unified in order of appearance (as
+    union_categoricals would), strings as an object array. Columns outside
+    the schema keep their chunks and are concatenated at the end
+    """
+    def __init__(self, sample: pd.Series, capacity: int, typed: bool):
+        self.dtype = sample.dtype
+        self.size = 0
+        self.pieces: List[pd.Series] = []
+        self.categories: Dict[Any, int] = {}
+        self.arrays: Dict[str, np.ndarray] = {}
+        if not typed:
+            self.kind = 'pieces'
+        elif isinstance(sample.dtype, pd.CategoricalDtype):
+            self.kind = 'category'
+            self.arrays['codes'] = np.empty(capacity, dtype=np.int32)
+        elif isinstance(sample.dtype, np.dtype):
+            self.kind = 'numpy'
+            self.arrays['values'] = np.empty(capacity, dtype=sample.dtype)
+        elif isinstance(sample.array, (pd.arrays.IntegerArray, pd.arrays.FloatingArray)):
+            self.kind = 'masked'
+            self.masked_type = type(sample.array)
+            self.arrays['values'] = np.empty(capacity, dtype=sample.dtype.numpy_dtype)
+            self.arrays['mask'] = np.empty(capacity, dtype=bool)
+        else:
+            self.kind = 'object'
+            self.arrays['values'] = np.empty(capacity, dtype=object)
+    
+    def append(self, series: pd.Series):
+        n_rows = len(series)
+        for array in self.arrays.values():
+            if len(array) < self.size + n_rows:
+                array.resize(max(2 * len(array), self.size + n_rows), refcheck=False)
+        rows = slice(self.size, self.size + n_rows)
+        if self.kind == 'category':
+            # Local code -> global code, with -1 (missing) mapping to the trailing -1
+            lookup = np.array([self.categories.setdefault(category, len(self.categories))
+                               for category in series.cat.categories] + [-1], dtype=np.int32)
+            self.arrays['codes'][rows] = lookup[series.cat.codes.to_numpy()]
+        elif self.kind == 'numpy':
+            self.arrays['values'][rows] = series.to_numpy()
+        elif self.kind == 'masked':
+            self.arrays['values'][rows] = series.array.to_numpy(dtype=self.arrays['values'].dtype, na_value=0)
+            self.arrays['mask'][rows] = series.isna().to_numpy()
+        elif self.kind == 'object':
+            self.arrays['values'][rows] = series.to_numpy(dtype=object)
+        else:
+            self.pieces.append(series)
+        self.size += n_rows
+    
+    def finish(self):
+        """The assembled column (arrays are trimmed in place, not copied)"""
+        for array in self.arrays.values():
+            array.resize(self.size, refcheck=False)
+        if self.kind == 'category':
+            return pd.Categorical.from_codes(self.arrays['codes'], categories=list(self.categories))
+        if self.kind == 'numpy':
+            return self.arrays['values']
+        if self.kind == 'masked':
+            return self.masked_type(self.arrays['values'], self.arrays['mask'])
+        if self.kind == 'object':
+            return pd.array(self.arrays['values'], dtype=self.dtype)
+        return pd.concat(self.pieces, ignore_index=True)
+
+def load_data_streaming(file_path: str, chunksize: int = STREAM_CHUNK_SIZE,
+                        schema: Dict[str, str] = None, drop_product_name: bool = False,
+                        csv_engine: str = None,
+                        quantile_epsilon: Optional[float] = None) -> Tuple[pd.DataFrame, ChunkStatistics]:
+    """
+    Load the CSV chunk by chunk with an explicit schema
+    Each chunk is folded into preallocated columns (sized by a line count of
+    the file) and into the ChunkStatistics as it arrives, so peak memory is
+    the typed frame plus one chunk. Missing-value counts and numerical
+    moments (and quantile sketches when quantile_epsilon is set) are then
+    available without another pass over the assembled frame
+    Returns: typed dataframe and its ChunkStatistics
+    """
+    stats = ChunkStatistics(quantile_epsilon=quantile_epsilon)
+    typed_columns = set(schema or CSV_SCHEMA)
+    capacity = _count_csv_rows(file_path)
+    buffers: Dict[str, _ColumnBuffer] = {}
+    for chunk in iter_csv_chunks(file_path, chunksize, schema, drop_product_name, csv_engine):
+        stats.update(chunk)
+        if not buffers:
+            buffers = {col: _ColumnBuffer(chunk[col], capacity, col in typed_columns) for col in chunk.columns}
+        for col, buffer in buffers.items():
+            buffer.append(chunk[col])
+        del chunk
+    
+    if not buffers:
+        return pd.read_csv(file_path, nrows=0), stats
+    
+    df = pd.DataFrame({col: buffer.finish() for col, buffer in buffers.items()}, copy=False)
+    return df, stats
+
+def load_data(file_path: str, streaming: bool = False, **streaming_options) -> pd.DataFrame:
+    """
+    Load the product sales CSV file
+    streaming=True reads typed chunks (see load_data_streaming) instead of one inferred read
+    """
+    if streaming:
+        df, _ = load_data_streaming(file_path, **streaming_options)
+        return df
+    count_file_bytes(file_path)
     return pd.read_csv(file_path)
 
 def analyze_missing_values(df: pd.DataFrame) -> Dict[str, Any]:
@@ -32,45 +343,53 @@ def analyze_missing_values(df: pd.DataFrame) -> Dict[str, Any]:
     
     return analysis
 
-def handle_missing_values(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, str]]:
+def handle_missing_values(df: pd.DataFrame,
+                          sketches: Optional[Dict[str, KLLSketch]] = None) -> Tuple[pd.DataFrame, Dict[str, str]]:
     """
     Handle missing values in the dataset
     Strategy:
     - product_name: Fill with "Unknown"
     - Numerical columns: Fill with median (more robust to outliers)
     - category: Fill with mode
+    With sketches, medians come from the per-column quantile sketches
     """
     df_cleaned = df.copy()
+    count('dataframe_copies')
     strategies = {}
     
     # Handle product_name (categorical)
     if df_cleaned['product_name'].isnull().any():
-        df_cleaned['product_name'].fillna('Unknown', inplace=True)
+        df_cleaned['product_name'] = df_cleaned['product_name'].fillna('Unknown')
         strategies['product_name'] = 'Filled with "Unknown"'
     
     # Handle category (categorical)
     if df_cleaned['category'].isnull().any():
         mode_category = df_cleaned['category'].mode()[0] if not df_cleaned['category'].mode().empty else 'Unknown'
-        df_cleaned['category'].fillna(mode_category, inplace=True)
+        df_cleaned['category'] = df_cleaned['category'].fillna(mode_category)
         strategies['category'] = f'Filled with mode: {mode_category}'
     
     # Handle numerical columns with median
     numerical_cols = ['price', 'cost', 'units_sold', 'promotion_frequency', 'shelf_level', 'profit']
     for col in numerical_cols:
         if df_cleaned[col].isnull().any():
-            median_val = df_cleaned[col].median()
-            df_cleaned[col].fillna(median_val, inplace=True)
+            median_val = sketches[col].quantile(0.5) if sketches else df_cleaned[col].median()
+            df_cleaned[col] = df_cleaned[col].fillna(median_val)
             strategies[col] = f'Filled with median: {median_val:.2f}'
     
     return df_cleaned, strategies
 
-def detect_outliers_iqr(df: pd.DataFrame, column: str) -> Tuple[np.ndarray, float, float]:
+def detect_outliers_iqr(df: pd.DataFrame, column: str,
+                        sketch: Optional[KLLSketch] = None) -> Tuple[np.ndarray, float, float]:
     """
     Detect outliers using IQR method
+    With a sketch, the quartiles are approximate (within its rank error)
     Returns: outlier indices, lower bound, upper bound
     """
-    Q1 = df[column].quantile(0.25)
-    Q3 = df[column].quantile(0.75)
+    if sketch is not None:
+        Q1, Q3 = sketch.quantiles([0.25, 0.75])
+    else:
+        Q1 = df[column].quantile(0.25)
+        Q3 = df[column].quantile(0.75)
     IQR = Q3 - Q1
     lower_bound = Q1 - 1.5 * IQR
     upper_bound = Q3 + 1.5 * IQR
@@ -87,13 +406,14 @@ def detect_outliers_zscore(df: pd.DataFrame, column: str, threshold: float = 3.0
     outliers = (z_scores > threshold).values
     return outliers, int(outliers.sum())
 
-def analyze_outliers(df: pd.DataFrame) -> Dict[str, Any]:
-    """Analyze outliers across numerical columns"""
+def analyze_outliers(df: pd.DataFrame, sketches: Optional[Dict[str, KLLSketch]] = None) -> Dict[str, Any]:
+    """Analyze outliers across numerical columns (IQR quartiles from sketches when given)"""
     numerical_cols = ['price', 'cost', 'units_sold', 'promotion_frequency', 'shelf_level', 'profit']
     analysis = {}
     
     for col in numerical_cols:
-        iqr_outliers, lower_bound, upper_bound = detect_outliers_iqr(df, col)
+        iqr_outliers, lower_bound, upper_bound = detect_outliers_iqr(
+            df, col, sketches.get(col) if sketches else None)
         zscore_outliers, zscore_count = detect_outliers_zscore(df, col)
         
         analysis[col] = {
@@ -111,17 +431,19 @@ def analyze_outliers(df: pd.DataFrame) -> Dict[str, Any]:
     
     return analysis
 
-def handle_outliers(df: pd.DataFrame, method: str = 'cap') -> Tuple[pd.DataFrame, Dict[str, Any]]:
+def handle_outliers(df: pd.DataFrame, method: str = 'cap',
+                    sketches: Optional[Dict[str, KLLSketch]] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
     """
     Handle outliers
     Strategy: Cap outliers at IQR bounds (keep data but limit extreme values)
     """
     df_cleaned = df.copy()
+    count('dataframe_copies')
     numerical_cols = ['price', 'cost', 'units_sold', 'promotion_frequency', 'shelf_level', 'profit']
     treatment_info = {}
     
     for col in numerical_cols:
-        _, lower_bound, upper_bound = detect_outliers_iqr(df, col)
+        _, lower_bound, upper_bound = detect_outliers_iqr(df, col, sketches.get(col) if sketches else None)
         
         # Cap outliers
         outliers_before = ((df[col] < lower_bound) | (df[col] > upper_bound)).sum()
@@ -146,6 +468,7 @@ def normalize_minmax(df: pd.DataFrame, columns: list) -> Tuple[pd.DataFrame, Dic
     Returns: normalized dataframe and scaling parameters
     """
     df_normalized = df.copy()
+    count('dataframe_copies')
     scaling_params = {}
     
     for col in columns:
@@ -168,6 +491,7 @@ def standardize_zscore(df: pd.DataFrame, columns: list) -> Tuple[pd.DataFrame, D
     Returns: standardized dataframe and scaling parameters
     """
     df_standardized = df.copy()
+    count('dataframe_copies')
     scaling_params = {}
     
     for col in columns:
@@ -184,74 +508,487 @@ def standardize_zscore(df: pd.DataFrame, columns: list) -> Tuple[pd.DataFrame, D
     
     return df_standardized, scaling_params
 
-def preprocess_data(file_path: str, normalize_method: str = 'minmax') -> Tuple[pd.DataFrame, Dict[str, Any]]:
+def _filled_sorted_value(sorted_valid: np.ndarray, fill_value: float, insert_at: int,
+                         n_missing: int, index: np.ndarray) -> np.ndarray:
+    """
+    Value at `index` of the sorted column after its NaNs are filled with fill_value
+    The filled column is never materialized: the n_missing fill values sit at
+    insert_at in the sorted valid values
+    """
+    n_valid = len(sorted_valid)
+    before = sorted_valid[np.clip(index, 0, max(n_valid - 1, 0))] if n_valid else np.full(len(index), fill_value)
+    after = sorted_valid[np.clip(index - n_missing, 0, max(n_valid - 1, 0))] if n_valid else before
+    return np.where(index < insert_at, before, np.where(index < insert_at + n_missing, fill_value, after))
+
+def _filled_quantiles(sorted_valid: np.ndarray, fill_value: float, n_missing: int,
+                      quantiles: List[float]) -> np.ndarray:
+    """Linear-interpolated quantiles (pandas default) of the filled column"""
+    n_total = len(sorted_valid) + n_missing
+    insert_at = int(np.searchsorted(sorted_valid, fill_value)) if len(sorted_valid) else 0
+    positions = np.asarray(quantiles) * (n_total - 1)
+    lower = np.floor(positions).astype(int)
+    upper = np.minimum(lower + 1, n_total - 1)
+    lower_values = _filled_sorted_value(sorted_valid, fill_value, insert_at, n_missing, lower)
+    upper_values = _filled_sorted_value(sorted_valid, fill_value, insert_at, n_missing, upper)
+    return lower_values + (upper_values - lower_values) * (positions - lower)
+
+def preprocess_frame(df: pd.DataFrame, normalize_method: str = 'minmax',
+                     chunk_size: int = FUSED_CHUNK_SIZE,
+                     stats: Optional[ChunkStatistics] = None,
+                     quantile_epsilon: Optional[float] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Fused columnar preprocessing: same output and report as the step-by-step pipeline
+    The numerical columns are copied once into a column-major float matrix.
+    One sort per column yields the fill median, IQR quartiles and min/max of
+    the filled data; a single blocked pass then counts IQR / z-score outliers,
+    clips, scales and accumulates the summary statistics in place.
+    df is modified in place (no intermediate DataFrame copies). Pass the
+    ChunkStatistics gathered while streaming to skip the missing-value scan;
+    float32 columns are processed in a float32 matrix. With quantile sketches
+    (quantile_epsilon, or stats built with one) medians and IQR quartiles are
+    approximate within the reported rank error and no column is sorted
+    Returns: preprocessed dataframe and the preprocessing report pieces
+    """
+    n_records = len(df)
+    n_cols = len(NUMERICAL_COLUMNS)
+    single_precision = all(df[col].dtype == np.float32 for col in NUMERICAL_COLUMNS)
+    matrix = np.empty((n_records, n_cols), dtype=np.float32 if single_precision else np.float64, order='F')
+    for j, col in enumerate(NUMERICAL_COLUMNS):
+        matrix[:, j] = df[col].to_numpy(dtype=matrix.dtype, na_value=np.nan)
+    
+    # Missing values and valid-value moments, unless already accumulated per chunk
+    if stats is None:
+        stats = ChunkStatistics(quantile_epsilon=quantile_epsilon)
+        for start in range(0, n_records, chunk_size):
+            stats.update(df.iloc[start:start + chunk_size], numeric=matrix[start:start + chunk_size])
+    missing_analysis = stats.missing_analysis()
+    missing_counts = stats.missing_counts
+    numeric_missing = np.array([missing_counts[col] for col in NUMERICAL_COLUMNS])
+    
+    # Categorical fills
+    missing_strategies = {}
+    mode_category = _category_mode(df)
+    if missing_counts.get('product_name', 0) > 0:
+        df['product_name'] = df['product_name'].fillna('Unknown')
+        missing_strategies['product_name'] = 'Filled with "Unknown"'
+    if missing_counts.get('category', 0) > 0:
+        if isinstance(df['category'].dtype, pd.CategoricalDtype) and mode_category not in df['category'].cat.categories:
+            df['category'] = df['category'].cat.add_categories([mode_category])
+        df['category'] = df['category'].fillna(mode_category)
+        missing_strategies['category'] = f'Filled with mode: {mode_category}'
+    
+    fill_values = np.empty(n_cols)
+    bounds = np.empty((2, n_cols))
+    extremes = np.empty((2, n_cols))
+    
+    if stats.sketches is not None:
+        # Sketched quantiles: no sort; the fill value is added to each sketch as
+        # weighted copies, so the quartiles describe the filled column
+        for j, col in enumerate(NUMERICAL_COLUMNS):
+            sketch = stats.sketches[col]
+            fill_values[j] = sketch.quantile(0.5)
+            if numeric_missing[j] > 0:
+                column = matrix[:, j]
+                column[np.isnan(column)] = fill_values[j]
+                missing_strategies[col] = f'Filled with median: {fill_values[j]:.2f}'
+                sketch.update_repeated(fill_values[j], numeric_missing[j])
+            q1, q3 = sketch.quantiles([0.25, 0.75])
+            iqr = q3 - q1
+            bounds[:, j] = (q1 - 1.5 * iqr, q3 + 1.5 * iqr)
+            extremes[:, j] = (stats.min[j], stats.max[j])
+    else:
+        # One sort per column: median for the fill, then quartiles and extremes of the filled data
+        buffer = np.empty(n_records, dtype=matrix.dtype)
+        for j, col in enumerate(NUMERICAL_COLUMNS):
+            n_missing = int(numeric_missing[j])
+            buffer[:] = matrix[:, j]
+            buffer.sort()
+            sorted_valid = buffer[:n_records - n_missing]
+            fill_values[j] = _filled_quantiles(sorted_valid, 0.0, 0, [0.5])[0] if len(sorted_valid) else np.nan
+            if n_missing > 0:
+                column = matrix[:, j]
+                column[np.isnan(column)] = fill_values[j]
+                missing_strategies[col] = f'Filled with median: {fill_values[j]:.2f}'
+            q1, q3, low, high = _filled_quantiles(sorted_valid, fill_values[j], n_missing, [0.25, 0.75, 0.0, 1.0])
+            iqr = q3 - q1
+            bounds[:, j] = (q1 - 1.5 * iqr, q3 + 1.5 * iqr)
+            extremes[:, j] = (low, high)
+        del buffer
+    
+    # Round the bounds to the matrix precision: a float32 value clipped to a
+    # float64 bound would otherwise land just outside it and still count as an outlier
+    bounds = bounds.astype(matrix.dtype).astype(np.float64)
+    means, stds = stats.filled_moments(fill_values)
+    
+    # Scaling parameters of the clipped data follow from the clipped extremes
+    clipped_min = np.clip(extremes[0], bounds[0], bounds[1])
+    clipped_max = np.clip(extremes[1], bounds[0], bounds[1])
+    feature_idx = [NUMERICAL_COLUMNS.index(col) for col in NORMALIZED_FEATURES]
+    summary_idx = [NUMERICAL_COLUMNS.index(col) for col in SUMMARY_COLUMNS]
+    minmax = normalize_method == 'minmax'
+    scale_idx = [j for j in feature_idx if clipped_max[j] != clipped_min[j]] if minmax else []
+    
+    iqr_counts = np.zeros(n_cols, dtype=np.int64)
+    zscore_counts = np.zeros(n_cols, dtype=np.int64)
+    after_counts = np.zeros(n_cols, dtype=np.int64)
+    
+    # Summary sums are shifted by the (final-scale) median to avoid cancellation
+    summary_scaled = np.isin(summary_idx, scale_idx)
+    summary_min = clipped_min[summary_idx]
+    summary_range = np.where(summary_scaled, clipped_max[summary_idx] - summary_min, 1.0)
+    summary_offset = np.where(summary_scaled, summary_min, 0.0)
+    shift = (fill_values[summary_idx] - summary_offset) / summary_range
+    sums = np.zeros(len(summary_idx))
+    sums_sq = np.zeros(len(summary_idx))
+    
+    for start in range(0, n_records, chunk_size):
+        block = matrix[start:start + chunk_size]
+        iqr_counts += ((block < bounds[0]) | (block > bounds[1])).sum(axis=0)
+        zscore_counts += (np.abs(block - means) > 3.0 * stds).sum(axis=0)
+        np.clip(block, bounds[0], bounds[1], out=block)
+        after_counts += ((block < bounds[0]) | (block > bounds[1])).sum(axis=0)
+        if scale_idx:
+            block[:, scale_idx] = ((block[:, scale_idx] - clipped_min[scale_idx])
+                                   / (clipped_max[scale_idx] - clipped_min[scale_idx]))
+        if minmax:
+            centered = block[:, summary_idx] - shift
+            sums += centered.sum(axis=0, dtype=np.float64)
+            sums_sq += (centered ** 2).sum(axis=0, dtype=np.float64)
+    
+    outlier_analysis = {}
+    outlier_treatment = {}
+    for j, col in enumerate(NUMERICAL_COLUMNS):
+        outlier_analysis[col] = {
+            "iqr": {
+                "count": int(iqr_counts[j]),
+                "percentage": float(iqr_counts[j] / n_records * 100),
+                "lower_bound": float(bounds[0, j]),
+                "upper_bound": float(bounds[1, j])
+            },
+            "zscore": {
+                "count": int(zscore_counts[j]),
+                "percentage": float(zscore_counts[j] / n_records * 100)
+            }
+        }
+        if iqr_counts[j] > 0:
+            outlier_treatment[col] = {
+                "outliers_before": int(iqr_counts[j]),
+                "outliers_after": int(after_counts[j]),
+                "lower_bound": float(bounds[0, j]),
+                "upper_bound": float(bounds[1, j]),
+                "method": "capped"
+            }
+    
+    scaling_params = {}
+    if minmax:
+        for j in scale_idx:
+            scaling_params[NUMERICAL_COLUMNS[j]] = {
+                "min": float(clipped_min[j]),
+                "max": float(clipped_max[j]),
+                "method": "minmax"
+            }
+        mean_centered = sums / n_records
+        summary_means = shift + mean_centered
+        summary_stds = np.sqrt(np.maximum((sums_sq - n_records * mean_centered ** 2)
+                                          / max(n_records - 1, 1), 0.0))
+        low = np.where(summary_scaled, 0.0, summary_min)
+        high = np.where(summary_scaled, 1.0, clipped_max[summary_idx])
+    else:
+        # Z-score scaling needs the clipped mean/std, hence a second pass
+        clipped_means = matrix.mean(axis=0, dtype=np.float64)
+        clipped_stds = matrix.std(axis=0, ddof=1, dtype=np.float64)
+        for j in feature_idx:
+            if clipped_stds[j] != 0:
+                matrix[:, j] -= clipped_means[j]
+                matrix[:, j] /= clipped_stds[j]
+                scaling_params[NUMERICAL_COLUMNS[j]] = {
+                    "mean": float(clipped_means[j]),
+                    "std": float(clipped_stds[j]),
+                    "method": "zscore"
+                }
+        final = matrix[:, summary_idx]
+        summary_means = final.mean(axis=0, dtype=np.float64)
+        summary_stds = final.std(axis=0, ddof=1, dtype=np.float64)
+        low, high = final.min(axis=0), final.max(axis=0)
+    
+    for j, col in enumerate(NUMERICAL_COLUMNS):
+        df[col] = matrix[:, j]
+    
+    summary_stats = {
+        col: {
+            "mean": float(summary_means[i]),
+            "std": float(summary_stds[i]),
+            "min": float(low[i]),
+            "max": float(high[i])
+        }
+        for i, col in enumerate(SUMMARY_COLUMNS)
+    }
+    
+    pieces = {
+        "missing_analysis": missing_analysis,
+        "missing_strategies": missing_strategies,
+        "fill_values": _fill_values_report(fill_values, mode_category),
+        "outlier_analysis": outlier_analysis,
+        "outlier_treatment": outlier_treatment,
+        "scaling_params": scaling_params,
+        "summary_stats": summary_stats
+    }
+    if stats.sketches is not None:
+        pieces["quantile_estimation"] = _sketch_report(stats.sketches)
+    return df, pieces
+
+def _category_mode(df: pd.DataFrame) -> str:
+    """Most frequent category (the fill for missing categories)"""
+    modes = df['category'].mode()
+    return modes[0] if not modes.empty else 'Unknown'
+
+def _fill_values_report(numeric_fills, mode_category: str) -> Dict[str, Any]:
+    """Exact fill value of every column, so new batches can be filled the same way"""
+    fills = {'product_name': 'Unknown', 'category': str(mode_category)}
+    fills.update({col: float(numeric_fills[j]) for j, col in enumerate(NUMERICAL_COLUMNS)})
+    return fills
+
+def _sketch_report(sketches: Dict[str, KLLSketch]) -> Dict[str, Any]:
+    """Configured and achieved (99% confidence) normalized rank error per column"""
+    return {
+        "method": "kll_sketch",
+        "epsilon": next(iter(sketches.values())).epsilon,
+        "rank_error": {col: sketch.rank_error() for col, sketch in sketches.items()}
+    }
+
+def _build_report(original_records: int, final_records: int, normalize_method: str,
+                  pieces: Dict[str, Any]) -> Dict[str, Any]:
+    """Assemble the preprocessing report from its parts"""
+    report = {
+        "original_records": original_records,
+        "final_records": final_records,
+        "missing_values": {
+            "analysis": pieces["missing_analysis"],
+            "strategies": pieces["missing_strategies"],
+            "fill_values": pieces["fill_values"]
+        },
+        "outliers": {
+            "analysis": pieces["outlier_analysis"],
+            "treatment": pieces["outlier_treatment"]
+        },
+        "normalization": {
+            "method": normalize_method,
+            "features_normalized": NORMALIZED_FEATURES,
+            "scaling_parameters": pieces["scaling_params"]
+        },
+        "summary_stats": pieces["summary_stats"]
+    }
+    if "quantile_estimation" in pieces:
+        report["quantile_estimation"] = pieces["quantile_estimation"]
+    return report
+
+def write_snapshot(df: pd.DataFrame, report: Dict[str, Any], snapshot_dir: str,
+                   source_sha256: Optional[str] = None, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Write the cleaned data as .npy matrices plus a metadata.json holding the
+    report (and so the scaling parameters); metadata goes last so a partial
+    write is never mistaken for a valid snapshot
+    Returns: snapshot metadata
+    """
+    directory = Path(snapshot_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    metadata_path = directory / "metadata.json"
+    if metadata_path.exists():
+        metadata_path.unlink()
+    
+    matrices = {}
+    for name, columns in SNAPSHOT_MATRICES.items():
+        matrix = np.ascontiguousarray(df[columns].to_numpy())
+        if name == 'target':
+            matrix = matrix[:, 0]
+        np.save(directory / f"{name}.npy", matrix)
+        matrices[name] = {"file": f"{name}.npy", "columns": columns, "dtype": str(matrix.dtype)}
+    
+    categories = None
+    if 'category' in df.columns:
+        category = df['category'].astype('category')
+        categories = [str(c) for c in category.cat.categories]
+        np.save(directory / "category_codes.npy", category.cat.codes.to_numpy(dtype=np.int32))
+    if 'product_id' in df.columns:
+        np.save(directory / "product_id.npy", df['product_id'].to_numpy(dtype=np.int64, na_value=-1))
+    
+    metadata = {
+        "version": SNAPSHOT_VERSION,
+        "source_sha256": source_sha256,
+        "options": options or {},
+        "n_records": int(len(df)),
+        "columns": [col for col in df.columns if col != 'product_name'],
+        "matrices": matrices,
+        "categories": categories,
+        "report": report
+    }
+    with open(metadata_path, "w") as f:
+        json.dump(metadata, f)
+    return metadata
+
+def load_snapshot(snapshot_dir: str, mmap_mode: Optional[str] = 'r') -> Optional[Dict[str, Any]]:
+    """
+    Open a snapshot written by write_snapshot; with mmap_mode='r' the matrices
+    are read-only memory maps, so K-means and regression read them zero-copy
+    Returns: dict of metadata and arrays, or None if there is no valid snapshot
+    """
+    directory = Path(snapshot_dir)
+    try:
+        with open(directory / "metadata.json") as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if metadata.get("version") != SNAPSHOT_VERSION:
+        return None
+    
+    snapshot = {"metadata": metadata}
+    for name, entry in metadata["matrices"].items():
+        snapshot[name] = np.load(directory / entry["file"], mmap_mode=mmap_mode)
+        count_file_bytes(directory / entry["file"])
+    for name in ("category_codes", "product_id"):
+        path = directory / f"{name}.npy"
+        if path.exists():
+            snapshot[name] = np.load(path, mmap_mode=mmap_mode)
+            count_file_bytes(path)
+    return snapshot
+
+def snapshot_frame(snapshot: Dict[str, Any]) -> pd.DataFrame:
+    """
+    Rebuild the preprocessed dataframe from a loaded snapshot (product_name is
+    not stored; nothing downstream of preprocessing reads it)
+    Returns: preprocessed dataframe
+    """
+    metadata = snapshot["metadata"]
+    data = {}
+    if "product_id" in snapshot:
+        data['product_id'] = pd.array(snapshot["product_id"], dtype='Int64')
+        data['product_id'][snapshot["product_id"] < 0] = pd.NA
+    if "category_codes" in snapshot:
+        data['category'] = pd.Categorical.from_codes(np.asarray(snapshot["category_codes"]),
+                                                     metadata["categories"])
+    for name in ('regression_features', 'target'):
+        matrix = np.asarray(snapshot[name])
+        columns = metadata["matrices"][name]["columns"]
+        if matrix.ndim == 1:
+            matrix = matrix[:, None]
+        for j, col in enumerate(columns):
+            data[col] = matrix[:, j]
+    return pd.DataFrame(data)[[col for col in metadata["columns"] if col in data]]
+
+def preprocess_data(file_path: str, normalize_method: str = 'minmax',
+                    engine: str = 'fused', streaming: bool = False,
+                    quantile_epsilon: Optional[float] = None,
+                    snapshot_dir: Optional[str] = None,
+                    **streaming_options) -> Tuple[pd.DataFrame, Dict[str, Any]]:
     """
     Complete preprocessing pipeline
+    engine='fused' (default) runs preprocess_frame over one float matrix;
+    engine='pandas' runs the step-by-step functions above.
+    streaming=True loads typed chunks (float32 numerics, categorical category)
+    and reuses the statistics accumulated while reading; streaming_options are
+    passed to load_data_streaming (chunksize, drop_product_name, csv_engine).
+    quantile_epsilon switches medians and IQR quartiles to mergeable KLL
+    sketches with that normalized rank error; the achieved error is reported
+    under "quantile_estimation".
+    snapshot_dir stores the result as a binary snapshot (see write_snapshot);
+    a later call on the same CSV content and options loads it instead of
+    parsing the CSV again
     Returns: preprocessed dataframe and preprocessing report
     """
+    if snapshot_dir is None:
+        return _preprocess_csv(file_path, normalize_method, engine, streaming,
+                               quantile_epsilon, **streaming_options)
+    
+    source_sha256 = file_sha256(file_path)
+    options = {"normalize_method": normalize_method, "engine": engine,
+               "quantile_epsilon": quantile_epsilon}
+    snapshot = load_snapshot(snapshot_dir)
+    if (snapshot is not None and snapshot["metadata"]["source_sha256"] == source_sha256
+            and snapshot["metadata"]["options"] == options):
+        count('rows_processed', snapshot["metadata"]["report"]["final_records"])
+        return snapshot_frame(snapshot), snapshot["metadata"]["report"]
+    
+    df_normalized, report = _preprocess_csv(file_path, normalize_method, engine, streaming,
+                                            quantile_epsilon, **streaming_options)
+    write_snapshot(df_normalized, report, snapshot_dir, source_sha256, options)
+    return df_normalized, report
+
+def _preprocess_csv(file_path: str, normalize_method: str, engine: str, streaming: bool,
+                    quantile_epsilon: Optional[float],
+                    **streaming_options) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Parse and preprocess the CSV (preprocess_data without the snapshot)"""
     # Load data
-    df = load_data(file_path)
+    stats = None
+    if streaming:
+        df, stats = load_data_streaming(file_path, quantile_epsilon=quantile_epsilon, **streaming_options)
+    else:
+        df = load_data(file_path)
+    original_records = len(df)
+    count('rows_processed', original_records)
+    
+    if engine == 'fused':
+        df_normalized, pieces = preprocess_frame(df, normalize_method, stats=stats,
+                                                 quantile_epsilon=quantile_epsilon)
+        return df_normalized, _build_report(original_records, len(df_normalized), normalize_method, pieces)
     
     # Analyze missing values
     missing_analysis = analyze_missing_values(df)
     
+    sketches = None
+    if quantile_epsilon is not None:
+        sketches = {col: KLLSketch(quantile_epsilon, random_seed=j) for j, col in enumerate(NUMERICAL_COLUMNS)}
+        for col in NUMERICAL_COLUMNS:
+            sketches[col].update(df[col].to_numpy(dtype=float, na_value=np.nan))
+    
+    # Fill values of every column, recorded even where nothing was missing
+    fill_values = _fill_values_report(
+        [sketches[col].quantile(0.5) if sketches else df[col].median() for col in NUMERICAL_COLUMNS],
+        _category_mode(df))
+    
     # Handle missing values
-    df_cleaned, missing_strategies = handle_missing_values(df)
+    df_cleaned, missing_strategies = handle_missing_values(df, sketches)
+    
+    # The outlier steps see the filled columns: add the fill values to each sketch
+    if sketches is not None:
+        for col in NUMERICAL_COLUMNS:
+            n_missing = int(df[col].isnull().sum())
+            if n_missing:
+                sketches[col].update_repeated(sketches[col].quantile(0.5), n_missing)
     
     # Analyze outliers
-    outlier_analysis = analyze_outliers(df_cleaned)
+    outlier_analysis = analyze_outliers(df_cleaned, sketches)
     
     # Handle outliers
-    df_final, outlier_treatment = handle_outliers(df_cleaned)
+    df_final, outlier_treatment = handle_outliers(df_cleaned, sketches=sketches)
     
     # Normalize/Standardize numerical features
-    numerical_features = ['price', 'cost', 'units_sold', 'promotion_frequency', 'shelf_level']
-    
     if normalize_method == 'minmax':
-        df_normalized, scaling_params = normalize_minmax(df_final, numerical_features)
+        df_normalized, scaling_params = normalize_minmax(df_final, NORMALIZED_FEATURES)
     else:
-        df_normalized, scaling_params = standardize_zscore(df_final, numerical_features)
+        df_normalized, scaling_params = standardize_zscore(df_final, NORMALIZED_FEATURES)
     
-    # Create preprocessing report
-    report = {
-        "original_records": len(df),
-        "final_records": len(df_normalized),
-        "missing_values": {
-            "analysis": missing_analysis,
-            "strategies": missing_strategies
-        },
-        "outliers": {
-            "analysis": outlier_analysis,
-            "treatment": outlier_treatment
-        },
-        "normalization": {
-            "method": normalize_method,
-            "features_normalized": numerical_features,
-            "scaling_parameters": scaling_params
-        },
-        "summary_stats": {
-            "price": {
-                "mean": float(df_normalized['price'].mean()),
-                "std": float(df_normalized['price'].std()),
-                "min": float(df_normalized['price'].min()),
-                "max": float(df_normalized['price'].max())
-            },
-            "units_sold": {
-                "mean": float(df_normalized['units_sold'].mean()),
-                "std": float(df_normalized['units_sold'].std()),
-                "min": float(df_normalized['units_sold'].min()),
-                "max": float(df_normalized['units_sold'].max())
-            },
-            "profit": {
-                "mean": float(df_normalized['profit'].mean()),
-                "std": float(df_normalized['profit'].std()),
-                "min": float(df_normalized['profit'].min()),
-                "max": float(df_normalized['profit'].max())
-            }
+    summary_stats = {
+        col: {
+            "mean": float(df_normalized[col].mean()),
+            "std": float(df_normalized[col].std()),
+            "min": float(df_normalized[col].min()),
+            "max": float(df_normalized[col].max())
         }
+        for col in SUMMARY_COLUMNS
     }
     
-    return df_normalized, report
+    pieces = {
+        "missing_analysis": missing_analysis,
+        "missing_strategies": missing_strategies,
+        "fill_values": fill_values,
+        "outlier_analysis": outlier_analysis,
+        "outlier_treatment": outlier_treatment,
+        "scaling_params": scaling_params,
+        "summary_stats": summary_stats
+    }
+    if sketches is not None:
+        pieces["quantile_estimation"] = _sketch_report(sketches)
+    return df_normalized, _build_report(original_records, len(df_normalized), normalize_method, pieces)
 
 if __name__ == "__main__":
     import sys
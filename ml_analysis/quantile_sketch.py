@@ -0,0 +1,114 @@
+"""
+Mergeable Quantile Sketch
+KLL-style compactor sketch for approximate quantiles over streamed or chunked data
+"""
+import numpy as np
+from typing import List, Optional
+
+# z-score of the confidence level used for the reported rank error (99%)
+RANK_ERROR_Z = 2.576
+
+class KLLSketch:
+    """
+    Approximate quantiles with a configurable normalized rank error
+    Values enter level 0; a level that grows past k items is sorted and every
+    other item (random offset) is promoted to the next level with double the
+    weight. Each compaction at weight w moves any rank by at most w, so the
+    achieved error is tracked from the compaction history. Sketches built on
+    different chunks or workers can be merged.
+    """
+    def __init__(self, epsilon: float = 0.005, random_seed=None):
+        self.epsilon = float(epsilon)
+        # Error after n compactions scales as ~ z / k, so size k from the target
+        self.k = max(16, int(np.ceil(RANK_ERROR_Z / self.epsilon)))
+        self.k += self.k % 2
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self.n = 0
+        self.compaction_variance = 0.0
+        self.rng = np.random.default_rng(random_seed)
+
+    def _ensure_level(self, level: int):
+        while len(self.levels) <= level:
+            self.levels.append(np.empty(0))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.k:
+                items = np.sort(items)
+                # Keep one item back when the count is odd so pairs are exact
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                paired = items[:len(items) - len(keep)]
+                promoted = paired[int(self.rng.integers(2))::2]
+                self._ensure_level(level + 1)
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                self.levels[level] = keep.copy()
+                self.compaction_variance += float(4 ** level)
+            level += 1
+
+    def update(self, values: np.ndarray):
+        """Add a batch of values (NaNs are ignored)"""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.n += len(values)
+        self._compress()
+
+    def update_repeated(self, value: float, count: int):
+        """Add `count` copies of one value exactly, one item per set bit of count"""
+        count = int(count)
+        if count <= 0 or np.isnan(value):
+            return
+        self.n += count
+        level = 0
+        while count:
+            if count & 1:
+                self._ensure_level(level)
+                self.levels[level] = np.append(self.levels[level], value)
+            count >>= 1
+            level += 1
+        self._compress()
+
+    def merge(self, other: 'KLLSketch') -> 'KLLSketch':
+        """Fold another sketch into this one (in place) and return self"""
+        self._ensure_level(len(other.levels) - 1)
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.compaction_variance += other.compaction_variance
+        self._compress()
+        return self
+
+    def quantiles(self, qs: List[float]) -> np.ndarray:
+        """Approximate quantiles for the probabilities in qs"""
+        if self.n == 0:
+            return np.full(len(qs), np.nan)
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** h) for h, items in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        values, cumulative = values[order], np.cumsum(weights[order])
+        targets = np.asarray(qs, dtype=float) * cumulative[-1]
+        indices = np.minimum(np.searchsorted(cumulative, targets, side='left'), len(values) - 1)
+        return values[indices]
+
+    def quantile(self, q: float) -> float:
+        return float(self.quantiles([q])[0])
+
+    def rank_error(self) -> float:
+        """Normalized rank error achieved so far, at 99% confidence"""
+        if self.n == 0:
+            return 0.0
+        return float(RANK_ERROR_Z * np.sqrt(self.compaction_variance) / self.n)
+
+def build_sketch(values: np.ndarray, epsilon: float = 0.005, chunk_size: Optional[int] = None,
+                 random_seed=None) -> KLLSketch:
+    """Sketch an array, optionally feeding it in chunks to bound the sort size"""
+    sketch = KLLSketch(epsilon, random_seed)
+    values = np.asarray(values)
+    step = chunk_size or max(len(values), 1)
+    for start in range(0, len(values), step):
+        sketch.update(values[start:start + step])
+    return sketch
@@ -4,12 +4,36 @@ Implements Linear and Polynomial Regression for profit prediction
 """
 import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import PolynomialFeatures
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, mean_absolute_error
-from typing import Dict, Any, Tuple
+from itertools import combinations_with_replacement
+from typing import Dict, Any, Tuple, List, Optional, Sequence
 import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from instrumentation import count
+
+# Rows per block when expanding polynomial terms and accumulating the Gram matrix
+GRAM_CHUNK_SIZE = 65536
+
+REGRESSION_FEATURES = ['price', 'cost', 'units_sold', 'promotion_frequency', 'shelf_level']
+
+# Points of actual vs predicted kept inline in the JSON results (for plotting)
+PREDICTION_SAMPLE_SIZE = 500
+
+def train_test_split(X: np.ndarray, y: np.ndarray, test_size: float = 0.3,
+                     random_state: int = 42) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Shuffled train/test split; same rows as sklearn.model_selection.train_test_split
+    (without importing scikit-learn, which dominated start-up time)
+    Returns: X_train, X_test, y_train, y_test
+    """
+    n_samples = len(X)
+    n_test = int(np.ceil(test_size * n_samples))
+    permutation = np.random.RandomState(random_state).permutation(n_samples)
+    test_index, train_index = permutation[:n_test], permutation[n_test:]
+    return X[train_index], X[test_index], y[train_index], y[test_index]
 
 def prepare_regression_data(df: pd.DataFrame, target: str = 'profit') -> Tuple[np.ndarray, np.ndarray, list]:
     """
@@ -17,84 +41,240 @@ def prepare_regression_data(df: pd.DataFrame, target: str = 'profit') -> Tuple[n
     Returns: X (features), y (target), feature_names
     """
     # Select features (excluding target and non-numerical)
-    feature_cols = ['price', 'cost', 'units_sold', 'promotion_frequency', 'shelf_level']
+    feature_cols = list(REGRESSION_FEATURES)
     X = df[feature_cols].values
     y = df[target].values
     return X, y, feature_cols
 
-def train_linear_regression(X_train: np.ndarray, y_train: np.ndarray) -> Tuple[LinearRegression, Dict[str, Any]]:
+def polynomial_terms(n_features: int, degree: int) -> List[Tuple[int, ...]]:
+    """
+    Monomials up to `degree` as tuples of feature indices, in PolynomialFeatures
+    order (no bias): all degree-1 terms first, so the terms of a lower degree
+    are always a leading prefix of a higher-degree expansion
+    Returns: list of index tuples
+    """
+    return [combo for d in range(1, degree + 1)
+            for combo in combinations_with_replacement(range(n_features), d)]
+
+def expand_terms(X: np.ndarray, terms: List[Tuple[int, ...]]) -> np.ndarray:
+    """Evaluate the monomials on X; each term reuses the product of its prefix"""
+    X = np.asarray(X, dtype=float)
+    Z = np.empty((len(X), len(terms)))
+    position = {}
+    for t, combo in enumerate(terms):
+        if len(combo) == 1:
+            Z[:, t] = X[:, combo[0]]
+        else:
+            np.multiply(Z[:, position[combo[:-1]]], X[:, combo[-1]], out=Z[:, t])
+        position[combo] = t
+    return Z
+
+class GramStatistics:
+    """
+    Sufficient statistics of a least-squares fit on the polynomial terms Z of X:
+    n, Z'1, Z'Z, Z'y, y'1 and y'y, accumulated chunk by chunk (so X can be a
+    memory map or arrive from a stream). Statistics of disjoint row sets add,
+    and subtracting a subset's statistics leaves those of the remaining rows.
+    Because lower-degree terms lead the term list, the degree-1 system is the
+    top-left block of the degree-2 one and both come from a single pass
+    """
+    def __init__(self, n_features: int, degree: int = 1):
+        self.n_features = n_features
+        self.degree = degree
+        self.terms = polynomial_terms(n_features, degree)
+        p = len(self.terms)
+        self.n = 0
+        self.sum_z = np.zeros(p)
+        self.zz = np.zeros((p, p))
+        self.zy = np.zeros(p)
+        self.sum_y = 0.0
+        self.yy = 0.0
+
+    def update(self, X: np.ndarray, y: np.ndarray, chunk_size: int = GRAM_CHUNK_SIZE) -> 'GramStatistics':
+        """Accumulate the rows of (X, y), expanding one block at a time"""
+        for start in range(0, len(X), chunk_size):
+            Z = expand_terms(X[start:start + chunk_size], self.terms)
+            y_block = np.asarray(y[start:start + chunk_size], dtype=float)
+            self.n += len(Z)
+            self.sum_z += Z.sum(axis=0)
+            self.zz += Z.T @ Z
+            self.zy += Z.T @ y_block
+            self.sum_y += float(y_block.sum())
+            self.yy += float(y_block @ y_block)
+        count('rows_processed', len(X))
+        return self
+
+    def _combine(self, other: 'GramStatistics', sign: float) -> 'GramStatistics':
+        result = GramStatistics(self.n_features, self.degree)
+        result.n = self.n + int(sign) * other.n
+        result.sum_z = self.sum_z + sign * other.sum_z
+        result.zz = self.zz + sign * other.zz
+        result.zy = self.zy + sign * other.zy
+        result.sum_y = self.sum_y + sign * other.sum_y
+        result.yy = self.yy + sign * other.yy
+        return result
+
+    def __add__(self, other: 'GramStatistics') -> 'GramStatistics':
+        return self._combine(other, 1.0)
+
+    def __sub__(self, other: 'GramStatistics') -> 'GramStatistics':
+        """Downdate: statistics of these rows minus a subset of them"""
+        return self._combine(other, -1.0)
+
+    def restrict(self, degree: int) -> 'GramStatistics':
+        """Statistics of a lower-degree model: the leading block, no new pass"""
+        result = GramStatistics(self.n_features, degree)
+        p = len(result.terms)
+        result.n, result.sum_y, result.yy = self.n, self.sum_y, self.yy
+        result.sum_z = self.sum_z[:p].copy()
+        result.zz = self.zz[:p, :p].copy()
+        result.zy = self.zy[:p].copy()
+        return result
+
+    def centered(self) -> Tuple[np.ndarray, np.ndarray, float]:
+        """Centered cross-products: Z'Z and Z'y about the means, and the total sum of squares of y"""
+        mean_z = self.sum_z / self.n
+        mean_y = self.sum_y / self.n
+        czz = self.zz - self.n * np.outer(mean_z, mean_z)
+        czy = self.zy - self.n * mean_z * mean_y
+        syy = self.yy - self.n * mean_y ** 2
+        return czz, czy, syy
+
+    def solve(self, alpha: float = 0.0) -> Tuple[np.ndarray, float]:
+        """
+        Least-squares (ridge for alpha > 0, intercept not penalized) on the
+        centered, unit-diagonal normal equations via Cholesky; falls back to
+        an SVD least-squares solve (the minimum-norm solution, as in
+        LinearRegression) when the system is singular or badly conditioned
+        Returns: coefficients and intercept
+        """
+        czz, czy, _ = self.centered()
+        scale = np.sqrt(np.maximum(np.diag(czz), 0.0))
+        scale[scale == 0] = 1.0
+        A = czz / np.outer(scale, scale)
+        A[np.diag_indices_from(A)] += alpha / scale ** 2
+        b = czy / scale
+        try:
+            L = np.linalg.cholesky(A)
+            diag = np.diag(L)
+            # cond(A) ~ (max/min diag of L)^2: past ~1e14 the solve is not trustworthy
+            if diag.min() <= diag.max() * 1e-7:
+                raise np.linalg.LinAlgError("ill-conditioned normal equations")
+            v = np.linalg.solve(L.T, np.linalg.solve(L, b))
+        except np.linalg.LinAlgError:
+            v = np.linalg.lstsq(A, b, rcond=None)[0]
+        coef = v / scale
+        intercept = float(self.sum_y / self.n - coef @ (self.sum_z / self.n))
+        return coef, intercept
+
+    def residual_sum_of_squares(self, coef: np.ndarray, intercept: float) -> float:
+        """Training SSE of a fitted model, from the statistics alone"""
+        czz, czy, syy = self.centered()
+        # Residuals about the fit: centered SSE plus the (zero at the optimum) mean offset
+        mean_residual = self.sum_y / self.n - intercept - coef @ (self.sum_z / self.n)
+        sse = syy - 2.0 * coef @ czy + coef @ czz @ coef + self.n * mean_residual ** 2
+        return float(max(sse, 0.0))
+
+    def r2_score(self, coef: np.ndarray, intercept: float) -> float:
+        _, _, syy = self.centered()
+        return float(1.0 - self.residual_sum_of_squares(coef, intercept) / syy) if syy > 0 else 0.0
+
+class LeastSquaresModel:
+    """Fitted linear model on the polynomial terms of X (degree 1 = plain linear regression)"""
+    def __init__(self, terms: List[Tuple[int, ...]], coef: np.ndarray, intercept: float):
+        self.terms = terms
+        self.coef_ = np.asarray(coef, dtype=float)
+        self.intercept_ = float(intercept)
+
+    @classmethod
+    def fit(cls, stats: GramStatistics, alpha: float = 0.0) -> 'LeastSquaresModel':
+        coef, intercept = stats.solve(alpha)
+        return cls(stats.terms, coef, intercept)
+
+    @property
+    def degree(self) -> int:
+        return max(len(combo) for combo in self.terms)
+
+    def predict(self, X: np.ndarray, chunk_size: int = GRAM_CHUNK_SIZE) -> np.ndarray:
+        """Predict block by block; the term expansion is never materialized in full"""
+        predictions = np.empty(len(X))
+        for start in range(0, len(X), chunk_size):
+            Z = expand_terms(X[start:start + chunk_size], self.terms)
+            predictions[start:start + chunk_size] = Z @ self.coef_ + self.intercept_
+        count('rows_processed', len(X))
+        return predictions
+
+def _train_info(model: LeastSquaresModel, stats: GramStatistics, X_train: np.ndarray,
+                y_train: np.ndarray) -> Dict[str, float]:
+    """Train MSE / R² from the Gram statistics; MAE needs one prediction pass"""
+    sse = stats.residual_sum_of_squares(model.coef_, model.intercept_)
+    return {
+        "train_mse": sse / stats.n,
+        "train_mae": float(np.mean(np.abs(np.asarray(y_train) - model.predict(X_train)))),
+        "r2_score": stats.r2_score(model.coef_, model.intercept_)
+    }
+
+def train_linear_regression(X_train: np.ndarray, y_train: np.ndarray,
+                            stats: Optional[GramStatistics] = None) -> Tuple[LeastSquaresModel, Dict[str, Any]]:
     """
     Train linear regression model
+    stats may be the statistics of a higher-degree pass over the same rows
     Returns: trained model and model info
     """
-    model = LinearRegression()
-    model.fit(X_train, y_train)
-    
-    # Calculate training metrics
-    y_train_pred = model.predict(X_train)
-    train_mse = mean_squared_error(y_train, y_train_pred)
-    train_mae = mean_absolute_error(y_train, y_train_pred)
+    if stats is None:
+        stats = GramStatistics(X_train.shape[1], 1).update(X_train, y_train)
+    elif stats.degree != 1:
+        stats = stats.restrict(1)
+    model = LeastSquaresModel.fit(stats)
     
     info = {
         "type": "Linear Regression",
         "coefficients": model.coef_.tolist(),
-        "intercept": float(model.intercept_),
-        "train_mse": float(train_mse),
-        "train_mae": float(train_mae),
-        "r2_score": float(model.score(X_train, y_train))
+        "intercept": model.intercept_
     }
+    info.update(_train_info(model, stats, X_train, y_train))
     
     return model, info
 
-def train_polynomial_regression(X_train: np.ndarray, y_train: np.ndarray, 
-                                degree: int = 2) -> Tuple[LinearRegression, PolynomialFeatures, Dict[str, Any]]:
+def train_polynomial_regression(X_train: np.ndarray, y_train: np.ndarray, degree: int = 2,
+                                stats: Optional[GramStatistics] = None) -> Tuple[LeastSquaresModel, Dict[str, Any]]:
     """
     Train polynomial regression model
-    Returns: trained model, polynomial transformer, and model info
+    stats may come from a pass of this or a higher degree over the same rows
+    Returns: trained model and model info
     """
-    # Create polynomial features
-    poly = PolynomialFeatures(degree=degree, include_bias=False)
-    X_train_poly = poly.fit_transform(X_train)
-    
-    # Train linear regression on polynomial features
-    model = LinearRegression()
-    model.fit(X_train_poly, y_train)
-    
-    # Calculate training metrics
-    y_train_pred = model.predict(X_train_poly)
-    train_mse = mean_squared_error(y_train, y_train_pred)
-    train_mae = mean_absolute_error(y_train, y_train_pred)
+    if stats is None:
+        stats = GramStatistics(X_train.shape[1], degree).update(X_train, y_train)
+    elif stats.degree != degree:
+        stats = stats.restrict(degree)
+    model = LeastSquaresModel.fit(stats)
     
     info = {
         "type": f"Polynomial Regression (degree={degree})",
         "degree": degree,
-        "n_features": X_train_poly.shape[1],
-        "train_mse": float(train_mse),
-        "train_mae": float(train_mae),
-        "r2_score": float(model.score(X_train_poly, y_train))
+        "n_features": len(model.terms),
+        "coefficients": model.coef_.tolist(),
+        "intercept": model.intercept_
     }
+    info.update(_train_info(model, stats, X_train, y_train))
     
-    return model, poly, info
+    return model, info
 
-def evaluate_model(model: LinearRegression, X_test: np.ndarray, y_test: np.ndarray,
-                  poly_transformer: PolynomialFeatures = None) -> Dict[str, float]:
+def evaluate_model(model: LeastSquaresModel, X_test: np.ndarray, y_test: np.ndarray) -> Dict[str, Any]:
     """
     Evaluate regression model on test data
-    Returns: dictionary with evaluation metrics
+    Returns: dictionary with evaluation metrics, plus the predictions and actual values as arrays
     """
-    if poly_transformer is not None:
-        X_test_transformed = poly_transformer.transform(X_test)
-    else:
-        X_test_transformed = X_test
+    y_test = np.asarray(y_test, dtype=float)
+    y_pred = model.predict(X_test)
+    residuals = y_test - y_pred
     
-    y_pred = model.predict(X_test_transformed)
-    
-    mse = mean_squared_error(y_test, y_pred)
-    mae = mean_absolute_error(y_test, y_pred)
+    mse = np.mean(residuals ** 2)
+    mae = np.mean(np.abs(residuals))
     rmse = np.sqrt(mse)
     
     # Calculate R² score
-    ss_res = np.sum((y_test - y_pred) ** 2)
+    ss_res = np.sum(residuals ** 2)
     ss_tot = np.sum((y_test - np.mean(y_test)) ** 2)
     r2 = 1 - (ss_res / ss_tot) if ss_tot != 0 else 0
     
@@ -103,33 +283,212 @@ def evaluate_model(model: LinearRegression, X_test: np.ndarray, y_test: np.ndarr
         "mae": float(mae),
         "rmse": float(rmse),
         "r2_score": float(r2),
-        "predictions": y_pred.tolist(),
-        "actual": y_test.tolist()
+        "predictions": y_pred,
+        "actual": y_test
+    }
+
+def save_predictions(predictions: Dict[str, np.ndarray], path: str,
+                     sample_size: int = PREDICTION_SAMPLE_SIZE, random_seed: int = 42) -> Dict[str, Any]:
+    """
+    Write the test-set predictions to a binary .npz sidecar
+    Returns: JSON-safe reference to the file with a small random sample for plotting
+    """
+    np.savez(path, **predictions)
+    n_rows = len(predictions["actual"])
+    sample = np.arange(n_rows)
+    if n_rows > sample_size:
+        sample = np.sort(np.random.default_rng(random_seed).choice(n_rows, sample_size, replace=False))
+    return {
+        "file": os.path.basename(str(path)),
+        "n_rows": int(n_rows),
+        "arrays": list(predictions),
+        "sample": {name: values[sample].tolist() for name, values in predictions.items()}
+    }
+
+def load_predictions(path: str) -> Dict[str, np.ndarray]:
+    """Read a predictions sidecar written by save_predictions"""
+    with np.load(path) as sidecar:
+        return {name: sidecar[name] for name in sidecar.files}
+
+_shared_data = None
+_shared_block = None
+
+def _attach_shared_data(name: str, shape: Tuple[int, ...], dtype: str):
+    """Pool initializer: map the parent's shared-memory block instead of unpickling data"""
+    global _shared_data, _shared_block
+    _shared_block = shared_memory.SharedMemory(name=name)
+    _shared_data = np.ndarray(shape, dtype=dtype, buffer=_shared_block.buf)
+
+def _fold_statistics(data: np.ndarray, start: int, stop: int, degree: int,
+                     chunk_size: int) -> GramStatistics:
+    """Gram statistics of one fold ([X | y] rows start:stop)"""
+    rows = data[start:stop]
+    return GramStatistics(data.shape[1] - 1, degree).update(rows[:, :-1], rows[:, -1], chunk_size)
+
+def _evaluate_fold(data: np.ndarray, start: int, stop: int, fold_stats: GramStatistics,
+                   total: GramStatistics, configs: List[Tuple[int, float]],
+                   chunk_size: int) -> List[Dict[str, float]]:
+    """
+    Fit every (degree, alpha) config on the other folds and score it on this one
+    Training statistics are the total minus this fold's (downdating, no refit
+    pass); the fold's rows are expanded once at the highest degree and each
+    config predicts from the leading columns of that expansion
+    """
+    train_stats = total - fold_stats
+    models = []
+    results = []
+    for degree, alpha in configs:
+        started = time.perf_counter()
+        stats = train_stats.restrict(degree)
+        coef, intercept = stats.solve(alpha)
+        models.append((len(stats.terms), coef, intercept))
+        results.append({
+            "train_mse": stats.residual_sum_of_squares(coef, intercept) / stats.n,
+            "sse": 0.0, "sae": 0.0, "time": time.perf_counter() - started
+        })
+    
+    for block_start in range(start, stop, chunk_size):
+        block = data[block_start:min(block_start + chunk_size, stop)]
+        Z = expand_terms(block[:, :-1], total.terms)
+        y_block = block[:, -1]
+        for (n_terms, coef, intercept), result in zip(models, results):
+            started = time.perf_counter()
+            residuals = y_block - (Z[:, :n_terms] @ coef + intercept)
+            result["sse"] += float(residuals @ residuals)
+            result["sae"] += float(np.abs(residuals).sum())
+            result["time"] += time.perf_counter() - started
+    
+    _, _, syy = fold_stats.centered()
+    n = fold_stats.n
+    return [{
+        "mse": result["sse"] / n,
+        "mae": result["sae"] / n,
+        "rmse": float(np.sqrt(result["sse"] / n)),
+        "r2_score": 1.0 - result["sse"] / syy if syy > 0 else 0.0,
+        "train_mse": result["train_mse"],
+        "time": result["time"]
+    } for result in results]
+
+def _fold_statistics_job(start: int, stop: int, degree: int, chunk_size: int) -> GramStatistics:
+    return _fold_statistics(_shared_data, start, stop, degree, chunk_size)
+
+def _evaluate_fold_job(start: int, stop: int, fold_stats: GramStatistics, total: GramStatistics,
+                       configs: List[Tuple[int, float]], chunk_size: int) -> List[Dict[str, float]]:
+    return _evaluate_fold(_shared_data, start, stop, fold_stats, total, configs, chunk_size)
+
+def cross_validate_models(X: np.ndarray, y: np.ndarray, n_folds: int = 5, max_degree: int = 3,
+                          alphas: Sequence[float] = (0.0,), random_seed: int = 42,
+                          n_jobs: Optional[int] = 1, chunk_size: int = GRAM_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    k-fold cross-validation over polynomial degrees 1..max_degree x ridge alphas
+    Rows are shuffled once into contiguous folds. Each fold's Gram statistics
+    are accumulated once at max_degree; every config's training statistics
+    are then the total minus the held-out fold, restricted to its degree.
+    With n_jobs > 1 (or None / -1 for all cores) folds run in worker
+    processes that read the data from shared memory
+    Returns: per-config table (mean/std of validation metrics, wall time) and the best config
+    """
+    X = np.asarray(X)
+    n_samples = len(X)
+    if n_folds < 2 or n_folds > n_samples:
+        raise ValueError(f"n_folds must be between 2 and the number of samples ({n_samples})")
+    
+    order = np.random.default_rng(random_seed).permutation(n_samples)
+    data = np.empty((n_samples, X.shape[1] + 1))
+    data[:, :-1] = X[order]
+    data[:, -1] = np.asarray(y)[order]
+    bounds = np.linspace(0, n_samples, n_folds + 1).astype(int)
+    folds = list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+    configs = [(degree, float(alpha)) for degree in range(1, max_degree + 1) for alpha in alphas]
+    
+    if n_jobs is None or n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = min(n_jobs, n_folds)
+    
+    started = time.perf_counter()
+    if n_jobs <= 1:
+        fold_stats = [_fold_statistics(data, start, stop, max_degree, chunk_size) for start, stop in folds]
+        total = sum(fold_stats[1:], fold_stats[0])
+        fold_results = [_evaluate_fold(data, start, stop, stats, total, configs, chunk_size)
+                        for (start, stop), stats in zip(folds, fold_stats)]
+    else:
+        block = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+        try:
+            np.ndarray(data.shape, dtype=data.dtype, buffer=block.buf)[...] = data
+            del data
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_attach_shared_data,
+                                     initargs=(block.name, (n_samples, X.shape[1] + 1), '<f8')) as pool:
+                fold_stats = list(pool.map(_fold_statistics_job, *zip(*[
+                    (start, stop, max_degree, chunk_size) for start, stop in folds])))
+                total = sum(fold_stats[1:], fold_stats[0])
+                fold_results = list(pool.map(_evaluate_fold_job, *zip(*[
+                    (start, stop, stats, total, configs, chunk_size)
+                    for (start, stop), stats in zip(folds, fold_stats)])))
+        finally:
+            block.close()
+            block.unlink()
+    wall_time = time.perf_counter() - started
+    
+    table = []
+    for c, (degree, alpha) in enumerate(configs):
+        per_fold = [results[c] for results in fold_results]
+        row = {"degree": degree, "alpha": alpha, "n_features": len(polynomial_terms(X.shape[1], degree))}
+        for metric in ("mse", "mae", "rmse", "r2_score", "train_mse"):
+            values = np.array([fold[metric] for fold in per_fold])
+            row[f"{metric}_mean"] = float(values.mean())
+            row[f"{metric}_std"] = float(values.std(ddof=1))
+        row["wall_time"] = float(sum(fold["time"] for fold in per_fold))
+        table.append(row)
+    
+    best = min(table, key=lambda row: row["mse_mean"])
+    return {
+        "n_folds": n_folds,
+        "n_samples": n_samples,
+        "configs": table,
+        "best": {"degree": best["degree"], "alpha": best["alpha"], "mse_mean": best["mse_mean"]},
+        "wall_time": wall_time
     }
 
 def compare_models(df: pd.DataFrame, test_size: float = 0.3, 
-                  polynomial_degree: int = 2, random_seed: int = 42) -> Dict[str, Any]:
+                  polynomial_degree: int = 2, random_seed: int = 42,
+                  **cv_options) -> Dict[str, Any]:
     """
     Compare Linear and Polynomial Regression models
+    cv_options (cv_folds, cv_max_degree, cv_alphas, n_jobs) enable cross-validation
     Returns: comprehensive comparison results
     """
     # Prepare data
     X, y, feature_names = prepare_regression_data(df)
-    
+    return compare_models_arrays(X, y, test_size, polynomial_degree, random_seed, **cv_options)
+
+def compare_models_arrays(X: np.ndarray, y: np.ndarray, test_size: float = 0.3,
+                          polynomial_degree: int = 2, random_seed: int = 42,
+                          cv_folds: Optional[int] = None, cv_max_degree: Optional[int] = None,
+                          cv_alphas: Sequence[float] = (0.0,), n_jobs: Optional[int] = 1) -> Dict[str, Any]:
+    """
+    compare_models on a prepared feature matrix and target, e.g. the
+    memory-mapped regression_features / target of a preprocessing snapshot.
+    cv_folds adds a "cross_validation" table from cross_validate_models over
+    degrees 1..cv_max_degree (default polynomial_degree) x cv_alphas
+    Returns: comprehensive comparison results
+    """
     # Split data
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=test_size, random_state=random_seed
     )
     
+    # One pass over the training rows; the linear fit reuses the leading block
+    stats = GramStatistics(X_train.shape[1], max(polynomial_degree, 1)).update(X_train, y_train)
+    
     # Train Linear Regression
-    linear_model, linear_info = train_linear_regression(X_train, y_train)
+    linear_model, linear_info = train_linear_regression(X_train, y_train, stats)
     linear_results = evaluate_model(linear_model, X_test, y_test)
     
     # Train Polynomial Regression
-    poly_model, poly_transformer, poly_info = train_polynomial_regression(
-        X_train, y_train, degree=polynomial_degree
+    poly_model, poly_info = train_polynomial_regression(
+        X_train, y_train, degree=polynomial_degree, stats=stats
     )
-    poly_results = evaluate_model(poly_model, X_test, y_test, poly_transformer)
+    poly_results = evaluate_model(poly_model, X_test, y_test)
     
     # Determine best model
     if linear_results["mse"] < poly_results["mse"]:
@@ -175,18 +534,19 @@ def compare_models(df: pd.DataFrame, test_size: float = 0.3,
             "mse_difference": abs(linear_results["mse"] - poly_results["mse"]),
             "mae_difference": abs(linear_results["mae"] - poly_results["mae"])
         },
+        # Arrays (the shared test target once); written to a sidecar, not into JSON
         "predictions": {
-            "linear": {
-                "actual": linear_results["actual"],
-                "predicted": linear_results["predictions"]
-            },
-            "polynomial": {
-                "actual": poly_results["actual"],
-                "predicted": poly_results["predictions"]
-            }
+            "actual": linear_results["actual"],
+            "linear": linear_results["predictions"],
+            "polynomial": poly_results["predictions"]
         }
     }
     
+    if cv_folds is not None:
+        comparison["cross_validation"] = cross_validate_models(
+            X, y, n_folds=cv_folds, max_degree=cv_max_degree or polynomial_degree,
+            alphas=cv_alphas, random_seed=random_seed, n_jobs=n_jobs)
+    
     return comparison
 
 if __name__ == "__main__":
@@ -198,5 +558,5 @@ if __name__ == "__main__":
     # Run regression comparison
     results = compare_models(df, polynomial_degree=2)
     
-    print(json.dumps(results, indent=2))
+    print(json.dumps({key: value for key, value in results.items() if key != "predictions"}, indent=2))
 
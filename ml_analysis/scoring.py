@@ -0,0 +1,168 @@
+"""
+Batch Scoring
+Assigns new products to the fitted clusters and predicts their profit from saved model artifacts
+"""
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional, Union
+
+from kmeans import assign_clusters, DEFAULT_CHUNK_SIZE
+from regression import LeastSquaresModel, polynomial_terms
+from preprocessing import STREAM_CHUNK_SIZE, iter_csv_chunks
+from transformer import PreprocessingTransformer
+
+MODEL_ARTIFACTS_VERSION = 1
+MODEL_ARTIFACTS_FILE = "model_artifacts.json"
+TRANSFORMER_FILE = "preprocessing_transformer.json"
+
+def save_model_artifacts(path: str, clustering_results: Dict[str, Any], centroids: np.ndarray,
+                         regression_results: Dict[str, Any], clustering_features: List[str],
+                         regression_features: List[str]) -> Dict[str, Any]:
+    """
+    Write the fitted K-means centroids and regression coefficients as JSON
+    Returns: the artifacts as written
+    """
+    models = {}
+    for name, key in (("linear", "linear_regression"), ("polynomial", "polynomial_regression")):
+        info = regression_results[key]["model_info"]
+        models[name] = {
+            "degree": info.get("degree", 1),
+            "coefficients": info["coefficients"],
+            "intercept": info["intercept"]
+        }
+    best_model = regression_results["comparison"]["best_model"]
+
+    artifacts = {
+        "version": MODEL_ARTIFACTS_VERSION,
+        "clustering": {
+            "features": clustering_features,
+            "centroids": np.asarray(centroids).tolist(),
+            "cluster_names": clustering_results["cluster_names"]
+        },
+        "regression": {
+            "features": regression_features,
+            "target": "profit",
+            "best_model": "polynomial" if "Polynomial" in best_model else "linear",
+            "models": models
+        }
+    }
+    with open(path, "w") as f:
+        json.dump(artifacts, f)
+    return artifacts
+
+class ModelScorer:
+    """
+    Fitted preprocessing, centroids and regression models, loaded once
+    Raw batches are transformed with the fitted transformer, assigned to the
+    nearest centroid and scored by the best regression model, all on whole
+    chunks at a time
+    """
+    def __init__(self, transformer: PreprocessingTransformer, artifacts: Dict[str, Any]):
+        self.transformer = transformer
+        clustering = artifacts["clustering"]
+        self.clustering_features = clustering["features"]
+        self.centroids = np.asarray(clustering["centroids"], dtype=float)
+        self.cluster_names = [clustering["cluster_names"].get(f"cluster_{i}", f"Cluster {i}")
+                              for i in range(len(self.centroids))]
+        self._name_lookup = np.array(self.cluster_names, dtype=object)
+
+        regression = artifacts["regression"]
+        self.regression_features = regression["features"]
+        n_features = len(self.regression_features)
+        self.models = {
+            name: LeastSquaresModel(polynomial_terms(n_features, model["degree"]),
+                                    model["coefficients"], model["intercept"])
+            for name, model in regression["models"].items()
+        }
+        self.best_model = regression["best_model"]
+
+    @classmethod
+    def load(cls, results_dir: str = "ml_results") -> 'ModelScorer':
+        """Load the artifacts written by run_complete_analysis"""
+        with open(os.path.join(results_dir, MODEL_ARTIFACTS_FILE)) as f:
+            artifacts = json.load(f)
+        if artifacts.get("version") != MODEL_ARTIFACTS_VERSION:
+            raise ValueError(f"Unsupported model artifacts version: {artifacts.get('version')}")
+        return cls(PreprocessingTransformer.load(os.path.join(results_dir, TRANSFORMER_FILE)), artifacts)
+
+    def score_frame(self, df: pd.DataFrame, model: Optional[str] = None,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> pd.DataFrame:
+        """
+        Score a raw batch (profit may be absent)
+        Returns: dataframe of product_id (if present), cluster, cluster_name and predicted_profit
+        """
+        # product_name plays no part in scoring; skip its (string) missing-value pass
+        transformed = self.transformer.transform(df.drop(columns=['product_name'], errors='ignore'))
+        X_cluster = transformed[self.clustering_features].to_numpy(dtype=float)
+        X_regression = transformed[self.regression_features].to_numpy(dtype=float)
+
+        clusters = assign_clusters(X_cluster, self.centroids, chunk_size=chunk_size)
+        scores = pd.DataFrame(index=df.index)
+        if 'product_id' in df.columns:
+            scores['product_id'] = df['product_id']
+        scores['cluster'] = clusters
+        scores['cluster_name'] = self._name_lookup[clusters]
+        scores['predicted_profit'] = self.models[model or self.best_model].predict(X_regression, chunk_size)
+        return scores
+
+    def score(self, source: Union[str, pd.DataFrame], output_path: Optional[str] = None,
+              model: Optional[str] = None, chunksize: int = STREAM_CHUNK_SIZE) -> Dict[str, Any]:
+        """
+        Score a CSV (streamed in chunks) or a dataframe
+        With output_path the scores are appended to that CSV chunk by chunk;
+        otherwise they are returned under "scores"
+        Returns: scores or output path, plus row count, cluster counts and throughput
+        """
+        started = time.perf_counter()
+        if isinstance(source, pd.DataFrame):
+            chunks = (source.iloc[start:start + chunksize] for start in range(0, len(source), chunksize))
+        else:
+            chunks = iter_csv_chunks(source, chunksize, drop_product_name=True)
+
+        n_rows = 0
+        cluster_counts = np.zeros(len(self.centroids), dtype=np.int64)
+        profit_sum = 0.0
+        scored = []
+        for i, chunk in enumerate(chunks):
+            scores = self.score_frame(chunk, model)
+            n_rows += len(scores)
+            cluster_counts += np.bincount(scores['cluster'].to_numpy(), minlength=len(self.centroids))
+            profit_sum += float(scores['predicted_profit'].sum())
+            if output_path is not None:
+                scores.to_csv(output_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+            else:
+                scored.append(scores)
+        seconds = time.perf_counter() - started
+
+        summary = {
+            "n_rows": n_rows,
+            "model": model or self.best_model,
+            "cluster_counts": {f"cluster_{i}": int(count) for i, count in enumerate(cluster_counts)},
+            "mean_predicted_profit": profit_sum / n_rows if n_rows else None,
+            "seconds": seconds,
+            "rows_per_second": n_rows / seconds if seconds > 0 else None
+        }
+        if output_path is not None:
+            summary["output"] = output_path
+        else:
+            summary["scores"] = pd.concat(scored) if scored else pd.DataFrame()
+        return summary
+
+def score(source: Union[str, pd.DataFrame], results_dir: str = "ml_results",
+          output_path: Optional[str] = None, **score_options) -> Dict[str, Any]:
+    """Load the saved models from results_dir and score a batch (see ModelScorer.score)"""
+    return ModelScorer.load(results_dir).score(source, output_path, **score_options)
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2:
+        print("Usage: python scoring.py <new_products.csv> [results_dir] [output.csv]")
+        sys.exit(1)
+    csv_path = sys.argv[1]
+    results_dir = sys.argv[2] if len(sys.argv) > 2 else "ml_results"
+    output_path = sys.argv[3] if len(sys.argv) > 3 else "scores.csv"
+    summary = score(csv_path, results_dir, output_path)
+    print(json.dumps(summary, indent=2))
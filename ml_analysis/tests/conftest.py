@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The analysis modules import each other by bare name (from kmeans import ...)
+ANALYSIS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ANALYSIS_DIR not in sys.path:
+    sys.path.insert(0, ANALYSIS_DIR)
@@ -0,0 +1,11 @@
+from instrumentation import PerformanceRecorder
+
+def test_nested_stage_does_not_reset_the_outer_peak():
+    outer, inner = PerformanceRecorder(), PerformanceRecorder()
+    with outer.stage("outer"):
+        with inner.stage("inner"):
+            pass
+    # The inner stage ran while another stage was measuring, so it must not reset the mark
+    assert inner.stages["inner"]["peak_rss_scope"] == "process"
+    assert inner.summary()["peak_rss_scope"] == "process"
+    assert outer.stages["outer"]["peak_rss_scope"] in ("stage", "process")
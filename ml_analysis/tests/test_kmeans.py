@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import generate_product_sales
+from kmeans import elbow_method, kmeans, minibatch_kmeans
+
+@pytest.fixture(scope="module")
+def sales_features():
+    df = generate_product_sales(100000)
+    return df[['price', 'units_sold']].dropna().to_numpy(dtype=float)
+
+@pytest.mark.parametrize("k", [2, 5, 8])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_accelerated_algorithms_match_lloyd(k, seed):
+    rng = np.random.default_rng(7)
+    data = np.concatenate([rng.normal(center, 1.0, size=(300, 3)) for center in range(0, 40, 5)])
+    labels, centroids, _ = kmeans(data, k, random_seed=seed, algorithm='lloyd')
+    for algorithm in ('hamerly', 'elkan'):
+        fast_labels, fast_centroids, _ = kmeans(data, k, random_seed=seed, algorithm=algorithm)
+        np.testing.assert_array_equal(fast_labels, labels)
+        np.testing.assert_allclose(fast_centroids, centroids, rtol=1e-12, atol=1e-12)
+
+def test_minibatch_wcss_close_to_full_kmeans(sales_features):
+    # Median over seeds: single seeds can settle in a different local minimum
+    ratios = []
+    for seed in range(5):
+        _, _, full = kmeans(sales_features, 4, random_seed=seed)
+        _, _, minibatch = minibatch_kmeans(sales_features, 4, batch_size=1024, random_seed=seed)
+        assert minibatch["n_batches"] > minibatch["warmup_batches"]
+        ratios.append(minibatch["wcss"] / full["wcss"])
+    assert np.median(ratios) <= 1.05
+
+def test_minibatch_csv_skips_rows_with_missing_features(tmp_path):
+    path = tmp_path / "sales.csv"
+    generate_product_sales(5000).to_csv(path, index=False)
+    assignments, centroids, info = minibatch_kmeans(str(path), 3, batch_size=512, max_iterations=3,
+                                                    random_seed=0,
+                                                    feature_cols=['price', 'units_sold'])
+    assert np.isfinite(centroids).all()
+    assert np.isfinite(info["wcss"])
+    assert info["rows_with_missing"] > 0
+    assert (assignments == -1).sum() == info["rows_with_missing"]
+
+def test_minibatch_array_skips_rows_with_missing_features():
+    rng = np.random.default_rng(0)
+    data = rng.normal(size=(5000, 2)) + rng.integers(0, 3, 5000)[:, np.newaxis] * 5
+    data[rng.random(data.shape) < 0.05] = np.nan
+    for seed in (17, 24, 42, 53):
+        assignments, centroids, info = minibatch_kmeans(data, 3, batch_size=256, random_seed=seed)
+        assert np.isfinite(centroids).all()
+        assert np.isfinite(info["wcss"])
+        assert (assignments == -1).sum() == np.isnan(data).any(axis=1).sum()
+
+@pytest.mark.parametrize("options", [{"n_restarts": 3}, {"n_jobs": 2}, {"n_jobs": None}])
+def test_warm_start_elbow_rejects_restarts_and_jobs(options):
+    data = np.random.default_rng(0).normal(size=(100, 2))
+    with pytest.raises(ValueError):
+        elbow_method(data, [2, 3], random_seed=42, warm_start='split', **options)
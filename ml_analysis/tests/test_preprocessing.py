@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import write_product_sales_csv
+from preprocessing import NUMERICAL_COLUMNS, load_data_streaming, preprocess_data
+
+@pytest.fixture(scope="module")
+def synthetic_csv(tmp_path_factory):
+    return write_product_sales_csv(tmp_path_factory.mktemp("data") / "product_sales.csv", 20000)
+
+def test_streaming_caps_every_outlier(synthetic_csv):
+    _, report = preprocess_data(synthetic_csv, streaming=True)
+    treatment = report["outliers"]["treatment"]
+    assert treatment
+    for col, info in treatment.items():
+        assert info["outliers_before"] > 0, col
+        assert info["outliers_after"] == 0, col
+
+def test_streaming_load_does_not_depend_on_chunk_size(synthetic_csv):
+    whole, whole_stats = load_data_streaming(synthetic_csv, chunksize=100000)
+    chunked, chunked_stats = load_data_streaming(synthetic_csv, chunksize=997)
+    pd.testing.assert_frame_equal(chunked, whole)
+    assert chunked_stats.missing_analysis() == whole_stats.missing_analysis()
+
+@pytest.mark.parametrize("normalize_method", ["minmax", "zscore"])
+@pytest.mark.parametrize("options", [{"engine": "fused"}, {"engine": "fused", "streaming": True}])
+def test_engines_match_pandas_path(synthetic_csv, normalize_method, options):
+    expected_df, expected = preprocess_data(synthetic_csv, normalize_method, engine="pandas")
+    df, report = preprocess_data(synthetic_csv, normalize_method, **options)
+    
+    assert report["missing_values"]["fill_values"].keys() == expected["missing_values"]["fill_values"].keys()
+    for col, value in expected["missing_values"]["fill_values"].items():
+        if isinstance(value, str):
+            assert report["missing_values"]["fill_values"][col] == value
+        else:
+            assert report["missing_values"]["fill_values"][col] == pytest.approx(value, rel=1e-6)
+    
+    params = report["normalization"]["scaling_parameters"]
+    expected_params = expected["normalization"]["scaling_parameters"]
+    assert params.keys() == expected_params.keys()
+    for col, values in expected_params.items():
+        assert params[col] == pytest.approx(values, rel=1e-6)
+    
+    for col in NUMERICAL_COLUMNS:
+        np.testing.assert_allclose(df[col].to_numpy(dtype=float), expected_df[col].to_numpy(dtype=float),
+                                   rtol=1e-6, atol=1e-6, err_msg=col)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from regression import (GRAM_CHUNK_SIZE, _fold_statistics, cross_validate_models, expand_terms,
+                        polynomial_terms)
+
+N_FOLDS = 5
+MAX_DEGREE = 2
+SEED = 42
+
+@pytest.fixture(scope="module")
+def regression_data():
+    rng = np.random.default_rng(3)
+    X = rng.uniform(0, 1, size=(400, 3))
+    y = 2.0 + X @ [3.0, -1.0, 0.5] + 4.0 * X[:, 0] * X[:, 1] + rng.normal(0, 0.1, 400)
+    return X, y
+
+def _shuffled_folds(X, y):
+    """The same shuffle and contiguous folds as cross_validate_models"""
+    order = np.random.default_rng(SEED).permutation(len(X))
+    data = np.column_stack([X[order], y[order]])
+    bounds = np.linspace(0, len(X), N_FOLDS + 1).astype(int)
+    return data, list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+def _lstsq_fold(data, start, stop, degree):
+    """Direct fit on the training rows of one fold, scored on its held-out rows"""
+    train = np.concatenate([data[:start], data[stop:]])
+    test = data[start:stop]
+    terms = polynomial_terms(data.shape[1] - 1, degree)
+    Z_train = np.column_stack([np.ones(len(train)), expand_terms(train[:, :-1], terms)])
+    solution = np.linalg.lstsq(Z_train, train[:, -1], rcond=None)[0]
+    residuals = test[:, -1] - np.column_stack([np.ones(len(test)), expand_terms(test[:, :-1], terms)]) @ solution
+    return solution, float(residuals @ residuals / len(test))
+
+def test_downdated_fold_solutions_match_direct_fits(regression_data):
+    data, folds = _shuffled_folds(*regression_data)
+    fold_stats = [_fold_statistics(data, start, stop, MAX_DEGREE, GRAM_CHUNK_SIZE) for start, stop in folds]
+    total = sum(fold_stats[1:], fold_stats[0])
+    for (start, stop), stats in zip(folds, fold_stats):
+        for degree in range(1, MAX_DEGREE + 1):
+            coef, intercept = (total - stats).restrict(degree).solve(0.0)
+            solution, _ = _lstsq_fold(data, start, stop, degree)
+            np.testing.assert_allclose(intercept, solution[0], rtol=1e-8, atol=1e-8)
+            np.testing.assert_allclose(coef, solution[1:], rtol=1e-8, atol=1e-8)
+
+def test_cross_validation_metrics_match_direct_fits(regression_data):
+    data, folds = _shuffled_folds(*regression_data)
+    results = cross_validate_models(*regression_data, n_folds=N_FOLDS, max_degree=MAX_DEGREE,
+                                    random_seed=SEED)
+    for row in results["configs"]:
+        mse = [_lstsq_fold(data, start, stop, row["degree"])[1] for start, stop in folds]
+        assert row["mse_mean"] == pytest.approx(np.mean(mse), rel=1e-8)
+        assert row["mse_std"] == pytest.approx(np.std(mse, ddof=1), rel=1e-6)
+
+def test_parallel_cross_validation_matches_serial(regression_data):
+    options = dict(n_folds=N_FOLDS, max_degree=MAX_DEGREE, alphas=(0.0, 0.1), random_seed=SEED)
+    serial = cross_validate_models(*regression_data, n_jobs=1, **options)
+    parallel = cross_validate_models(*regression_data, n_jobs=2, **options)
+    assert parallel["best"] == serial["best"]
+    for serial_row, parallel_row in zip(serial["configs"], parallel["configs"]):
+        for key, value in serial_row.items():
+            if key != "wall_time":
+                assert parallel_row[key] == pytest.approx(value, rel=1e-12), key
@@ -0,0 +1,137 @@
+"""
+Fitted Preprocessing Transformer
+Re-applies the fill values, IQR clip bounds and scaling of a preprocessing run to new data
+"""
+import json
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Iterator, Optional
+
+from preprocessing import NUMERICAL_COLUMNS, FUSED_CHUNK_SIZE, STREAM_CHUNK_SIZE, iter_csv_chunks
+from instrumentation import count
+
+class PreprocessingTransformer:
+    """
+    Transform-only counterpart of preprocess_data
+    Built from a preprocessing report, it holds per-column fill values, clip
+    bounds and an (offset, scale) pair, and applies them to a batch of any size
+    in fixed-size blocks of one float matrix: fill NaNs, clip, then
+    (x - offset) / scale. Applied to the data it was fitted on it reproduces
+    the preprocessed values. New rows are clipped to the fitted IQR bounds,
+    which can lie outside the observed (clipped) min / max the min-max scaling
+    uses, so new values may scale slightly outside [0, 1]
+    """
+    def __init__(self, fill_values: Dict[str, Any], clip_bounds: Dict[str, list],
+                 scaling_params: Dict[str, Dict[str, float]], normalize_method: str = 'minmax'):
+        self.fill_values = dict(fill_values)
+        self.clip_bounds = {col: [float(low), float(high)] for col, (low, high) in clip_bounds.items()}
+        self.scaling_params = scaling_params
+        self.normalize_method = normalize_method
+
+        self.fill = np.array([self.fill_values[col] for col in NUMERICAL_COLUMNS], dtype=float)
+        self.lower = np.array([self.clip_bounds.get(col, [-np.inf, np.inf])[0] for col in NUMERICAL_COLUMNS])
+        self.upper = np.array([self.clip_bounds.get(col, [-np.inf, np.inf])[1] for col in NUMERICAL_COLUMNS])
+        self.offset = np.zeros(len(NUMERICAL_COLUMNS))
+        self.scale = np.ones(len(NUMERICAL_COLUMNS))
+        for j, col in enumerate(NUMERICAL_COLUMNS):
+            params = scaling_params.get(col)
+            if params is None:
+                continue
+            if params["method"] == 'minmax':
+                self.offset[j], self.scale[j] = params["min"], params["max"] - params["min"]
+            else:
+                self.offset[j], self.scale[j] = params["mean"], params["std"]
+
+    @classmethod
+    def from_report(cls, report: Dict[str, Any]) -> 'PreprocessingTransformer':
+        """Fit from a preprocessing report (as returned by preprocess_data)"""
+        fill_values = report["missing_values"].get("fill_values")
+        if fill_values is None:
+            raise ValueError("Report has no fill values; re-run preprocess_data to regenerate it")
+        clip_bounds = {col: [analysis["iqr"]["lower_bound"], analysis["iqr"]["upper_bound"]]
+                       for col, analysis in report["outliers"]["analysis"].items()}
+        normalization = report["normalization"]
+        return cls(fill_values, clip_bounds, normalization["scaling_parameters"], normalization["method"])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "normalize_method": self.normalize_method,
+            "fill_values": self.fill_values,
+            "clip_bounds": self.clip_bounds,
+            "scaling_params": self.scaling_params
+        }
+
+    @classmethod
+    def from_dict(cls, params: Dict[str, Any]) -> 'PreprocessingTransformer':
+        return cls(params["fill_values"], params["clip_bounds"], params["scaling_params"],
+                   params["normalize_method"])
+
+    def save(self, path: str):
+        """Write the fitted parameters as JSON"""
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> 'PreprocessingTransformer':
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def transform_array(self, X: np.ndarray, chunk_size: int = FUSED_CHUNK_SIZE,
+                        out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Transform a matrix whose columns are NUMERICAL_COLUMNS (NaN = missing)
+        Returns: transformed matrix (out, if given; it may be X itself)
+        """
+        X = np.asarray(X)
+        if out is None:
+            out = np.empty(X.shape, dtype=np.result_type(X.dtype, np.float32))
+        for start in range(0, len(X), chunk_size):
+            block = out[start:start + chunk_size]
+            block[...] = X[start:start + chunk_size]
+            missing = np.isnan(block)
+            if missing.any():
+                block[missing] = np.broadcast_to(self.fill, block.shape)[missing]
+            np.clip(block, self.lower, self.upper, out=block)
+            block -= self.offset
+            block /= self.scale
+        return out
+
+    def transform(self, df: pd.DataFrame, chunk_size: int = FUSED_CHUNK_SIZE) -> pd.DataFrame:
+        """
+        Transform a raw batch with the product_sales.csv columns
+        Returns: preprocessed dataframe (the input is not modified)
+        """
+        df = df.copy()
+        count('dataframe_copies')
+        for col in ('product_name', 'category'):
+            if col in df.columns and df[col].isnull().any():
+                fill = self.fill_values[col]
+                if isinstance(df[col].dtype, pd.CategoricalDtype) and fill not in df[col].cat.categories:
+                    df[col] = df[col].cat.add_categories([fill])
+                df[col] = df[col].fillna(fill)
+
+        single_precision = all(df[col].dtype == np.float32 for col in NUMERICAL_COLUMNS if col in df.columns)
+        matrix = np.empty((len(df), len(NUMERICAL_COLUMNS)),
+                          dtype=np.float32 if single_precision else np.float64)
+        # A column the batch lacks (e.g. profit of unsold products) is all missing
+        for j, col in enumerate(NUMERICAL_COLUMNS):
+            matrix[:, j] = df[col].to_numpy(dtype=matrix.dtype, na_value=np.nan) if col in df.columns else np.nan
+        self.transform_array(matrix, chunk_size, out=matrix)
+        for j, col in enumerate(NUMERICAL_COLUMNS):
+            if col in df.columns:
+                df[col] = matrix[:, j]
+        return df
+
+    def transform_csv(self, file_path: str, chunksize: int = STREAM_CHUNK_SIZE,
+                      **chunk_options) -> Iterator[pd.DataFrame]:
+        """Stream a CSV (e.g. a nightly increment) and yield transformed chunks"""
+        for chunk in iter_csv_chunks(file_path, chunksize, **chunk_options):
+            yield self.transform(chunk)
+
+if __name__ == "__main__":
+    import sys
+    from preprocessing import preprocess_data
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else "product_sales.csv"
+    _, report = preprocess_data(csv_path)
+    transformer = PreprocessingTransformer.from_report(report)
+    print(json.dumps(transformer.to_dict(), indent=2))
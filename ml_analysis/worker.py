@@ -0,0 +1,203 @@
+"""
+Analysis Worker
+Long-running local HTTP service that runs analyses on a warm interpreter
+
+Endpoints (JSON):
+- GET  /health        -> {"status": "ok", "jobs": {...counts by status}}
+- POST /jobs          -> submit {"csv_path", "output_dir", "image_output_dir",
+                         "optimal_k", "use_silhouette", "make_plots"}; returns the job status
+- GET  /jobs/<job_id> -> job status: queued | running | done | failed
+"""
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from cache import MemoryCache, ResultCache, file_sha256, make_cache_key
+from main_analysis import run_complete_analysis, get_pyplot
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Finished jobs kept for status queries and for answering repeated requests
+MAX_FINISHED_JOBS = 64
+
+class AnalysisWorker:
+    """
+    Runs analysis jobs one at a time on a single background thread
+    A job is identified by the CSV content hash plus its options, so a request
+    identical to one that is queued or running joins it instead of starting a
+    second run, and one identical to a finished job returns that job while its
+    output files are still the latest in their directory. Stage results stay
+    loaded in a MemoryCache per output directory between jobs. Figures render
+    and the elbow sweep runs in-process (figure_jobs=1, elbow_jobs=1): forking
+    worker processes from this threaded server could copy a lock held by
+    another thread and deadlock
+    """
+    def __init__(self, max_cached_entries: int = 16, figure_jobs: int = 1):
+        self.max_cached_entries = max_cached_entries
+        self.figure_jobs = figure_jobs
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.caches: Dict[str, MemoryCache] = {}
+        # Job whose results are currently in each output directory
+        self.latest_outputs: Dict[str, str] = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def _options(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        if "csv_path" not in request:
+            raise ValueError("csv_path is required")
+        return {
+            "csv_path": os.path.abspath(request["csv_path"]),
+            "output_dir": os.path.abspath(request.get("output_dir", "ml_results")),
+            "image_output_dir": os.path.abspath(request.get("image_output_dir", "public/ml_results")),
+            "optimal_k": request.get("optimal_k"),
+            "use_silhouette": bool(request.get("use_silhouette", False)),
+            "make_plots": bool(request.get("make_plots", True))
+        }
+
+    def _cache_for(self, output_dir: str) -> MemoryCache:
+        if output_dir not in self.caches:
+            self.caches[output_dir] = MemoryCache(ResultCache(str(Path(output_dir) / ".cache")),
+                                                  self.max_cached_entries)
+        return self.caches[output_dir]
+
+    def _snapshot(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in job.items() if key != "options"}
+
+    def submit(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue an analysis, or return the identical job already known"""
+        options = self._options(request)
+        job_id = make_cache_key("job", options, [file_sha256(options["csv_path"])])[:16]
+        with self.lock:
+            job = self.jobs.get(job_id)
+            outputs_current = (self.latest_outputs.get(options["output_dir"]) == job_id
+                               and (Path(options["output_dir"]) / "final_report.json").exists())
+            if job is not None and (job["status"] in ("queued", "running")
+                                    or (job["status"] == "done" and outputs_current)):
+                job["requests"] += 1
+                return self._snapshot(job)
+            job = {
+                "job_id": job_id,
+                "status": "queued",
+                "options": options,
+                "requests": 1,
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "duration": None,
+                "summary": None,
+                "error": None
+            }
+            self.jobs[job_id] = job
+            self._prune()
+        self.executor.submit(self._run, job)
+        return self._snapshot(job)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job["status"] in ("done", "failed")]
+        for job_id in finished[:max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+            del self.jobs[job_id]
+
+    def _run(self, job: Dict[str, Any]):
+        options = job["options"]
+        job["status"] = "running"
+        job["started_at"] = time.time()
+        try:
+            report = run_complete_analysis(options["csv_path"], optimal_k=options["optimal_k"],
+                                           output_dir=options["output_dir"],
+                                           image_output_dir=options["image_output_dir"],
+                                           use_silhouette=options["use_silhouette"],
+                                           make_plots=options["make_plots"],
+                                           figure_jobs=self.figure_jobs,
+                                           result_cache=self._cache_for(options["output_dir"]))
+            job["summary"] = {
+                "records": report["data_overview"]["original_records"],
+                "optimal_k": report["clustering"]["optimal_k"],
+                "best_model": report["regression"]["comparison"]["best_model"]
+            }
+            job["status"] = "done"
+            with self.lock:
+                self.latest_outputs[options["output_dir"]] = job["job_id"]
+        except Exception as error:
+            traceback.print_exc()
+            job["error"] = f"{type(error).__name__}: {error}"
+            job["status"] = "failed"
+        finally:
+            job["finished_at"] = time.time()
+            job["duration"] = job["finished_at"] - job["started_at"]
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return self._snapshot(job) if job is not None else None
+
+    def health(self) -> Dict[str, Any]:
+        with self.lock:
+            counts: Dict[str, int] = {}
+            for job in self.jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"status": "ok", "pid": os.getpid(), "jobs": counts}
+
+class WorkerRequestHandler(BaseHTTPRequestHandler):
+    """JSON endpoints over the server's AnalysisWorker"""
+    def _send(self, status: int, payload: Dict[str, Any]):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        worker = self.server.worker
+        if self.path == "/health":
+            self._send(200, worker.health())
+        elif self.path.startswith("/jobs/"):
+            job = worker.status(self.path[len("/jobs/"):])
+            if job is None:
+                self._send(404, {"error": "Unknown job"})
+            else:
+                self._send(200, job)
+        else:
+            self._send(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if self.path != "/jobs":
+            self._send(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            self._send(202, self.server.worker.submit(request))
+        except (ValueError, OSError) as error:
+            self._send(400, {"error": str(error)})
+
+    def log_message(self, format: str, *args):
+        # Status polls would flood the log; report only submissions and errors
+        if not self.path.startswith("/jobs/") and self.path != "/health":
+            super().log_message(format, *args)
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+    """Run the worker until interrupted"""
+    server = ThreadingHTTPServer((host, port), WorkerRequestHandler)
+    server.worker = AnalysisWorker()
+    # The one-off CLI imports matplotlib lazily; a warm worker pays for it up front
+    get_pyplot()
+    print(f"Analysis worker listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.worker.executor.shutdown(wait=False)
+
+if __name__ == "__main__":
+    serve(os.environ.get("ML_WORKER_HOST", DEFAULT_HOST),
+          int(os.environ.get("ML_WORKER_PORT", DEFAULT_PORT)))